@@ -1,76 +1,186 @@
 import anthropic
-from backend.config import ANTHROPIC_API_KEY, logging
+from typing import AsyncIterator, Optional
+from config import ANTHROPIC_API_KEY, logging
+from api_handlers import client_factory, resilience, usage
 
 if ANTHROPIC_API_KEY:
-    client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+    client = anthropic.Anthropic(
+        api_key=ANTHROPIC_API_KEY,
+        http_client=client_factory.get_http_client(client_factory.ANTHROPIC_HOST),
+        timeout=client_factory.build_timeout(),
+        max_retries=0,  # retries are owned by the resilience layer
+    )
+    async_client = anthropic.AsyncAnthropic(
+        api_key=ANTHROPIC_API_KEY,
+        http_client=client_factory.get_async_http_client(client_factory.ANTHROPIC_HOST),
+        timeout=client_factory.build_timeout(),
+        max_retries=0,
+    )
 else:
     client = None
+    async_client = None
     logging.warning("Anthropic client not initialized due to missing API key.")
 
-def get_llm_response(prompt: str, model_name: str) -> str:
-    """
-    Gets a response from an Anthropic Claude model.
-
-    Args:
-        prompt: The prompt to send to the model.
-        model_name: The specific Claude model to use (e.g., "claude-3-opus-20240229").
-
-    Returns:
-        The model's text response, or an error message string.
-    """
-    if not client:
+def _check_request(active_client, prompt: str) -> Optional[str]:
+    """Returns an error string if the request cannot be sent, otherwise None."""
+    if not active_client:
         error_msg = "Anthropic client is not initialized. Check API key."
         logging.error(error_msg)
         return f"Error: {error_msg}"
     if not prompt:
         logging.warning("Anthropic handler received an empty prompt.")
         return "Error: Prompt cannot be empty."
+    return None
 
-    try:
-        logging.info(f"Sending request to Anthropic model: {model_name} with prompt (first 50 chars): '{prompt[:50]}...'")
+def system_param(system: str):
+    """The Messages API `system` value for an instruction block (also used by batch_jobs)."""
+    # A cache breakpoint only takes effect once the block reaches Anthropic's minimum cacheable
+    # length (see usage.cacheable); the optimizer's standard block is far shorter, so it is sent plain.
+    if usage.cacheable(system):
+        return [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+    return system
 
-        # Anthropic API uses a 'messages' structure.
-        # Max tokens to generate; adjust as needed.
-        response = client.messages.create(
-            model=model_name,
-            max_tokens=4096, # Max output tokens as per ANTHROPIC_API_INSTRUCTIONS.md
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
+def _build_request(prompt: str, model_name: str, system: Optional[str] = None) -> dict:
+    # Anthropic API uses a 'messages' structure.
+    # Max tokens to generate; adjust as needed.
+    request = {
+        "model": model_name,
+        "max_tokens": 4096, # Max output tokens as per ANTHROPIC_API_INSTRUCTIONS.md
+        "messages": [
+            {"role": "user", "content": prompt}
+        ],
+    }
+    if system:
+        request["system"] = system_param(system)
+    return request
+
+def _record_usage(model_name: str, response_usage) -> None:
+    if response_usage is None:
+        return
+    usage.record(
+        "claude",
+        model_name,
+        input_tokens=getattr(response_usage, "input_tokens", 0),
+        output_tokens=getattr(response_usage, "output_tokens", 0),
+        cache_read_tokens=getattr(response_usage, "cache_read_input_tokens", 0),
+        cache_write_tokens=getattr(response_usage, "cache_creation_input_tokens", 0),
+    )
+
+def _parse_message(response, model_name: str) -> str:
+    _record_usage(model_name, getattr(response, "usage", None))
+    if response.content and len(response.content) > 0:
+        # Assuming the first block of content is the primary text response
+        response_text = ""
+        for block in response.content:
+            if block.type == "text":
+                response_text += block.text
 
-        if response.content and len(response.content) > 0:
-            # Assuming the first block of content is the primary text response
-            response_text = ""
-            for block in response.content:
-                if block.type == "text":
-                    response_text += block.text
-
-            if response_text:
-                logging.info(f"Received response from Anthropic model {model_name} (first 50 chars): '{response_text[:50]}...'")
-                return response_text.strip()
-            else:
-                logging.warning(f"Anthropic API call for model {model_name} returned content but no text block.")
-                return "Error: Anthropic API returned no text content."
+        if response_text:
+            logging.info(f"Received response from Anthropic model {model_name} (first 50 chars): '{response_text[:50]}...'")
+            return response_text.strip()
         else:
-            logging.warning(f"Anthropic API call for model {model_name} returned no content.")
-            return "Error: Anthropic API returned no content."
+            logging.warning(f"Anthropic API call for model {model_name} returned content but no text block.")
+            return "Error: Anthropic API returned no text content."
+    else:
+        logging.warning(f"Anthropic API call for model {model_name} returned no content.")
+        return "Error: Anthropic API returned no content."
 
-    except anthropic.APIConnectionError as e:
+def _is_transient(e: Exception) -> bool:
+    """Errors worth retrying: connection problems, timeouts, 408/409/429, 5xx and 529 overloaded."""
+    if isinstance(e, anthropic.APIConnectionError):  # includes APITimeoutError
+        return True
+    if isinstance(e, anthropic.APIStatusError):
+        return e.status_code in (408, 409, 429) or e.status_code >= 500
+    return False
+
+def _error_message(e: Exception) -> str:
+    if isinstance(e, resilience.CircuitOpenError):
+        logging.warning(f"Anthropic call skipped: {e}")
+        return f"Error: Anthropic API is temporarily unavailable. {e}"
+    if isinstance(e, anthropic.APIConnectionError):
         logging.error(f"Anthropic API connection error: {e}")
         return f"Error: Could not connect to Anthropic API. {e}"
-    except anthropic.RateLimitError as e:
+    if isinstance(e, anthropic.RateLimitError):
         logging.error(f"Anthropic API rate limit exceeded: {e}")
         return f"Error: Anthropic API rate limit exceeded. Please try again later. {e}"
-    except anthropic.AuthenticationError as e:
+    if isinstance(e, anthropic.AuthenticationError):
         logging.error(f"Anthropic API authentication error: {e}")
         return f"Error: Anthropic API authentication failed. Check your API key. {e}"
-    except anthropic.APIStatusError as e:
+    if isinstance(e, anthropic.APIStatusError):
         logging.error(f"Anthropic API status error (code {e.status_code}): {e.response}")
         return f"Error: Anthropic API returned an error (status {e.status_code}). {e.message}"
+    logging.error(f"An unexpected error occurred with Anthropic API: {e}", exc_info=True)
+    return f"Error: An unexpected error occurred while contacting Anthropic. {e}"
+
+def get_llm_response(prompt: str, model_name: str, system: Optional[str] = None) -> str:
+    """
+    Gets a response from an Anthropic Claude model.
+
+    Args:
+        prompt: The prompt to send to the model.
+        model_name: The specific Claude model to use (e.g., "claude-3-opus-20240229").
+
+    Returns:
+        The model's text response, or an error message string.
+    """
+    error = _check_request(client, prompt)
+    if error:
+        return error
+
+    try:
+        logging.info(f"Sending request to Anthropic model: {model_name} with prompt (first 50 chars): '{prompt[:50]}...'")
+        request = _build_request(prompt, model_name, system)
+        response = resilience.call_sync("claude", lambda: client.messages.create(**request), _is_transient)
+        return _parse_message(response, model_name)
+    except Exception as e:
+        return _error_message(e)
+
+async def get_llm_response_async(prompt: str, model_name: str, system: Optional[str] = None) -> str:
+    """
+    Async variant of get_llm_response backed by anthropic.AsyncAnthropic.
+
+    Returns the same text or error strings as the sync version without blocking the event loop.
+    """
+    error = _check_request(async_client, prompt)
+    if error:
+        return error
+
+    try:
+        logging.info(f"Sending async request to Anthropic model: {model_name} with prompt (first 50 chars): '{prompt[:50]}...'")
+        request = _build_request(prompt, model_name, system)
+        response = await resilience.call_async("claude", lambda: async_client.messages.create(**request), _is_transient)
+        return _parse_message(response, model_name)
+    except Exception as e:
+        return _error_message(e)
+
+async def stream_llm_response(prompt: str, model_name: str, system: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Streams a response from an Anthropic Claude model using streamed message events.
+
+    Yields:
+        Text deltas as they arrive. On failure a single "Error: ..." string is
+        yielded and the stream ends, mirroring get_llm_response's contract.
+    """
+    error = _check_request(async_client, prompt)
+    if error:
+        yield error
+        return
+
+    try:
+        logging.info(f"Streaming request to Anthropic model: {model_name} with prompt (first 50 chars): '{prompt[:50]}...'")
+        request = _build_request(prompt, model_name, system)
+        # Only opening the stream is retried; once chunks have been yielded they can't be taken back.
+        stream = await resilience.call_async(
+            "claude", lambda: async_client.messages.create(**request, stream=True), _is_transient
+        )
+        async for event in stream:
+            if event.type == "content_block_delta" and event.delta.type == "text_delta" and event.delta.text:
+                yield event.delta.text
+            elif event.type == "message_start":
+                # Input and cache token counts are reported once, at the start of the stream.
+                _record_usage(model_name, event.message.usage)
     except Exception as e:
-        logging.error(f"An unexpected error occurred with Anthropic API: {e}", exc_info=True)
-        return f"Error: An unexpected error occurred while contacting Anthropic. {e}"
+        yield _error_message(e)
 
 # Example Usage:
 # if __name__ == "__main__":
@@ -0,0 +1,188 @@
+import threading
+from functools import lru_cache
+from typing import Dict
+
+import httpx
+from config import (
+    PROVIDER_HTTP_MAX_CONNECTIONS,
+    PROVIDER_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    PROVIDER_HTTP_KEEPALIVE_EXPIRY,
+    PROVIDER_HTTP_CONNECT_TIMEOUT,
+    PROVIDER_HTTP_READ_TIMEOUT,
+    PROVIDER_HTTP2,
+    logging,
+)
+
+# Provider API hosts. One sync and one async pool is kept per host, so e.g. every
+# OpenAI call in the process reuses the same keep-alive connections.
+OPENAI_HOST = "api.openai.com"
+ANTHROPIC_HOST = "api.anthropic.com"
+XAI_HOST = "api.x.ai"
+
+_lock = threading.Lock()
+_sync_clients: Dict[str, httpx.Client] = {}
+_async_clients: Dict[str, httpx.AsyncClient] = {}
+_counters: Dict[str, Dict[str, int]] = {}
+
+
+@lru_cache(maxsize=None)
+def _http2_available() -> bool:
+    if not PROVIDER_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401 -- httpx only needs it to be importable
+        return True
+    except ImportError:
+        logging.warning("PROVIDER_HTTP2 is enabled but the 'h2' package is not installed; falling back to HTTP/1.1.")
+        return False
+
+
+def build_timeout() -> httpx.Timeout:
+    """Timeout used by both the pools and the SDK clients (the SDKs override the pool's per request)."""
+    return httpx.Timeout(PROVIDER_HTTP_READ_TIMEOUT, connect=PROVIDER_HTTP_CONNECT_TIMEOUT)
+
+
+def build_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=PROVIDER_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=PROVIDER_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=PROVIDER_HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _host_counters(host: str) -> Dict[str, int]:
+    with _lock:
+        return _counters.setdefault(host, {"requests": 0, "connections_opened": 0})
+
+
+def _count(counters: Dict[str, int], key: str) -> None:
+    # Hooks fire from every thread using the pool (sync calls run in worker threads).
+    with _lock:
+        counters[key] += 1
+
+
+def _sync_hooks(host: str) -> dict:
+    counters = _host_counters(host)
+
+    def trace(event_name: str, info: dict) -> None:
+        # httpcore reports a TCP connect only when the pool has no reusable connection.
+        if event_name == "connection.connect_tcp.complete":
+            _count(counters, "connections_opened")
+
+    def on_request(request: httpx.Request) -> None:
+        _count(counters, "requests")
+        request.extensions["trace"] = trace
+
+    return {"request": [on_request]}
+
+
+def _async_hooks(host: str) -> dict:
+    counters = _host_counters(host)
+
+    async def trace(event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            _count(counters, "connections_opened")
+
+    async def on_request(request: httpx.Request) -> None:
+        _count(counters, "requests")
+        request.extensions["trace"] = trace
+
+    return {"request": [on_request]}
+
+
+def get_http_client(host: str) -> httpx.Client:
+    """Returns the shared, pooled sync httpx client for a provider host."""
+    with _lock:
+        http_client = _sync_clients.get(host)
+    if http_client is not None:
+        return http_client
+
+    http_client = httpx.Client(
+        limits=build_limits(),
+        timeout=build_timeout(),
+        http2=_http2_available(),
+        event_hooks=_sync_hooks(host),
+    )
+    with _lock:
+        # Another thread may have won the race; keep the first client and drop ours.
+        existing = _sync_clients.setdefault(host, http_client)
+    if existing is not http_client:
+        http_client.close()
+    return existing
+
+
+def get_async_http_client(host: str) -> httpx.AsyncClient:
+    """Returns the shared, pooled async httpx client for a provider host."""
+    with _lock:
+        http_client = _async_clients.get(host)
+    if http_client is not None:
+        return http_client
+
+    # Built outside the lock: _async_hooks takes it too.
+    http_client = httpx.AsyncClient(
+        limits=build_limits(),
+        timeout=build_timeout(),
+        http2=_http2_available(),
+        event_hooks=_async_hooks(host),
+    )
+    with _lock:
+        existing = _async_clients.setdefault(host, http_client)
+    # A losing client has opened no connections yet, so it can simply be dropped.
+    return existing
+
+
+def _pool_connections(http_client) -> list:
+    # httpx does not expose pool state publicly; read httpcore's pool defensively.
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    return list(getattr(pool, "connections", []) or [])
+
+
+def pool_stats() -> Dict[str, dict]:
+    """
+    Reports per-host pool usage.
+
+    `connection_reuse_ratio` is the share of requests that did not need a new
+    TCP connection; it should approach 1.0 under steady load.
+    """
+    stats = {}
+    with _lock:
+        hosts = set(_sync_clients) | set(_async_clients)
+        counters = {host: dict(values) for host, values in _counters.items()}
+    for host in sorted(hosts):
+        connections = []
+        for http_client in (_sync_clients.get(host), _async_clients.get(host)):
+            if http_client is not None:
+                connections.extend(_pool_connections(http_client))
+        host_counters = counters.get(host, {"requests": 0, "connections_opened": 0})
+        requests = host_counters["requests"]
+        opened = host_counters["connections_opened"]
+        stats[host] = {
+            "requests": requests,
+            "connections_opened": opened,
+            "connection_reuse_ratio": round(1 - opened / requests, 4) if requests else None,
+            "open_connections": len(connections),
+            "idle_connections": sum(1 for conn in connections if getattr(conn, "is_idle", lambda: False)()),
+            "max_connections": PROVIDER_HTTP_MAX_CONNECTIONS,
+            "max_keepalive_connections": PROVIDER_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            "keepalive_expiry": PROVIDER_HTTP_KEEPALIVE_EXPIRY,
+            "http2": _http2_available(),
+        }
+    return stats
+
+
+def close_all() -> None:
+    with _lock:
+        clients = list(_sync_clients.values())
+        _sync_clients.clear()
+    for http_client in clients:
+        http_client.close()
+
+
+async def aclose_all() -> None:
+    """Closes every pool; called from the app's shutdown hook."""
+    with _lock:
+        clients = list(_async_clients.values())
+        _async_clients.clear()
+    for http_client in clients:
+        await http_client.aclose()
+    close_all()
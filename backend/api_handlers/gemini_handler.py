@@ -1,22 +1,65 @@
+import json
+import threading
 import google.generativeai as genai
-from backend.config import GOOGLE_API_KEY, logging
+from typing import AsyncIterator, Dict, Iterable, Optional, Tuple
+from google.api_core import exceptions as google_exceptions
+from config import GOOGLE_API_KEY, logging
+from api_handlers import resilience, usage
 
 if GOOGLE_API_KEY:
     genai.configure(api_key=GOOGLE_API_KEY)
 else:
     logging.warning("Google Gemini client not configured due to missing GOOGLE_API_KEY.")
 
-def get_llm_response(prompt: str, model_name: str) -> str:
-    """
-    Gets a response from a Google Gemini model.
+# Prebuilt GenerativeModel objects keyed by (model name, generation config, safety settings, system instruction).
+# Building one per call re-parses its config and re-creates the SDK's client wrappers.
+_models: Dict[Tuple[str, str, str, str], "genai.GenerativeModel"] = {}
+_models_lock = threading.Lock()
 
-    Args:
-        prompt: The prompt to send to the model.
-        model_name: The specific Gemini model to use (e.g., "gemini-1.5-pro-latest").
+def _config_key(value) -> str:
+    return json.dumps(value, sort_keys=True, default=str) if value else ""
 
-    Returns:
-        The model's text response, or an error message string.
+def get_model(
+    model_name: str, generation_config: Optional[dict] = None, safety_settings=None, system_instruction: Optional[str] = None
+) -> "genai.GenerativeModel":
+    """Returns the cached GenerativeModel for this name and config, building it on first use."""
+    key = (model_name, _config_key(generation_config), _config_key(safety_settings), system_instruction or "")
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            kwargs = {}
+            if generation_config:
+                kwargs["generation_config"] = generation_config
+            if safety_settings:
+                kwargs["safety_settings"] = safety_settings
+            if system_instruction:
+                # Sent ahead of the contents on every call; it only counts towards Gemini's implicit
+                # caching together with enough of the contents to reach the minimum cached length.
+                kwargs["system_instruction"] = system_instruction
+            model = genai.GenerativeModel(model_name, **kwargs)
+            _models[key] = model
+        return model
+
+def warm_models(model_names: Iterable[str], system: Optional[str] = None) -> int:
+    """
+    Prebuilds the GenerativeModel each name is called with for `system` instructions (pass the
+    dispatcher's standard block, as calls do); returns how many are cached.
     """
+    if not GOOGLE_API_KEY:
+        return 0
+    for model_name in model_names:
+        get_model(model_name, system_instruction=system)
+    return len(_models)
+
+def clear_model_cache() -> None:
+    with _models_lock:
+        _models.clear()
+
+def _check_request(prompt: str) -> Optional[str]:
+    """Returns an error string if the request cannot be sent, otherwise None."""
     if not GOOGLE_API_KEY: # Check if API key was loaded for genai.configure
         error_msg = "Google Gemini client is not configured. Check GOOGLE_API_KEY."
         logging.error(error_msg)
@@ -24,51 +67,141 @@ def get_llm_response(prompt: str, model_name: str) -> str:
     if not prompt:
         logging.warning("Google Gemini handler received an empty prompt.")
         return "Error: Prompt cannot be empty."
+    return None
+
+def _record_usage(model_name: str, usage_metadata) -> None:
+    if usage_metadata is None:
+        return
+    usage.record(
+        "gemini",
+        model_name,
+        input_tokens=getattr(usage_metadata, "prompt_token_count", 0),
+        output_tokens=getattr(usage_metadata, "candidates_token_count", 0),
+        cache_read_tokens=getattr(usage_metadata, "cached_content_token_count", 0),
+    )
+
+def _parse_response(response, model_name: str) -> str:
+    _record_usage(model_name, getattr(response, "usage_metadata", None))
+    if response.parts:
+        # Concatenate text from all parts, though typically there's one for simple prompts.
+        response_text = "".join(part.text for part in response.parts if hasattr(part, 'text'))
+        if response_text:
+            logging.info(f"Received response from Google Gemini model {model_name} (first 50 chars): '{response_text[:50]}...'")
+            return response_text.strip()
+        else:
+            # This case might occur if response.parts exist but none have 'text' or text is empty.
+            # Or if response.text (shortcut for single part) is empty.
+            logging.warning(f"Google Gemini API call for model {model_name} returned parts but no text.")
+            return "Error: Google Gemini API returned no text content."
+    elif hasattr(response, 'text') and response.text: # Check response.text directly
+         logging.info(f"Received response from Google Gemini model {model_name} (first 50 chars): '{response.text[:50]}...'")
+         return response.text.strip()
+    else:
+        # This path might be taken if the response object itself is unusual or empty.
+        # Also, check for prompt_feedback for safety reasons.
+        if response.prompt_feedback and response.prompt_feedback.block_reason:
+            block_reason = response.prompt_feedback.block_reason
+            logging.warning(f"Google Gemini API call for model {model_name} was blocked. Reason: {block_reason}")
+            return f"Error: Prompt blocked by Google Gemini API. Reason: {block_reason}"
+        logging.warning(f"Google Gemini API call for model {model_name} returned no parts or text.")
+        return "Error: Google Gemini API returned no parsable content."
+
+def _is_transient(e: Exception) -> bool:
+    """Errors worth retrying: quota/rate limits, deadlines and 5xx server errors."""
+    return isinstance(e, (
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.ServerError,
+    ))
+
+def _error_message(e: Exception) -> str:
+    # The google-generativeai SDK might raise various specific exceptions.
+    # For simplicity, catching a general Exception, but more specific handling can be added.
+    # Example: google.api_core.exceptions.PermissionDenied for API key issues after configuration.
+    # Example: google.api_core.exceptions.ResourceExhausted for rate limits.
+    if isinstance(e, resilience.CircuitOpenError):
+        logging.warning(f"Google Gemini call skipped: {e}")
+        return f"Error: Google Gemini API is temporarily unavailable. {e}"
+    logging.error(f"An unexpected error occurred with Google Gemini API: {e}", exc_info=True)
+    # Attempt to provide a more user-friendly message for common issues if possible
+    if "API_KEY_INVALID" in str(e) or "PermissionDenied" in str(e):
+         return f"Error: Google Gemini API authentication failed. Check your API key. Details: {e}"
+    if "RateLimit" in str(e) or "ResourceExhausted" in str(e):
+         return f"Error: Google Gemini API rate limit exceeded. Please try again later. Details: {e}"
+    return f"Error: An unexpected error occurred while contacting Google Gemini. {e}"
+
+def get_llm_response(prompt: str, model_name: str, system: Optional[str] = None) -> str:
+    """
+    Gets a response from a Google Gemini model.
+
+    Args:
+        prompt: The prompt to send to the model.
+        model_name: The specific Gemini model to use (e.g., "gemini-1.5-pro-latest").
+
+    Returns:
+        The model's text response, or an error message string.
+    """
+    error = _check_request(prompt)
+    if error:
+        return error
 
     try:
         logging.info(f"Sending request to Google Gemini model: {model_name} with prompt (first 50 chars): '{prompt[:50]}...'")
 
-        model = genai.GenerativeModel(model_name)
+        model = get_model(model_name, system_instruction=system)
         # The generate_content method can take various types of input.
         # For simple text prompt, just passing the string is fine.
-        response = model.generate_content(prompt)
-
-        if response.parts:
-            # Concatenate text from all parts, though typically there's one for simple prompts.
-            response_text = "".join(part.text for part in response.parts if hasattr(part, 'text'))
-            if response_text:
-                logging.info(f"Received response from Google Gemini model {model_name} (first 50 chars): '{response_text[:50]}...'")
-                return response_text.strip()
-            else:
-                # This case might occur if response.parts exist but none have 'text' or text is empty.
-                # Or if response.text (shortcut for single part) is empty.
-                logging.warning(f"Google Gemini API call for model {model_name} returned parts but no text.")
-                return "Error: Google Gemini API returned no text content."
-        elif hasattr(response, 'text') and response.text: # Check response.text directly
-             logging.info(f"Received response from Google Gemini model {model_name} (first 50 chars): '{response.text[:50]}...'")
-             return response.text.strip()
-        else:
-            # This path might be taken if the response object itself is unusual or empty.
-            # Also, check for prompt_feedback for safety reasons.
-            if response.prompt_feedback and response.prompt_feedback.block_reason:
-                block_reason = response.prompt_feedback.block_reason
-                logging.warning(f"Google Gemini API call for model {model_name} was blocked. Reason: {block_reason}")
-                return f"Error: Prompt blocked by Google Gemini API. Reason: {block_reason}"
-            logging.warning(f"Google Gemini API call for model {model_name} returned no parts or text.")
-            return "Error: Google Gemini API returned no parsable content."
+        response = resilience.call_sync("gemini", lambda: model.generate_content(prompt), _is_transient)
+        return _parse_response(response, model_name)
+    except Exception as e:
+        return _error_message(e)
+
+async def get_llm_response_async(prompt: str, model_name: str, system: Optional[str] = None) -> str:
+    """
+    Async variant of get_llm_response using GenerativeModel.generate_content_async.
 
+    Returns the same text or error strings as the sync version without blocking the event loop.
+    """
+    error = _check_request(prompt)
+    if error:
+        return error
+
+    try:
+        logging.info(f"Sending async request to Google Gemini model: {model_name} with prompt (first 50 chars): '{prompt[:50]}...'")
+        model = get_model(model_name, system_instruction=system)
+        response = await resilience.call_async("gemini", lambda: model.generate_content_async(prompt), _is_transient)
+        return _parse_response(response, model_name)
+    except Exception as e:
+        return _error_message(e)
+
+async def stream_llm_response(prompt: str, model_name: str, system: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Streams a response from a Google Gemini model via generate_content_async(stream=True).
+
+    Yields:
+        Text chunks as they arrive. On failure a single "Error: ..." string is
+        yielded and the stream ends, mirroring get_llm_response's contract.
+    """
+    error = _check_request(prompt)
+    if error:
+        yield error
+        return
+
+    try:
+        logging.info(f"Streaming request to Google Gemini model: {model_name} with prompt (first 50 chars): '{prompt[:50]}...'")
+        model = get_model(model_name, system_instruction=system)
+        # Only opening the stream is retried; once chunks have been yielded they can't be taken back.
+        response = await resilience.call_async(
+            "gemini", lambda: model.generate_content_async(prompt, stream=True), _is_transient
+        )
+        async for chunk in response:
+            # chunk.text raises if the chunk was blocked, so read the parts directly.
+            chunk_text = "".join(part.text for part in chunk.parts if hasattr(part, 'text'))
+            if chunk_text:
+                yield chunk_text
     except Exception as e:
-        # The google-generativeai SDK might raise various specific exceptions.
-        # For simplicity, catching a general Exception, but more specific handling can be added.
-        # Example: google.api_core.exceptions.PermissionDenied for API key issues after configuration.
-        # Example: google.api_core.exceptions.ResourceExhausted for rate limits.
-        logging.error(f"An unexpected error occurred with Google Gemini API: {e}", exc_info=True)
-        # Attempt to provide a more user-friendly message for common issues if possible
-        if "API_KEY_INVALID" in str(e) or "PermissionDenied" in str(e):
-             return f"Error: Google Gemini API authentication failed. Check your API key. Details: {e}"
-        if "RateLimit" in str(e) or "ResourceExhausted" in str(e):
-             return f"Error: Google Gemini API rate limit exceeded. Please try again later. Details: {e}"
-        return f"Error: An unexpected error occurred while contacting Google Gemini. {e}"
+        yield _error_message(e)
 
 # Example Usage:
 # if __name__ == "__main__":
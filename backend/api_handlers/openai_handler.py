@@ -1,72 +1,178 @@
 import openai
-from backend.config import OPENAI_API_KEY, logging
+from typing import AsyncIterator, Optional
+from config import OPENAI_API_KEY, logging
+from api_handlers import client_factory, resilience, usage
 
-# Initialize the OpenAI client
+# Initialize the OpenAI clients
 # It's good practice to initialize it once if the key doesn't change often.
 # However, if the key could change during runtime or for different requests (not the case here),
 # then initialization might need to be inside the function or managed differently.
 if OPENAI_API_KEY:
-    client = openai.OpenAI(api_key=OPENAI_API_KEY)
+    # Both clients run on the shared, tunable pools from client_factory.
+    client = openai.OpenAI(
+        api_key=OPENAI_API_KEY,
+        http_client=client_factory.get_http_client(client_factory.OPENAI_HOST),
+        timeout=client_factory.build_timeout(),
+        max_retries=0,  # retries are owned by the resilience layer
+    )
+    async_client = openai.AsyncOpenAI(
+        api_key=OPENAI_API_KEY,
+        http_client=client_factory.get_async_http_client(client_factory.OPENAI_HOST),
+        timeout=client_factory.build_timeout(),
+        max_retries=0,
+    )
 else:
     client = None
+    async_client = None
     logging.warning("OpenAI client not initialized due to missing API key.")
 
-def get_llm_response(prompt: str, model_name: str) -> str:
-    """
-    Gets a response from an OpenAI model.
-
-    Args:
-        prompt: The prompt to send to the model.
-        model_name: The specific OpenAI model to use (e.g., "gpt-4o", "gpt-4-turbo").
-
-    Returns:
-        The model's text response, or an error message string.
-    """
-    if not client:
+def _check_request(active_client, prompt: str) -> Optional[str]:
+    """Returns an error string if the request cannot be sent, otherwise None."""
+    if not active_client:
         error_msg = "OpenAI client is not initialized. Check API key."
         logging.error(error_msg)
         return f"Error: {error_msg}"
     if not prompt:
         logging.warning("OpenAI handler received an empty prompt.")
         return "Error: Prompt cannot be empty."
+    return None
 
-    try:
-        logging.info(f"Sending request to OpenAI model: {model_name} with prompt (first 50 chars): '{prompt[:50]}...'")
+def _build_request(prompt: str, model_name: str, system: Optional[str] = None) -> dict:
+    # Using the ChatCompletion endpoint as it's the standard for current models
+    messages = [{"role": "user", "content": prompt}]
+    if system:
+        # The instruction block goes first and is byte-identical across calls, so a block past the
+        # provider's minimum cacheable length (usage.PROMPT_CACHE_MIN_TOKENS) is served from its
+        # automatic prompt cache; the optimizer's standard block is well below that.
+        messages.insert(0, {"role": "system", "content": system})
+    return {
+        "model": model_name,
+        "messages": messages,
+    }
 
-        # Using the ChatCompletion endpoint as it's the standard for current models
-        completion = client.chat.completions.create(
-            model=model_name,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
+def _record_usage(model_name: str, response_usage) -> None:
+    if response_usage is None:
+        return
+    details = getattr(response_usage, "prompt_tokens_details", None)
+    usage.record(
+        "openai",
+        model_name,
+        input_tokens=getattr(response_usage, "prompt_tokens", 0),
+        output_tokens=getattr(response_usage, "completion_tokens", 0),
+        cache_read_tokens=getattr(details, "cached_tokens", 0),
+    )
+
+def _parse_completion(completion, model_name: str) -> str:
+    _record_usage(model_name, getattr(completion, "usage", None))
+    # Extract the response text
+    # Assuming we want the content of the first choice's message
+    if completion.choices and len(completion.choices) > 0:
+        response_text = completion.choices[0].message.content
+        logging.info(f"Received response from OpenAI model {model_name} (first 50 chars): '{response_text[:50]}...'")
+        return response_text.strip() if response_text else ""
+    else:
+        logging.warning(f"OpenAI API call for model {model_name} returned no choices or empty response.")
+        return "Error: OpenAI API returned no response or empty content."
+
+def _is_transient(e: Exception) -> bool:
+    """Errors worth retrying: connection problems, timeouts, 408/409/429 and 5xx."""
+    if isinstance(e, openai.APIConnectionError):  # includes APITimeoutError
+        return True
+    if isinstance(e, openai.APIStatusError):
+        return e.status_code in (408, 409, 429) or e.status_code >= 500
+    return False
 
-        # Extract the response text
-        # Assuming we want the content of the first choice's message
-        if completion.choices and len(completion.choices) > 0:
-            response_text = completion.choices[0].message.content
-            logging.info(f"Received response from OpenAI model {model_name} (first 50 chars): '{response_text[:50]}...'")
-            return response_text.strip() if response_text else ""
-        else:
-            logging.warning(f"OpenAI API call for model {model_name} returned no choices or empty response.")
-            return "Error: OpenAI API returned no response or empty content."
-
-    except openai.APIConnectionError as e:
+def _error_message(e: Exception) -> str:
+    if isinstance(e, resilience.CircuitOpenError):
+        logging.warning(f"OpenAI call skipped: {e}")
+        return f"Error: OpenAI API is temporarily unavailable. {e}"
+    if isinstance(e, openai.APIConnectionError):
         logging.error(f"OpenAI API connection error: {e}")
         return f"Error: Could not connect to OpenAI API. {e}"
-    except openai.RateLimitError as e:
+    if isinstance(e, openai.RateLimitError):
         logging.error(f"OpenAI API rate limit exceeded: {e}")
         return f"Error: OpenAI API rate limit exceeded. Please try again later. {e}"
-    except openai.AuthenticationError as e:
+    if isinstance(e, openai.AuthenticationError):
         logging.error(f"OpenAI API authentication error: {e}")
         return f"Error: OpenAI API authentication failed. Check your API key. {e}"
-    except openai.APIStatusError as e:
+    if isinstance(e, openai.APIStatusError):
         logging.error(f"OpenAI API status error (code {e.status_code}): {e.response}")
         return f"Error: OpenAI API returned an error (status {e.status_code}). {e.message}"
+    # It's important to log exc_info=True for unexpected errors to get the traceback
+    logging.error(f"An unexpected error occurred with OpenAI API: {e}", exc_info=True)
+    return f"Error: An unexpected error occurred while contacting OpenAI. {e}"
+
+def get_llm_response(prompt: str, model_name: str, system: Optional[str] = None) -> str:
+    """
+    Gets a response from an OpenAI model.
+
+    Args:
+        prompt: The prompt to send to the model.
+        model_name: The specific OpenAI model to use (e.g., "gpt-4o", "gpt-4-turbo").
+
+    Returns:
+        The model's text response, or an error message string.
+    """
+    error = _check_request(client, prompt)
+    if error:
+        return error
+
+    try:
+        logging.info(f"Sending request to OpenAI model: {model_name} with prompt (first 50 chars): '{prompt[:50]}...'")
+        request = _build_request(prompt, model_name, system)
+        completion = resilience.call_sync("openai", lambda: client.chat.completions.create(**request), _is_transient)
+        return _parse_completion(completion, model_name)
+    except Exception as e:
+        return _error_message(e)
+
+async def get_llm_response_async(prompt: str, model_name: str, system: Optional[str] = None) -> str:
+    """
+    Async variant of get_llm_response backed by openai.AsyncOpenAI.
+
+    Returns the same text or error strings as the sync version without blocking the event loop.
+    """
+    error = _check_request(async_client, prompt)
+    if error:
+        return error
+
+    try:
+        logging.info(f"Sending async request to OpenAI model: {model_name} with prompt (first 50 chars): '{prompt[:50]}...'")
+        request = _build_request(prompt, model_name, system)
+        completion = await resilience.call_async(
+            "openai", lambda: async_client.chat.completions.create(**request), _is_transient
+        )
+        return _parse_completion(completion, model_name)
+    except Exception as e:
+        return _error_message(e)
+
+async def stream_llm_response(prompt: str, model_name: str, system: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Streams a response from an OpenAI model chunk by chunk.
+
+    Yields:
+        Text deltas as they arrive. On failure a single "Error: ..." string is
+        yielded and the stream ends, mirroring get_llm_response's contract.
+    """
+    error = _check_request(async_client, prompt)
+    if error:
+        yield error
+        return
+
+    try:
+        logging.info(f"Streaming request to OpenAI model: {model_name} with prompt (first 50 chars): '{prompt[:50]}...'")
+        request = _build_request(prompt, model_name, system)
+        # Only opening the stream is retried; once chunks have been yielded they can't be taken back.
+        # The pinned SDK (openai~=1.23) has no stream_options, so streamed calls don't report token usage.
+        stream = await resilience.call_async(
+            "openai",
+            lambda: async_client.chat.completions.create(**request, stream=True),
+            _is_transient,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
     except Exception as e:
-        logging.error(f"An unexpected error occurred with OpenAI API: {e}", exc_info=True)
-        # It's important to log exc_info=True for unexpected errors to get the traceback
-        return f"Error: An unexpected error occurred while contacting OpenAI. {e}"
+        yield _error_message(e)
 
 # Example Usage (for testing this handler directly)
 # if __name__ == "__main__":
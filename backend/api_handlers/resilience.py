@@ -0,0 +1,247 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from config import (
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RECOVERY_TIMEOUT,
+    CIRCUIT_HALF_OPEN_MAX_CALLS,
+    logging,
+)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(f"{provider} circuit breaker is open; retry in {retry_in:.0f}s.")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker.
+
+    Opens after `failure_threshold` consecutive transient failures and fails fast
+    while open. After `recovery_timeout` seconds it goes half-open and lets up to
+    `half_open_max_calls` probe calls through: one success closes it again, one
+    failure re-opens it, and a probe that is cancelled gives its slot back.
+    """
+
+    def __init__(self, provider: str, failure_threshold: int = 5, recovery_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.half_open_calls = 0
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Raises CircuitOpenError if the call must not be sent."""
+        with self._lock:
+            if self.state == OPEN:
+                elapsed = time.monotonic() - self.opened_at
+                if elapsed < self.recovery_timeout:
+                    raise CircuitOpenError(self.provider, self.recovery_timeout - elapsed)
+                self.state = HALF_OPEN
+                self.half_open_calls = 0
+                logging.info(f"Circuit breaker for {self.provider} is half-open; probing.")
+            if self.state == HALF_OPEN:
+                if self.half_open_calls >= self.half_open_max_calls:
+                    raise CircuitOpenError(self.provider, 0)
+                self.half_open_calls += 1
+
+    def release_probe(self) -> None:
+        """For a call that ended with neither outcome (cancelled): frees its half-open probe slot."""
+        with self._lock:
+            if self.state == HALF_OPEN and self.half_open_calls > 0:
+                self.half_open_calls -= 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                logging.info(f"Circuit breaker for {self.provider} closed after a successful probe.")
+            self.state = CLOSED
+            self.consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                    logging.warning(
+                        f"Circuit breaker for {self.provider} opened after {self.consecutive_failures} consecutive failures."
+                    )
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = round(max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at)), 1)
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "times_opened": self.times_opened,
+                "retry_in": retry_in,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                provider,
+                failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                recovery_timeout=CIRCUIT_RECOVERY_TIMEOUT,
+                half_open_max_calls=CIRCUIT_HALF_OPEN_MAX_CALLS,
+            )
+            _breakers[provider] = breaker
+        return breaker
+
+
+def breaker_states() -> Dict[str, dict]:
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {provider: breaker.snapshot() for provider, breaker in sorted(breakers.items())}
+
+
+def reset_breakers() -> None:
+    """Forgets all breaker state (used by tests and after manual provider recovery)."""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Reads Retry-After (or retry-after-ms) from an SDK error's HTTP response, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms:
+            return float(retry_after_ms) / 1000
+        retry_after = headers.get("retry-after")
+        if not retry_after:
+            return None
+        try:
+            return float(retry_after)
+        except ValueError:
+            # HTTP-date form
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Delay before retry number `attempt` (0-based).
+
+    Uses exponential backoff with full jitter, capped at RETRY_MAX_DELAY. A
+    server-supplied Retry-After is honoured as a floor and never shortened, so the
+    result exceeds the cap when the server asks for a longer wait (callers then give up).
+    """
+    jittered = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+    if retry_after is not None:
+        return max(retry_after, jittered)
+    return jittered
+
+
+def _give_up(provider: str, delay: float, error: Exception) -> bool:
+    # Retrying sooner than the server's Retry-After only earns another 429, and waiting longer
+    # than RETRY_MAX_DELAY holds the request too long; the error goes back to the caller instead.
+    if delay <= RETRY_MAX_DELAY:
+        return False
+    logging.warning(f"{provider} asked to retry in {delay:.0f}s, over RETRY_MAX_DELAY; not retrying: {error}")
+    return True
+
+
+async def call_async(provider: str, make_call: Callable[[], Awaitable[T]], is_transient: Callable[[Exception], bool]) -> T:
+    """
+    Awaits `make_call()` with retries and the provider's circuit breaker.
+
+    Only errors for which `is_transient` returns True are retried or counted against
+    the breaker; anything else (bad request, auth) is re-raised immediately.
+
+    Raises:
+        CircuitOpenError: If the breaker is open.
+        Exception: The last error from `make_call` once retries are exhausted.
+    """
+    breaker = get_breaker(provider)
+    attempts = max(1, RETRY_MAX_ATTEMPTS)
+    for attempt in range(attempts):
+        breaker.before_call()
+        try:
+            result = await make_call()
+        except Exception as e:
+            if not is_transient(e):
+                breaker.record_success()  # the provider answered; the request itself was bad
+                raise
+            breaker.record_failure()
+            if attempt == attempts - 1:
+                raise
+            delay = backoff_delay(attempt, retry_after_seconds(e))
+            if _give_up(provider, delay, e):
+                raise
+            logging.warning(f"Transient {provider} error (attempt {attempt + 1}/{attempts}): {e}; retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+        except BaseException:
+            # Cancelled: hedging drops the losing call, clients disconnect from streams, shutdown
+            # cancels in-flight work. Not a provider outcome, but a probe slot must not leak.
+            breaker.release_probe()
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+
+def call_sync(provider: str, make_call: Callable[[], T], is_transient: Callable[[Exception], bool]) -> T:
+    """Blocking counterpart of call_async for the sync handler entry points."""
+    breaker = get_breaker(provider)
+    attempts = max(1, RETRY_MAX_ATTEMPTS)
+    for attempt in range(attempts):
+        breaker.before_call()
+        try:
+            result = make_call()
+        except Exception as e:
+            if not is_transient(e):
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt == attempts - 1:
+                raise
+            delay = backoff_delay(attempt, retry_after_seconds(e))
+            if _give_up(provider, delay, e):
+                raise
+            logging.warning(f"Transient {provider} error (attempt {attempt + 1}/{attempts}): {e}; retrying in {delay:.2f}s")
+            time.sleep(delay)
+        except BaseException:
+            breaker.release_probe()
+            raise
+        else:
+            breaker.record_success()
+            return result
@@ -0,0 +1,59 @@
+import threading
+from typing import Dict
+
+# Token usage reported by the providers, per SDK model. cache_read/cache_write are the
+# prompt tokens served from / written to the provider-side prompt cache.
+_lock = threading.Lock()
+_usage: Dict[str, Dict[str, int]] = {}
+_providers: Dict[str, str] = {}
+
+
+# Anthropic and OpenAI only cache a prompt prefix of at least this many tokens; a shorter
+# instruction block is processed in full on every call whatever the request says.
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+
+def cacheable(text: str) -> bool:
+    """Whether `text` is long enough to be worth a prompt-cache breakpoint (~4 characters per token)."""
+    return len(text) >= PROMPT_CACHE_MIN_TOKENS * 4
+
+
+def _tokens(value) -> int:
+    # Usage fields are optional (and absent on older models), so anything non-int counts as 0.
+    return value if isinstance(value, int) else 0
+
+
+def record(provider: str, sdk_model: str, input_tokens=0, output_tokens=0, cache_read_tokens=0, cache_write_tokens=0) -> None:
+    with _lock:
+        totals = _usage.setdefault(
+            sdk_model, {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cache_read_tokens": 0, "cache_write_tokens": 0}
+        )
+        _providers[sdk_model] = provider
+        totals["calls"] += 1
+        totals["input_tokens"] += _tokens(input_tokens)
+        totals["output_tokens"] += _tokens(output_tokens)
+        totals["cache_read_tokens"] += _tokens(cache_read_tokens)
+        totals["cache_write_tokens"] += _tokens(cache_write_tokens)
+
+
+def stats() -> Dict[str, dict]:
+    """
+    Per-model totals. `cache_read_ratio` is the share of prompt tokens served from the
+    provider's cache (OpenAI/xAI include cached tokens in input_tokens; Anthropic doesn't).
+    """
+    with _lock:
+        snapshot = {model: dict(totals) for model, totals in _usage.items()}
+        providers = dict(_providers)
+    for model, totals in snapshot.items():
+        totals["provider"] = providers[model]
+        prompt_tokens = totals["input_tokens"]
+        if providers[model] == "claude":
+            prompt_tokens += totals["cache_read_tokens"] + totals["cache_write_tokens"]
+        totals["cache_read_ratio"] = round(totals["cache_read_tokens"] / prompt_tokens, 4) if prompt_tokens else None
+    return dict(sorted(snapshot.items()))
+
+
+def reset() -> None:
+    with _lock:
+        _usage.clear()
+        _providers.clear()
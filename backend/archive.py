@@ -0,0 +1,282 @@
+"""
+Archival tiering of old prompt history.
+
+Prompts older than ARCHIVE_AFTER_DAYS move, with their questionnaire responses,
+model outputs and the text blobs those refer to, out of the hot database into one
+SQLite file per time bucket under ARCHIVE_DIR (`prompts-2023-04.db` for "month"
+buckets, `prompts-2023.db` for "year"). Each batch is copied and deleted in one
+transaction on the hot connection with the archive ATTACHed, so a prompt is never
+missing from both; afterwards up to ARCHIVE_VACUUM_PAGES free pages are handed back
+with an incremental vacuum, keeping every step short enough to run against a live
+database.
+
+The crud lookups by prompt id fall back to the archives on a miss (see
+`HistoryArchive.lookup`), so archived prompts stay readable by id; paged listings
+and full-text search cover the hot database only. To archive from the backend
+directory:
+
+    python archive.py --older-than-days 365 --enable-incremental-vacuum
+"""
+import argparse
+import os
+import re
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+from sqlalchemy import bindparam, func, select, text
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, SQLModel
+
+import models
+from config import (
+    ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ARCHIVE_BUCKET, ARCHIVE_DIR, ARCHIVE_VACUUM_PAGES, logging,
+)
+from database import engine as hot_engine, make_engine
+
+T = TypeVar("T")
+
+# What moves, parents first (children are copied and deleted by prompt_id).
+ARCHIVED_TABLES = [
+    models.TextBlob.__table__,
+    models.Prompt.__table__,
+    models.QuestionnaireResponse.__table__,
+    models.ModelOutput.__table__,
+]
+BUCKET_FORMATS = {"month": "%Y-%m", "year": "%Y"}
+_FILE_PATTERN = re.compile(r"^prompts-(\d{4}(?:-\d{2})?)\.db$")
+
+_IN_IDS = bindparam("ids", expanding=True)
+_IN_HASHES = bindparam("hashes", expanding=True)
+
+
+def _columns(table) -> str:
+    # Named explicitly: migrated hot databases don't have the columns in declaration order.
+    return ", ".join(column.name for column in table.columns)
+
+
+def _copy_statement(table, where: str):
+    return text(
+        f"INSERT OR REPLACE INTO archive.{table.name} ({_columns(table)}) "
+        f"SELECT {_columns(table)} FROM main.{table.name} WHERE {where}"
+    ).bindparams(_IN_IDS)
+
+
+def _move_statements():
+    prompt, response, output = ARCHIVED_TABLES[1:]
+    copies = [
+        _copy_statement(prompt, "id IN :ids"),
+        _copy_statement(response, "prompt_id IN :ids"),
+        _copy_statement(output, "prompt_id IN :ids"),
+    ]
+    deletes = [
+        text(f"DELETE FROM main.{output.name} WHERE prompt_id IN :ids").bindparams(_IN_IDS),
+        text(f"DELETE FROM main.{response.name} WHERE prompt_id IN :ids").bindparams(_IN_IDS),
+        text(f"DELETE FROM main.{prompt.name} WHERE id IN :ids").bindparams(_IN_IDS),
+    ]
+    return copies, deletes
+
+
+_BLOB_HASHES = text(
+    "SELECT base_prompt_hash FROM main.prompt WHERE id IN :ids AND base_prompt_hash IS NOT NULL "
+    "UNION SELECT output_hash FROM main.modeloutput WHERE prompt_id IN :ids AND output_hash IS NOT NULL"
+).bindparams(_IN_IDS)
+_COPY_BLOBS = text(
+    "INSERT OR IGNORE INTO archive.textblob (hash, body) SELECT hash, body FROM main.textblob WHERE hash IN :hashes"
+).bindparams(_IN_HASHES)
+# Blobs still shared with hot rows stay behind; the archive has its own copy.
+_DELETE_ORPHAN_BLOBS = text(
+    "DELETE FROM main.textblob WHERE hash IN :hashes "
+    "AND NOT EXISTS (SELECT 1 FROM main.prompt WHERE base_prompt_hash = textblob.hash) "
+    "AND NOT EXISTS (SELECT 1 FROM main.modeloutput WHERE output_hash = textblob.hash)"
+).bindparams(_IN_HASHES)
+
+
+def compact(engine: Engine, pages: int = ARCHIVE_VACUUM_PAGES) -> int:
+    """
+    Returns up to `pages` free pages to the file system; returns how many were freed.
+
+    Does nothing unless the database uses auto_vacuum=INCREMENTAL (new databases under the
+    "wal" profiles do, see database.SQLITE_PROFILES; older ones need `enable_incremental_vacuum` once).
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+            return 0
+        before = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        # sqlite3's execute() steps the PRAGMA once, freeing a single page; a script runs it to completion.
+        conn.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+        return before - conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+
+
+def enable_incremental_vacuum(engine: Engine) -> None:
+    """Switches an existing database to auto_vacuum=INCREMENTAL. Runs a full VACUUM, so only once."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.exec_driver_sql("VACUUM")  # can't run inside a transaction
+
+
+class HistoryArchive:
+    """The archive files in one directory, for moving history into and reading it back."""
+
+    def __init__(self, directory: str = ARCHIVE_DIR, bucket: str = ARCHIVE_BUCKET):
+        if bucket not in BUCKET_FORMATS:
+            raise ValueError(f"Unknown archive bucket {bucket!r}; expected one of {', '.join(BUCKET_FORMATS)}.")
+        self.directory = directory
+        self.bucket = bucket
+        self._lock = threading.Lock()
+        self._engines: Dict[str, Engine] = {}
+        # path -> (lowest, highest) prompt id in it, so a lookup only opens files that can hit
+        self._id_ranges: Dict[str, Tuple[int, int]] = {}
+        self._listed_at: Optional[float] = None
+
+    def path_for(self, timestamp: datetime) -> str:
+        return os.path.join(self.directory, f"prompts-{timestamp.strftime(BUCKET_FORMATS[self.bucket])}.db")
+
+    def _engine(self, path: str) -> Engine:
+        with self._lock:
+            if path not in self._engines:
+                self._engines[path] = make_engine(f"sqlite:///{path}")
+            return self._engines[path]
+
+    def _create(self, path: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        SQLModel.metadata.create_all(self._engine(path), tables=ARCHIVED_TABLES)
+
+    def _id_range(self, path: str) -> Tuple[int, int]:
+        prompt = models.Prompt.__table__
+        with self._engine(path).connect() as conn:
+            low, high = conn.execute(select(func.min(prompt.c.id), func.max(prompt.c.id))).one()
+        return (low or 0, high or 0)
+
+    def _paths(self) -> List[str]:
+        # Newest bucket first; the listing is refreshed when the directory changes (another
+        # process may be archiving).
+        try:
+            modified = os.stat(self.directory).st_mtime
+        except FileNotFoundError:
+            return []
+        with self._lock:
+            stale = modified != self._listed_at
+            self._listed_at = modified
+        if stale:
+            names = sorted((n for n in os.listdir(self.directory) if _FILE_PATTERN.match(n)), reverse=True)
+            ranges = {}
+            for name in names:
+                path = os.path.join(self.directory, name)
+                ranges[path] = self._id_range(path)
+            with self._lock:
+                self._id_ranges = ranges
+        with self._lock:
+            return list(self._id_ranges)
+
+    def lookup(self, prompt_id: int, read: Callable[[Session], T]) -> Optional[T]:
+        """
+        Runs `read` on each archive that may hold `prompt_id` and returns the first non-empty
+        result (None if there is none). Returned rows are detached from the archive session.
+        """
+        for path in self._paths():
+            low, high = self._id_ranges.get(path, (0, 0))
+            if not low <= prompt_id <= high:
+                continue
+            with Session(self._engine(path)) as db:
+                result = read(db)
+            if result:
+                return result
+        return None
+
+    def _move(self, engine: Engine, path: str, prompt_ids: List[int]) -> None:
+        self._create(path)
+        copies, deletes = _move_statements()
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("ATTACH DATABASE ? AS archive", (path,))
+            try:
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                try:
+                    hashes = conn.execute(_BLOB_HASHES, {"ids": prompt_ids}).scalars().all()
+                    if hashes:
+                        conn.execute(_COPY_BLOBS, {"hashes": hashes})
+                    for statement in copies + deletes:
+                        conn.execute(statement, {"ids": prompt_ids})
+                    if hashes:
+                        conn.execute(_DELETE_ORPHAN_BLOBS, {"hashes": hashes})
+                    conn.exec_driver_sql("COMMIT")
+                except Exception:
+                    conn.exec_driver_sql("ROLLBACK")
+                    raise
+            finally:
+                conn.exec_driver_sql("DETACH DATABASE archive")
+        low, high = min(prompt_ids), max(prompt_ids)
+        with self._lock:
+            old_low, old_high = self._id_ranges.get(path, (low, high))
+            self._id_ranges[path] = (min(low, old_low), max(high, old_high))
+
+    def archive_before(
+        self,
+        engine: Engine,
+        cutoff: datetime,
+        batch_size: int = ARCHIVE_BATCH_SIZE,
+        vacuum_pages: int = ARCHIVE_VACUUM_PAGES,
+    ) -> int:
+        """
+        Moves every prompt with a timestamp before `cutoff` from `engine`'s database into the
+        archives, oldest first, `batch_size` prompts per transaction; returns how many moved.
+        Safe to interrupt and rerun.
+        """
+        prompt = models.Prompt.__table__
+        oldest = (
+            select(prompt.c.id, prompt.c.timestamp)
+            .where(prompt.c.timestamp < cutoff)
+            .order_by(prompt.c.timestamp, prompt.c.id)
+            .limit(batch_size)
+        )
+        moved = 0
+        while True:
+            with engine.connect() as conn:
+                rows = conn.execute(oldest).all()
+            if not rows:
+                return moved
+            buckets = defaultdict(list)
+            for row in rows:
+                buckets[self.path_for(row.timestamp)].append(row.id)
+            for path, prompt_ids in buckets.items():
+                self._move(engine, path, prompt_ids)
+            moved += len(rows)
+            compact(engine, vacuum_pages)
+            logging.info(f"Archived {moved} prompts older than {cutoff:%Y-%m-%d}")
+
+    def close(self) -> None:
+        with self._lock:
+            engines, self._engines = list(self._engines.values()), {}
+            self._id_ranges, self._listed_at = {}, None
+        for engine in engines:
+            engine.dispose()
+
+
+# Shared by the crud fallbacks; see config.ARCHIVE_DIR.
+history_archive = HistoryArchive()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Move old prompt history into time-bucketed archive files.")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--bucket", choices=list(BUCKET_FORMATS), default=ARCHIVE_BUCKET, help="One archive file per bucket.")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="Prompts per transaction.")
+    parser.add_argument(
+        "--enable-incremental-vacuum", action="store_true",
+        help="Switch an older database to incremental vacuum first (one full VACUUM).",
+    )
+    args = parser.parse_args(argv)
+
+    if args.enable_incremental_vacuum:
+        enable_incremental_vacuum(hot_engine)
+    cutoff = datetime.utcnow() - timedelta(days=args.older_than_days)
+    archive = HistoryArchive(ARCHIVE_DIR, args.bucket)
+    moved = archive.archive_before(hot_engine, cutoff, batch_size=args.batch_size)
+    print(f"archived {moved} prompts older than {cutoff:%Y-%m-%d} into {ARCHIVE_DIR}")
+    archive.close()
+
+
+if __name__ == "__main__":
+    main()
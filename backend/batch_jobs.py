@@ -0,0 +1,415 @@
+"""
+Offline batch execution of stored prompts.
+
+Replays (prompt, model) pairs through the providers' asynchronous batch APIs
+(OpenAI Batch, Anthropic Message Batches), which are cheaper than interactive
+calls and don't count against interactive rate limits. Models whose provider has
+no batch API go through the normal dispatcher instead. Results are written back
+as ModelOutput rows.
+
+Submitted batch ids are saved to BATCH_STATE_FILE as they are created, so a run
+that dies before collecting its results (or half way through submitting) picks
+the existing batches up again when rerun instead of paying for them twice.
+
+Run nightly from the backend directory, e.g.:
+
+    python batch_jobs.py --models "GPT-4.1" "Claude Opus 4" --all-prompts
+    python batch_jobs.py --models "GPT-4.1" --prompt-ids 1 2 3 --provider local
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, select
+
+import crud
+import models
+import schemas
+from api_handlers import openai_handler, claude_handler
+from config import BATCH_POLL_INTERVAL, BATCH_INTERACTIVE_CONCURRENCY, BATCH_STATE_FILE, logging
+from model_dispatcher import call_model, provider_name, resolve_model
+from prompt_optimizer import build_model_prompt, split_instructions
+
+T = TypeVar("T")
+
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Prompt ids per query, well under SQLite's bound-parameter limit.
+PROMPT_ID_CHUNK_SIZE = 500
+
+
+@dataclass
+class BatchItem:
+    custom_id: str
+    prompt_id: int
+    model_name: str
+    sdk_model: str
+    prompt_text: str
+    max_tokens: int
+
+
+@dataclass
+class BatchJobSummary:
+    items: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    provider_batches: int = 0
+    elapsed: float = 0.0
+
+
+def _custom_id(prompt_id: int, sdk_model: str) -> str:
+    # Anthropic only accepts [a-zA-Z0-9_-]{1,64}; keep OpenAI's ids identical for easier debugging.
+    return f"p{prompt_id}-{re.sub(r'[^a-zA-Z0-9_-]', '_', sdk_model)}"[:64]
+
+
+class OpenAIBatchProvider:
+    """Packs chat completions into a JSONL file for the OpenAI Batch API."""
+
+    max_batch_size = 50000
+
+    def __init__(self, client):
+        self.client = client
+
+    def build_requests(self, items: List[BatchItem]) -> List[dict]:
+        requests = []
+        for item in items:
+            instructions, task = split_instructions(item.prompt_text)
+            messages = [{"role": "user", "content": task}]
+            if instructions:
+                messages.insert(0, {"role": "system", "content": instructions})
+            requests.append({
+                "custom_id": item.custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {"model": item.sdk_model, "messages": messages, "max_tokens": item.max_tokens},
+            })
+        return requests
+
+    def submit(self, items: List[BatchItem]) -> str:
+        jsonl = "\n".join(json.dumps(request) for request in self.build_requests(items)).encode("utf-8")
+        input_file = self.client.files.create(file=("batch.jsonl", jsonl), purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id, endpoint="/v1/chat/completions", completion_window="24h"
+        )
+        return batch.id
+
+    def poll(self, batch_id: str) -> str:
+        status = self.client.batches.retrieve(batch_id).status
+        if status == "completed":
+            return COMPLETED
+        if status in ("failed", "expired", "cancelled"):
+            return FAILED
+        return IN_PROGRESS
+
+    def results(self, batch_id: str) -> Dict[str, str]:
+        batch = self.client.batches.retrieve(batch_id)
+        outputs = {}
+        # Successful lines land in the output file, failed ones in the error file.
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if line.strip():
+                    record = json.loads(line)
+                    outputs[record["custom_id"]] = self._parse_line(record)
+        return outputs
+
+    @staticmethod
+    def _parse_line(record: dict) -> str:
+        response = record.get("response") or {}
+        if record.get("error") or response.get("status_code") != 200:
+            error = record.get("error") or response.get("body", {}).get("error") or "unknown error"
+            return f"Error: OpenAI batch request failed. {error}"
+        choices = response["body"].get("choices") or []
+        content = choices[0]["message"].get("content") if choices else None
+        return content.strip() if content else "Error: OpenAI API returned no response or empty content."
+
+
+class AnthropicBatchProvider:
+    """Submits requests through the Anthropic Message Batches API."""
+
+    max_batch_size = 100000
+
+    def __init__(self, client):
+        self.client = client
+
+    @staticmethod
+    def supported(client) -> bool:
+        # Message Batches only exist in newer SDKs than the pinned anthropic~=0.21.
+        return hasattr(getattr(client, "messages", None), "batches")
+
+    def build_requests(self, items: List[BatchItem]) -> List[dict]:
+        requests = []
+        for item in items:
+            instructions, task = split_instructions(item.prompt_text)
+            params = {
+                "model": item.sdk_model,
+                "max_tokens": item.max_tokens,
+                "messages": [{"role": "user", "content": task}],
+            }
+            if instructions:
+                params["system"] = claude_handler.system_param(instructions)
+            requests.append({"custom_id": item.custom_id, "params": params})
+        return requests
+
+    def submit(self, items: List[BatchItem]) -> str:
+        return self.client.messages.batches.create(requests=self.build_requests(items)).id
+
+    def poll(self, batch_id: str) -> str:
+        batch = self.client.messages.batches.retrieve(batch_id)
+        return COMPLETED if batch.processing_status == "ended" else IN_PROGRESS
+
+    def results(self, batch_id: str) -> Dict[str, str]:
+        outputs = {}
+        for entry in self.client.messages.batches.results(batch_id):
+            result = entry.result
+            if result.type == "succeeded":
+                text = "".join(block.text for block in result.message.content if block.type == "text")
+                outputs[entry.custom_id] = text.strip() or "Error: Anthropic API returned no text content."
+            else:  # errored, canceled or expired
+                outputs[entry.custom_id] = f"Error: Anthropic batch request {result.type}."
+        return outputs
+
+
+class LocalBatchProvider:
+    """
+    In-process stand-in for a provider batch API, for tests and dry runs.
+
+    Batches report in_progress for `polls_until_done` polls, then complete with
+    `responder(item)` for every item (an echo of the prompt by default).
+    """
+
+    max_batch_size = 100000
+
+    def __init__(self, responder: Optional[Callable[[BatchItem], str]] = None, polls_until_done: int = 1):
+        self.responder = responder or (lambda item: f"[{item.sdk_model}] {item.prompt_text}")
+        self.polls_until_done = polls_until_done
+        self.submitted: Dict[str, List[BatchItem]] = {}
+        self._polls: Dict[str, int] = {}
+
+    def submit(self, items: List[BatchItem]) -> str:
+        batch_id = f"local-batch-{len(self.submitted) + 1}"
+        self.submitted[batch_id] = list(items)
+        self._polls[batch_id] = 0
+        return batch_id
+
+    def poll(self, batch_id: str) -> str:
+        self._polls[batch_id] += 1
+        return COMPLETED if self._polls[batch_id] > self.polls_until_done else IN_PROGRESS
+
+    def results(self, batch_id: str) -> Dict[str, str]:
+        return {item.custom_id: self.responder(item) for item in self.submitted[batch_id]}
+
+
+def default_providers() -> Dict[str, object]:
+    """Batch adapters for every provider that has both a batch API and a configured client."""
+    providers = {}
+    if openai_handler.client is not None:
+        providers["openai"] = OpenAIBatchProvider(openai_handler.client)
+    if claude_handler.client is not None:
+        if AnthropicBatchProvider.supported(claude_handler.client):
+            providers["claude"] = AnthropicBatchProvider(claude_handler.client)
+        else:
+            logging.info("The installed anthropic SDK has no Message Batches API; Claude models run interactively.")
+    return providers
+
+
+def build_items(db: Session, prompt_ids: Iterable[int], model_names: List[str]) -> List[BatchItem]:
+    """
+    Builds one BatchItem per (prompt, model) pair.
+
+    Raises:
+        UnsupportedModelError: If a model is not in MODEL_MAP.
+    """
+    resolved = {name: resolve_model(name) for name in model_names}
+    items = []
+    for id_chunk in _chunks(sorted(set(prompt_ids)), PROMPT_ID_CHUNK_SIZE):
+        statement = (
+            select(models.Prompt)
+            .where(models.Prompt.id.in_(id_chunk))
+            .options(selectinload(models.Prompt.questionnaire_responses))
+            .order_by(models.Prompt.id)
+        )
+        items.extend(_items_for(db.exec(statement).all(), resolved))
+    return items
+
+
+def _items_for(prompts: List[models.Prompt], resolved: Dict[str, tuple]) -> List[BatchItem]:
+    items = []
+    for prompt_obj in prompts:
+        for model_name, (sdk_model, _handler, max_tokens) in resolved.items():
+            items.append(BatchItem(
+                custom_id=_custom_id(prompt_obj.id, sdk_model),
+                prompt_id=prompt_obj.id,
+                model_name=model_name,
+                sdk_model=sdk_model,
+                prompt_text=build_model_prompt(prompt_obj, model_name),
+                max_tokens=max_tokens,
+            ))
+    return items
+
+
+def _chunks(items: List[T], size: int) -> Iterable[List[T]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _load_state(path: Optional[str]) -> List[Tuple[str, str, List[str]]]:
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [tuple(entry) for entry in json.load(f)["batches"]]
+
+
+def _save_state(path: Optional[str], batches: List[Tuple[str, str, List[str]]]) -> None:
+    if not path:
+        return
+    # Written to a temporary file and renamed, so a crash mid-write keeps the previous state.
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"batches": batches}, f)
+    os.replace(f"{path}.tmp", path)
+
+
+async def _run_interactive(items: List[BatchItem]) -> Dict[str, str]:
+    # Bounded so thousands of items don't overflow the rate limiter's wait queue.
+    semaphore = asyncio.Semaphore(BATCH_INTERACTIVE_CONCURRENCY)
+
+    async def run_one(item: BatchItem):
+        async with semaphore:
+            result = await call_model(item.model_name, item.prompt_text)
+            return item.custom_id, result.output
+
+    return dict(await asyncio.gather(*(run_one(item) for item in items)))
+
+
+def run_batch_job(
+    db: Session,
+    prompt_ids: Iterable[int],
+    model_names: List[str],
+    providers: Optional[Dict[str, object]] = None,
+    poll_interval: float = BATCH_POLL_INTERVAL,
+    state_path: Optional[str] = None,
+) -> BatchJobSummary:
+    """
+    Runs every (prompt, model) pair and stores the successful outputs.
+
+    Items are grouped per provider and split into batches of at most
+    `max_batch_size`; all batches are submitted before any is polled, so
+    provider-side processing overlaps. Providers missing from `providers`
+    (default: default_providers()) are run through the interactive dispatcher.
+    Error results are counted but, as in the interactive endpoints, not stored.
+
+    With `state_path`, every submitted batch is recorded there before the next
+    one is submitted; batches already recorded by an earlier, interrupted run
+    are polled again instead of resubmitting their items. The file is removed
+    once the results are stored.
+    """
+    started = time.perf_counter()
+    providers = default_providers() if providers is None else providers
+    items = build_items(db, prompt_ids, model_names)
+    by_custom_id = {item.custom_id: item for item in items}
+    summary = BatchJobSummary(items=len(items))
+
+    submitted = [entry for entry in _load_state(state_path) if entry[0] in providers]
+    pending = [(providers[provider], batch_id) for provider, batch_id, _ids in submitted]  # (adapter, batch id)
+    already_submitted = {custom_id for _provider, _batch_id, custom_ids in submitted for custom_id in custom_ids}
+    if submitted:
+        logging.info(f"Resuming {len(submitted)} provider batches from {state_path}.")
+
+    batched: Dict[str, List[BatchItem]] = {}
+    interactive: List[BatchItem] = []
+    for item in items:
+        provider = provider_name(resolve_model(item.model_name)[1])
+        if item.custom_id in already_submitted:
+            continue
+        if provider in providers:
+            batched.setdefault(provider, []).append(item)
+        else:
+            interactive.append(item)
+
+    for provider, provider_items in batched.items():
+        adapter = providers[provider]
+        for chunk in _chunks(provider_items, adapter.max_batch_size):
+            batch_id = adapter.submit(chunk)
+            logging.info(f"Submitted {provider} batch {batch_id} with {len(chunk)} requests.")
+            pending.append((adapter, batch_id))
+            submitted.append((provider, batch_id, [item.custom_id for item in chunk]))
+            _save_state(state_path, submitted)
+    summary.provider_batches = len(pending)
+
+    outputs: Dict[str, str] = {}
+    if interactive:
+        logging.info(f"Running {len(interactive)} requests without a batch API interactively.")
+        outputs.update(asyncio.run(_run_interactive(interactive)))
+
+    while pending:
+        still_pending = []
+        for adapter, batch_id in pending:
+            status = adapter.poll(batch_id)
+            if status == COMPLETED:
+                outputs.update(adapter.results(batch_id))
+            elif status == FAILED:
+                logging.error(f"Provider batch {batch_id} failed.")
+            else:
+                still_pending.append((adapter, batch_id))
+        pending = still_pending
+        if pending:
+            time.sleep(poll_interval)
+
+    rows = []
+    for custom_id, item in by_custom_id.items():
+        output = outputs.get(custom_id, "Error: No result returned for this request.")
+        if output.startswith("Error:"):
+            summary.failed += 1
+            logging.warning(f"Batch item {custom_id} ({item.model_name}) failed: {output}")
+            continue
+        summary.succeeded += 1
+        rows.append((item.prompt_id, schemas.ModelOutputCreate(model_name=item.model_name, output=output)))
+    crud.create_model_outputs(db, rows)
+    if state_path and os.path.exists(state_path):
+        os.remove(state_path)
+
+    summary.elapsed = time.perf_counter() - started
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay stored prompts through provider batch APIs.")
+    parser.add_argument("--models", nargs="+", required=True, help="Friendly model names from MODEL_MAP.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--prompt-ids", nargs="+", type=int)
+    target.add_argument("--all-prompts", action="store_true")
+    parser.add_argument("--provider", choices=["auto", "local"], default="auto",
+                        help="'local' answers every request in-process without network calls.")
+    parser.add_argument("--poll-interval", type=float, default=BATCH_POLL_INTERVAL)
+    args = parser.parse_args(argv)
+
+    from database import engine  # imported late so --help works without touching the database
+
+    with Session(engine) as db:
+        prompt_ids = args.prompt_ids or db.exec(select(models.Prompt.id)).all()
+        providers, state_path = None, BATCH_STATE_FILE
+        if args.provider == "local":
+            # Local batch ids only live as long as this process, so there is nothing to resume.
+            local = LocalBatchProvider()
+            providers = {provider_name(handler): local for _sdk, handler, _max in map(resolve_model, args.models)}
+            state_path = None
+        summary = run_batch_job(
+            db, prompt_ids, args.models, providers=providers, poll_interval=args.poll_interval, state_path=state_path
+        )
+    print(
+        f"{summary.items} requests in {summary.provider_batches} provider batches: "
+        f"{summary.succeeded} stored, {summary.failed} failed ({summary.elapsed:.1f}s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark: read/write throughput under concurrent load for each database profile
+(database.SQLITE_PROFILES).
+
+Writer threads store model outputs one commit at a time, as the request path does
+with write-behind disabled, while reader threads load prompts with their details
+and history pages. Builds a throwaway SQLite file per profile (nothing touches
+prompts.db). Run from the backend directory:
+
+    python -m benchmarks.database_profiles [seconds] [writers] [readers]
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, SQLModel
+
+import crud
+import models  # noqa: F401  (registers the tables)
+import schemas
+from database import SQLITE_PROFILES, make_engine
+from migrations import migrate
+
+PROMPTS = 5000
+
+
+def build(engine) -> None:
+    SQLModel.metadata.create_all(engine)
+    migrate(engine)
+    started = datetime(2024, 1, 1)
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.executemany(
+            "INSERT INTO prompt (id, base_prompt, timestamp) VALUES (?, ?, ?)",
+            ((i, f"prompt {i}", started + timedelta(seconds=i)) for i in range(1, PROMPTS + 1)),
+        )
+        cursor.executemany(
+            "INSERT INTO modeloutput (prompt_id, model_name, output, timestamp) VALUES (?, 'M', ?, ?)",
+            ((i, f"output {i} " * 40, started) for i in range(1, PROMPTS + 1) for _ in range(2)),
+        )
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def run_load(engine, seconds: float, writers: int, readers: int) -> dict:
+    counts = {"writes": 0, "reads": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def count(key: str) -> None:
+        with lock:
+            counts[key] += 1
+
+    def write(seed: int) -> None:
+        rng = random.Random(seed)
+        with Session(engine) as db:
+            while time.monotonic() < stop:
+                output = schemas.ModelOutputCreate(model_name="M", output=f"answer {rng.getrandbits(64):x} " * 40)
+                try:
+                    crud.create_model_output(db, output, rng.randint(1, PROMPTS))
+                    count("writes")
+                except Exception:
+                    db.rollback()
+                    count("errors")
+
+    def read(seed: int) -> None:
+        rng = random.Random(seed)
+        with Session(engine) as db:
+            while time.monotonic() < stop:
+                try:
+                    crud.get_prompt_with_details(db, rng.randint(1, PROMPTS))
+                    crud.get_prompts_page(db, limit=20)
+                    db.rollback()  # end the read transaction, as a request would
+                    db.expunge_all()
+                    count("reads")
+                except Exception:
+                    db.rollback()
+                    count("errors")
+
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=read, args=(1000 + i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {key: value / seconds for key, value in counts.items()}
+
+
+def main(seconds: float = 5.0, writers: int = 4, readers: int = 8) -> None:
+    print(f"{writers} writer and {readers} reader threads, {seconds:g}s per profile")
+    print(f"  {'profile':12} {'writes/s':>10} {'reads/s':>10} {'errors/s':>10}")
+    for profile in SQLITE_PROFILES:
+        path = os.path.join(tempfile.mkdtemp(), f"{profile}.db")
+        engine = make_engine(f"sqlite:///{path}", profile=profile, echo=False)
+        build(engine)
+        result = run_load(engine, seconds, writers, readers)
+        print(f"  {profile:12} {result['writes']:10.1f} {result['reads']:10.1f} {result['errors']:10.1f}")
+        engine.dispose()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+if __name__ == "__main__":
+    main(*(float(arg) for arg in sys.argv[1:2]), *(int(arg) for arg in sys.argv[2:4]))
@@ -0,0 +1,31 @@
+"""
+Micro-benchmark: building a GenerativeModel per call vs. the cached registry.
+
+Neither path touches the network, so no API key is needed. Run from the backend directory:
+
+    python -m benchmarks.gemini_model_registry [iterations]
+"""
+import sys
+import timeit
+
+import google.generativeai as genai
+from api_handlers import gemini_handler
+
+MODEL_NAME = "gemini-1.5-pro-latest"
+
+
+def main(iterations: int = 20000) -> None:
+    gemini_handler.clear_model_cache()
+    gemini_handler.get_model(MODEL_NAME)  # built once, as on the first call
+
+    per_call = timeit.timeit(lambda: genai.GenerativeModel(MODEL_NAME), number=iterations)
+    cached = timeit.timeit(lambda: gemini_handler.get_model(MODEL_NAME), number=iterations)
+
+    print(f"{iterations} lookups of {MODEL_NAME}")
+    print(f"  GenerativeModel() per call: {per_call / iterations * 1e6:8.2f} us/call")
+    print(f"  cached registry:            {cached / iterations * 1e6:8.2f} us/call")
+    print(f"  speedup:                    {per_call / cached:8.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,98 @@
+"""
+Benchmark: history lookups on a large synthetic database, before and after the
+history_indexes migration.
+
+Builds a throwaway SQLite file (nothing touches prompts.db). Run from the backend directory:
+
+    python -m benchmarks.history_indexes [prompts] [lookups]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, SQLModel, create_engine
+
+import crud
+import models  # noqa: F401  (registers the tables)
+from migrations import migrate
+
+INDEXES = ("ix_questionnaireresponse_prompt_id", "ix_modeloutput_prompt_id", "ix_prompt_user_id", "ix_prompt_timestamp_id")
+USERS = 1000
+
+
+def build(engine, n_prompts: int) -> None:
+    """Creates the schema as it was before the indexes (schema version 1) and fills it."""
+    SQLModel.metadata.create_all(engine)
+    started = datetime(2023, 1, 1)
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for name in INDEXES:
+            cursor.execute(f"DROP INDEX IF EXISTS {name}")
+        cursor.execute("PRAGMA user_version = 1")
+        cursor.executemany("INSERT INTO user (id, username) VALUES (?, ?)", ((i, f"user{i}") for i in range(1, USERS + 1)))
+        cursor.executemany(
+            "INSERT INTO prompt (id, user_id, base_prompt, timestamp) VALUES (?, ?, ?, ?)",
+            ((i, random.randint(1, USERS), f"prompt {i}", started + timedelta(seconds=i)) for i in range(1, n_prompts + 1)),
+        )
+        cursor.executemany(
+            "INSERT INTO questionnaireresponse (prompt_id, question, answer) VALUES (?, ?, ?)",
+            ((i, f"q{j}", f"answer {j}") for i in range(1, n_prompts + 1) for j in range(2)),
+        )
+        cursor.executemany(
+            "INSERT INTO modeloutput (prompt_id, model_name, output, timestamp) VALUES (?, ?, ?, ?)",
+            ((i, f"model {j}", f"output {j}", started) for i in range(1, n_prompts + 1) for j in range(3)),
+        )
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def time_lookups(engine, n_prompts: int, lookups: int) -> dict:
+    rng = random.Random(42)
+    prompt_ids = [rng.randint(1, n_prompts) for _ in range(lookups)]
+    user_ids = [rng.randint(1, USERS) for _ in range(lookups)]
+    timings = {}
+    with Session(engine) as db:
+        # A cursor deep into the history: the worst case for OFFSET, the ordinary case for keyset.
+        _page, deep_cursor = crud.get_prompts_page(db, limit=n_prompts * 9 // 10)
+        cases = {
+            "questionnaire responses by prompt": lambda i: crud.get_questionnaire_responses_by_prompt(db, prompt_ids[i]),
+            "model outputs by prompt": lambda i: crud.get_model_outputs_by_prompt(db, prompt_ids[i]),
+            "prompts by user": lambda i: crud.get_prompts_by_user(db, user_ids[i], limit=20),
+            "keyset page (deep cursor)": lambda i: crud.get_prompts_page(db, limit=20, cursor=deep_cursor),
+        }
+        for label, lookup in cases.items():
+            start = time.perf_counter()
+            for i in range(lookups):
+                lookup(i)
+            timings[label] = (time.perf_counter() - start) / lookups
+            db.expunge_all()
+    return timings
+
+
+def main(n_prompts: int = 200_000, lookups: int = 200) -> None:
+    path = os.path.join(tempfile.mkdtemp(), "history.db")
+    engine = create_engine(f"sqlite:///{path}")
+    build(engine, n_prompts)
+
+    before = time_lookups(engine, n_prompts, lookups)
+    start = time.perf_counter()
+    migrate(engine)
+    migration_time = time.perf_counter() - start
+    after = time_lookups(engine, n_prompts, lookups)
+
+    print(f"{n_prompts} prompts, {n_prompts * 2} questionnaire responses, {n_prompts * 3} model outputs")
+    print(f"migration took {migration_time:.2f}s")
+    print(f"  {'lookup':36} {'before':>12} {'after':>12} {'speedup':>9}")
+    for label in before:
+        print(f"  {label:36} {before[label] * 1e3:9.3f} ms {after[label] * 1e3:9.3f} ms {before[label] / after[label]:8.1f}x")
+    engine.dispose()
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
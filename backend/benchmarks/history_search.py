@@ -0,0 +1,102 @@
+"""
+Benchmark: full-text search over history (FTS5) vs. a LIKE scan.
+
+Builds a throwaway SQLite file (nothing touches prompts.db). Run from the backend directory:
+
+    python -m benchmarks.history_search [prompts] [queries]
+"""
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, create_engine
+
+import crud
+import models  # noqa: F401  (registers the tables)
+from migrations import migrate
+
+# A Zipf-like vocabulary: a few very common words and a long tail, as in real text.
+VOCABULARY = [f"w{i}" for i in range(20_000)]
+CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+
+
+def _sentence(rng: random.Random, length: int) -> str:
+    return " ".join(rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=length)) + f" {rng.getrandbits(40):x}"
+
+
+def build(engine, n_prompts: int) -> None:
+    SQLModel.metadata.create_all(engine)
+    migrate(engine)  # the triggers index every row as it is inserted
+    rng = random.Random(7)
+    now = datetime(2024, 1, 1)
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.executemany(
+            "INSERT INTO prompt (id, base_prompt, timestamp) VALUES (?, ?, ?)",
+            ((i, _sentence(rng, 12), now) for i in range(1, n_prompts + 1)),
+        )
+        cursor.executemany(
+            "INSERT INTO questionnaireresponse (prompt_id, question, answer) VALUES (?, 'q', ?)",
+            ((i, _sentence(rng, 6)) for i in range(1, n_prompts + 1) for _ in range(2)),
+        )
+        cursor.executemany(
+            "INSERT INTO modeloutput (prompt_id, model_name, output, timestamp) VALUES (?, 'M', ?, ?)",
+            ((i, _sentence(rng, 80), now) for i in range(1, n_prompts + 1) for _ in range(3)),
+        )
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def _like_scan(db: Session, term: str, limit: int) -> list:
+    # What finding an old prompt would cost without the index.
+    pattern = f"%{term}%"
+    hits = []
+    for statement in (
+        "SELECT prompt.id FROM prompt WHERE base_prompt LIKE :p LIMIT :n",
+        "SELECT prompt_id FROM questionnaireresponse WHERE answer LIKE :p LIMIT :n",
+        "SELECT prompt_id FROM modeloutput WHERE output LIKE :p LIMIT :n",
+    ):
+        hits.extend(db.execute(text(statement), {"p": pattern, "n": limit}).all())
+    return hits
+
+
+def main(n_prompts: int = 100_000, queries: int = 50) -> None:
+    path = os.path.join(tempfile.mkdtemp(), "search.db")
+    engine = create_engine(f"sqlite:///{path}")
+    start = time.perf_counter()
+    build(engine, n_prompts)
+    build_time = time.perf_counter() - start
+
+    rng = random.Random(11)
+    # Two mid-frequency words, like a typical search for an old prompt.
+    terms = [f"{rng.choice(VOCABULARY[200:2000])} {rng.choice(VOCABULARY[200:2000])}" for _ in range(queries)]
+    rare = [f"{rng.getrandbits(40):x}" for _ in range(queries)]  # mostly no match: the full-scan worst case
+    with Session(engine) as db:
+        results = {}
+        for label, run in (
+            ("FTS5, two words", lambda t: crud.search_history(db, t, limit=20)),
+            ("FTS5, rare token", lambda t: crud.search_history(db, t, limit=20)),
+            ("LIKE scan, rare token", lambda t: _like_scan(db, t, 20)),
+        ):
+            batch = rare if "rare" in label else terms
+            start = time.perf_counter()
+            for term in batch:
+                run(term)
+            results[label] = (time.perf_counter() - start) / len(batch)
+
+    print(f"{n_prompts} prompts, {n_prompts * 6} searchable rows (built and indexed in {build_time:.1f}s)")
+    for label, seconds in results.items():
+        print(f"  {label:26} {seconds * 1e3:9.2f} ms/query")
+    engine.dispose()
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
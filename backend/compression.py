@@ -0,0 +1,133 @@
+"""
+Transparent compression of stored model outputs.
+
+Long-form outputs make up most of prompts.db. `CompressedText` is the column type
+for ModelOutput.output: values at or above OUTPUT_COMPRESSION_MIN_BYTES are written
+as a BLOB of `MAGIC + codec version + compressed bytes`, shorter ones stay plain
+TEXT, and rows written before compression existed are plain TEXT too. Reads
+accept both, so callers only ever see `str`.
+
+SQL running inside SQLite (the history search triggers) reads the column through
+the `history_text()` function, which every SQLAlchemy connection gets on connect.
+Connections opened any other way (the sqlite3 CLI, a bare `sqlite3.connect()`)
+don't have it, so their inserts and updates of prompts and model outputs fail
+(see migrations.py); call `register_sqlite_functions` on such a connection first.
+
+Rows stored before compression was enabled can be compressed in place, and rows
+stored before content-addressed deduplication (models.TextBlob) moved into shared
+blobs, from the backend directory:
+
+    python compression.py --dedupe --backfill --vacuum
+"""
+import argparse
+import os
+import zlib
+from typing import List, Optional, Union
+
+from sqlalchemy import String, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.types import TypeDecorator
+
+from config import OUTPUT_COMPRESSION_ENABLED, OUTPUT_COMPRESSION_MIN_BYTES, OUTPUT_COMPRESSION_LEVEL
+
+MAGIC = b"\x1fZ"
+ZLIB_V1 = 1  # the only codec so far; the version byte leaves room for e.g. zstd with a trained dictionary
+
+
+class UnknownCodecError(ValueError):
+    """Raised when a stored value carries a codec version this build can't read."""
+
+    def __init__(self, version: int):
+        super().__init__(f"Unknown compressed-text codec version {version}.")
+        self.version = version
+
+
+def is_compressed(value: Union[str, bytes, None]) -> bool:
+    return isinstance(value, bytes) and value.startswith(MAGIC)
+
+
+def compress_text(text: str, min_bytes: Optional[int] = None) -> Union[str, bytes]:
+    """Returns the stored form of `text`: compressed bytes, or `text` itself if it's too short to be worth it."""
+    min_bytes = OUTPUT_COMPRESSION_MIN_BYTES if min_bytes is None else min_bytes
+    encoded = text.encode("utf-8")
+    if len(encoded) < min_bytes:
+        return text
+    compressed = MAGIC + bytes([ZLIB_V1]) + zlib.compress(encoded, OUTPUT_COMPRESSION_LEVEL)
+    # Highly random text can come out larger; keep whichever is smaller.
+    return compressed if len(compressed) < len(encoded) else text
+
+
+def decompress_text(value: Union[str, bytes, None]) -> Optional[str]:
+    """
+    Inverse of compress_text; plain TEXT values pass through unchanged.
+
+    Raises:
+        UnknownCodecError: If the value was written with a codec this build doesn't know.
+    """
+    if not isinstance(value, bytes):
+        return value
+    if not value.startswith(MAGIC):
+        return value.decode("utf-8")
+    version = value[len(MAGIC)]
+    if version == ZLIB_V1:
+        return zlib.decompress(value[len(MAGIC) + 1:]).decode("utf-8")
+    raise UnknownCodecError(version)
+
+
+class CompressedText(TypeDecorator):
+    """String column that compresses on write and decompresses on read."""
+
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or not OUTPUT_COMPRESSION_ENABLED:
+            return value
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
+
+
+def register_sqlite_functions(dbapi_connection) -> None:
+    """Makes history_text(value) available to SQL on a raw sqlite3 (or aiosqlite) connection."""
+    dbapi_connection.create_function("history_text", 1, decompress_text, deterministic=True)
+
+
+@event.listens_for(Engine, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    # Every engine in the process, including async engines' sync halves and test engines.
+    if hasattr(dbapi_connection, "create_function"):
+        register_sqlite_functions(dbapi_connection)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compress and deduplicate stored prompts and model outputs.")
+    parser.add_argument("--dedupe", action="store_true", help="Move inline prompt and output text into shared blobs.")
+    parser.add_argument("--backfill", action="store_true", help="Rewrite plain-text outputs in compressed form.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per transaction.")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards so the file actually shrinks.")
+    args = parser.parse_args(argv)
+
+    # Imported late so --help works without touching the database.
+    from sqlmodel import Session
+    import crud
+    from database import DATABASE_URL, engine
+
+    path = DATABASE_URL.split("///", 1)[-1]
+    size_before = os.path.getsize(path) if os.path.exists(path) else None
+    if args.dedupe:
+        with Session(engine) as db:
+            print(f"moved {crud.dedupe_stored_texts(db, batch_size=args.batch_size)} rows into text blobs")
+    if args.backfill:
+        with Session(engine) as db:
+            print(f"rewrote {crud.compress_stored_outputs(db, batch_size=args.batch_size)} outputs")
+    if args.vacuum:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("VACUUM")  # can't run inside a transaction
+    if size_before is not None:
+        print(f"{path}: {size_before / 1e6:.1f} MB -> {os.path.getsize(path) / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -36,3 +36,102 @@ if not XAI_API_KEY:
     logging.warning("XAI_API_KEY not found in environment variables.")
 if not GOOGLE_API_KEY:
     logging.warning("GOOGLE_API_KEY not found in environment variables.")
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logging.warning(f"{name}={value!r} is not an integer; using default {default}.")
+        return default
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logging.warning(f"{name}={value!r} is not a number; using default {default}.")
+        return default
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# LLM response cache (see response_cache.py)
+RESPONSE_CACHE_ENABLED = _env_bool("RESPONSE_CACHE_ENABLED", True)
+RESPONSE_CACHE_MAX_ENTRIES = _env_int("RESPONSE_CACHE_MAX_ENTRIES", 512)
+RESPONSE_CACHE_TTL_SECONDS = _env_int("RESPONSE_CACHE_TTL_SECONDS", 24 * 60 * 60)
+
+# Shared HTTP connection pools for provider SDK clients (see api_handlers/client_factory.py)
+PROVIDER_HTTP_MAX_CONNECTIONS = _env_int("PROVIDER_HTTP_MAX_CONNECTIONS", 100)
+PROVIDER_HTTP_MAX_KEEPALIVE_CONNECTIONS = _env_int("PROVIDER_HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)
+PROVIDER_HTTP_KEEPALIVE_EXPIRY = _env_float("PROVIDER_HTTP_KEEPALIVE_EXPIRY", 30.0)
+PROVIDER_HTTP_CONNECT_TIMEOUT = _env_float("PROVIDER_HTTP_CONNECT_TIMEOUT", 10.0)
+PROVIDER_HTTP_READ_TIMEOUT = _env_float("PROVIDER_HTTP_READ_TIMEOUT", 600.0)
+PROVIDER_HTTP2 = _env_bool("PROVIDER_HTTP2", False)
+
+# Per-provider rate limiting (see rate_limiter.py). 0 disables a bucket.
+# Provider keys match the handler module names: openai, claude, grok, gemini.
+RATE_LIMITS = {
+    provider: {
+        "rpm": _env_int(f"RATE_LIMIT_{provider.upper()}_RPM", 0),
+        "tpm": _env_int(f"RATE_LIMIT_{provider.upper()}_TPM", 0),
+        "max_in_flight": _env_int(f"RATE_LIMIT_{provider.upper()}_MAX_IN_FLIGHT", 32),
+    }
+    for provider in ("openai", "claude", "grok", "gemini")
+}
+RATE_LIMIT_MODEL_MAX_IN_FLIGHT = _env_int("RATE_LIMIT_MODEL_MAX_IN_FLIGHT", 16)
+RATE_LIMIT_MAX_QUEUE = _env_int("RATE_LIMIT_MAX_QUEUE", 256)
+RATE_LIMIT_QUEUE_TIMEOUT = _env_float("RATE_LIMIT_QUEUE_TIMEOUT", 60.0)
+
+# Retries and circuit breakers around provider calls (see api_handlers/resilience.py)
+RETRY_MAX_ATTEMPTS = _env_int("RETRY_MAX_ATTEMPTS", 3)
+RETRY_BASE_DELAY = _env_float("RETRY_BASE_DELAY", 0.5)
+RETRY_MAX_DELAY = _env_float("RETRY_MAX_DELAY", 20.0)  # longest wait between retries; a longer Retry-After ends the retries
+CIRCUIT_FAILURE_THRESHOLD = _env_int("CIRCUIT_FAILURE_THRESHOLD", 5)
+CIRCUIT_RECOVERY_TIMEOUT = _env_float("CIRCUIT_RECOVERY_TIMEOUT", 30.0)
+CIRCUIT_HALF_OPEN_MAX_CALLS = _env_int("CIRCUIT_HALF_OPEN_MAX_CALLS", 1)
+
+# Hedged requests (see hedging.py). Off unless enabled here or per request.
+HEDGE_ENABLED = _env_bool("HEDGE_ENABLED", False)
+HEDGE_PERCENTILE = _env_float("HEDGE_PERCENTILE", 0.95)  # of the primary model's recent latency
+HEDGE_MIN_SAMPLES = _env_int("HEDGE_MIN_SAMPLES", 20)  # below this, HEDGE_DEFAULT_DELAY is used
+HEDGE_DEFAULT_DELAY = _env_float("HEDGE_DEFAULT_DELAY", 5.0)
+HEDGE_MIN_DELAY = _env_float("HEDGE_MIN_DELAY", 0.5)
+HEDGE_WINDOW = _env_int("HEDGE_WINDOW", 200)  # latency samples kept per SDK model
+
+# Offline batch jobs (see batch_jobs.py)
+BATCH_POLL_INTERVAL = _env_float("BATCH_POLL_INTERVAL", 30.0)  # seconds between provider batch status checks
+BATCH_INTERACTIVE_CONCURRENCY = _env_int("BATCH_INTERACTIVE_CONCURRENCY", 16)  # for models without a batch API
+BATCH_STATE_FILE = os.getenv("BATCH_STATE_FILE", "./batch_state.json")  # submitted batch ids, so a rerun resumes them
+
+OUTPUT_COMPRESSION_ENABLED = _env_bool("OUTPUT_COMPRESSION_ENABLED", True)
+OUTPUT_COMPRESSION_MIN_BYTES = _env_int("OUTPUT_COMPRESSION_MIN_BYTES", 256)  # shorter outputs stay plain text
+OUTPUT_COMPRESSION_LEVEL = _env_int("OUTPUT_COMPRESSION_LEVEL", 6)  # zlib, 1-9
+
+# Write-behind persistence of model outputs (see write_behind.py)
+WRITE_BEHIND_ENABLED = _env_bool("WRITE_BEHIND_ENABLED", True)  # false: each output is committed before the response
+WRITE_BEHIND_MAX_BATCH_SIZE = _env_int("WRITE_BEHIND_MAX_BATCH_SIZE", 500)  # rows per group commit
+WRITE_BEHIND_MAX_DELAY = _env_float("WRITE_BEHIND_MAX_DELAY", 0.05)  # seconds an output may wait for others to join its commit
+
+# Database engine (see database.py). The app relies on SQLite features (FTS5, PRAGMAs), so keep a sqlite:/// URL.
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./prompts.db")
+DB_ECHO = _env_bool("DB_ECHO", False)  # log every SQL statement
+DB_PROFILE = os.getenv("DB_PROFILE", "wal")  # PRAGMA set applied on connect; see database.SQLITE_PROFILES
+SQLITE_PRAGMAS = os.getenv("SQLITE_PRAGMAS", "")  # per-pragma overrides, e.g. "busy_timeout=10000,synchronous=FULL"
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = _env_float("DB_POOL_TIMEOUT", 30.0)  # seconds to wait for a free connection
+
+# Archival of old prompt history (see archive.py)
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+ARCHIVE_AFTER_DAYS = _env_int("ARCHIVE_AFTER_DAYS", 365)  # prompts older than this leave the hot database
+ARCHIVE_BUCKET = os.getenv("ARCHIVE_BUCKET", "month")  # one archive file per "month" or "year"
+ARCHIVE_BATCH_SIZE = _env_int("ARCHIVE_BATCH_SIZE", 1000)  # prompts moved per transaction
+ARCHIVE_VACUUM_PAGES = _env_int("ARCHIVE_VACUUM_PAGES", 2000)  # free pages handed back after each batch
@@ -1,8 +1,18 @@
+import asyncio
+
+from sqlalchemy import bindparam, func, insert, text, tuple_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import attributes, selectinload
 from sqlmodel import Session, select
-from typing import List, Optional
+from sqlmodel.ext.asyncio.session import AsyncSession
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
 
+import archive
 import models
 import schemas
+from config import OUTPUT_COMPRESSION_MIN_BYTES
+from pagination import decode_cursor, decode_rank_cursor, encode_cursor, encode_rank_cursor
 
 # User CRUD operations
 def create_user(db: Session, user: schemas.UserCreate) -> models.User:
@@ -19,25 +29,462 @@ def get_user_by_username(db: Session, username: str) -> Optional[models.User]:
     statement = select(models.User).where(models.User.username == username)
     return db.exec(statement).first()
 
+# Content-addressed text (models.TextBlob)
+# Prompt.base_prompt and ModelOutput.output are written once per distinct text; rows refer
+# to it by hash and models.py fills the text back in whenever a row is loaded.
+
+def _store_texts_statement(texts: List[str]):
+    """INSERT ... ON CONFLICT DO NOTHING for the texts' blobs, and the texts' hashes in order."""
+    hashes = [models.content_hash(t) for t in texts]
+    rows = [{"hash": h, "body": t} for h, t in dict(zip(hashes, texts)).items()]
+    return sqlite_insert(models.TextBlob.__table__).on_conflict_do_nothing(), rows, hashes
+
+def store_texts(db: Session, texts: List[str]) -> List[str]:
+    """Stores each distinct text once (no commit); returns the hashes, in the order given."""
+    statement, rows, hashes = _store_texts_statement(texts)
+    if rows:
+        db.execute(statement, rows)
+    return hashes
+
+def _new_prompt(prompt: schemas.PromptCreate, user_id: Optional[int], prompt_hash: str) -> models.Prompt:
+    return models.Prompt.model_validate(
+        prompt, update={"user_id": user_id, "base_prompt": "", "base_prompt_hash": prompt_hash}
+    )
+
+def _new_model_output(output: schemas.ModelOutputCreate, prompt_id: int, output_hash: str) -> models.ModelOutput:
+    return models.ModelOutput.model_validate(
+        output, update={"prompt_id": prompt_id, "output": "", "output_hash": output_hash}
+    )
+
+def _show_texts(db_objects, texts: List[str]) -> None:
+    # After the flush, so the in-session objects read like loaded ones without the text being written inline.
+    for db_object, value in zip(db_objects, texts):
+        text_attr = models.BLOB_FIELDS[type(db_object)][0]
+        attributes.set_committed_value(db_object, text_attr, value)
+
+def _prompt_hash_statement(base_prompt: str, model_name: Optional[str]):
+    statement = (
+        select(models.ModelOutput)
+        .join(models.Prompt, models.Prompt.id == models.ModelOutput.prompt_id)
+        .where(models.Prompt.base_prompt_hash == models.content_hash(base_prompt))
+    )
+    if model_name is not None:
+        statement = statement.where(models.ModelOutput.model_name == model_name)
+    return statement.order_by(models.ModelOutput.id)
+
+def find_model_outputs(db: Session, base_prompt: str, model_name: Optional[str] = None) -> List[models.ModelOutput]:
+    """
+    Outputs already stored for this exact prompt text (optionally from one model), oldest first.
+
+    An index lookup on Prompt.base_prompt_hash rather than a text comparison. Only sees
+    prompts written through crud or hashed by `dedupe_stored_texts`.
+    """
+    return db.exec(_prompt_hash_statement(base_prompt, model_name)).all()
+
+def dedupe_stored_texts(db: Session, batch_size: int = 1000) -> int:
+    """
+    Moves prompts and outputs stored inline (written before deduplication) into TextBlob.
+
+    Same batching as compress_stored_outputs: id order, one transaction per batch, safe to
+    interrupt and rerun. Returns the number of rows moved.
+    """
+    moved = 0
+    for model, (text_attr, hash_attr, _blob) in models.BLOB_FIELDS.items():
+        table = model.__table__
+        rewrite = (
+            update(table)
+            .where(table.c.id == bindparam("row_id"))
+            .values({text_attr: "", hash_attr: bindparam("row_hash")})
+        )
+        last_id = 0
+        while True:
+            rows = db.execute(
+                select(table.c.id, table.c[text_attr])
+                .where(table.c.id > last_id)
+                .where(table.c[hash_attr].is_(None))
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            hashes = store_texts(db, [row[1] for row in rows])
+            db.execute(rewrite, [{"row_id": row.id, "row_hash": h} for row, h in zip(rows, hashes)])
+            db.commit()
+            moved += len(rows)
+            last_id = rows[-1].id
+    return moved
+
+# Archived history (see archive.py). Lookups by prompt id that miss the hot database
+# are retried against the archive files; they return rows detached from any session.
+def _archived(prompt_id: int, read):
+    return archive.history_archive.lookup(prompt_id, read)
+
+async def _archived_async(prompt_id: int, read):
+    # The archive files are read through sync engines, off the event loop.
+    return await asyncio.to_thread(archive.history_archive.lookup, prompt_id, read)
+
+def _hot_prompt(prompt_id: int):
+    # Children fall back to the archive only when the prompt itself has left the hot database;
+    # a hot prompt without answers or outputs yet just has none.
+    return select(models.Prompt.id).where(models.Prompt.id == prompt_id)
+
+
 # Prompt CRUD operations
 def create_prompt(db: Session, prompt: schemas.PromptCreate, user_id: Optional[int] = None) -> models.Prompt:
-    db_prompt = models.Prompt.model_validate(prompt, update={"user_id": user_id})
+    [prompt_hash] = store_texts(db, [prompt.base_prompt])
+    db_prompt = _new_prompt(prompt, user_id, prompt_hash)
     db.add(db_prompt)
     db.commit()
     db.refresh(db_prompt)
     return db_prompt
 
 def get_prompt(db: Session, prompt_id: int) -> Optional[models.Prompt]:
-    return db.get(models.Prompt, prompt_id)
+    # An archived prompt comes back detached, so its relationships can't be lazy-loaded later.
+    archived = _with_details(select(models.Prompt).where(models.Prompt.id == prompt_id))
+    return db.get(models.Prompt, prompt_id) or _archived(prompt_id, lambda adb: adb.exec(archived).first())
+
+def _with_details(statement):
+    """
+    Eager-loads a prompt's questionnaire responses and model outputs with one SELECT ... IN
+    query per relationship, so the cost doesn't grow with the number of prompts or children.
+    populate_existing makes a prompt already in the session pick up children added since.
+    """
+    return statement.options(
+        selectinload(models.Prompt.questionnaire_responses),
+        selectinload(models.Prompt.model_outputs),
+    ).execution_options(populate_existing=True)
+
+def get_prompt_with_details(db: Session, prompt_id: int) -> Optional[models.Prompt]:
+    statement = _with_details(select(models.Prompt).where(models.Prompt.id == prompt_id))
+    return db.exec(statement).first() or _archived(prompt_id, lambda adb: adb.exec(statement).first())
+
+def get_prompts_with_details(db: Session, skip: int = 0, limit: int = 100) -> List[models.Prompt]:
+    statement = _with_details(select(models.Prompt).offset(skip).limit(limit))
+    return db.exec(statement).all()
+
+def _insert_responses_statement(prompt_id: int, responses: List[schemas.QuestionnaireResponseCreate]):
+    """
+    One multi-row INSERT ... RETURNING id for all of a prompt's responses.
+
+    Core rather than ORM inserts: the ORM only batches RETURNING inserts when the backend can
+    promise row order, which SQLite doesn't, so it would fall back to one INSERT per row.
+    """
+    table = models.QuestionnaireResponse.__table__
+    rows = [{"prompt_id": prompt_id, "question": r.question, "answer": r.answer} for r in responses]
+    return insert(table).returning(table.c.id), rows
+
+def _prompt_details(
+    db_prompt: models.Prompt, responses: List[schemas.QuestionnaireResponseCreate], response_ids: List[int]
+) -> schemas.PromptReadWithDetails:
+    # SQLite assigns ascending rowids in VALUES order, so sorted ids line up with `responses`.
+    # Built from what was written; nothing is read back from the database.
+    return schemas.PromptReadWithDetails(
+        id=db_prompt.id,
+        user_id=db_prompt.user_id,
+        base_prompt=db_prompt.base_prompt,
+        timestamp=db_prompt.timestamp,
+        questionnaire_responses=[
+            schemas.QuestionnaireResponseRead(id=response_id, prompt_id=db_prompt.id, question=r.question, answer=r.answer)
+            for response_id, r in zip(sorted(response_ids), responses)
+        ],
+        model_outputs=[],
+    )
+
+def create_prompt_with_responses(
+    db: Session,
+    prompt: schemas.PromptCreate,
+    responses: List[schemas.QuestionnaireResponseCreate],
+    user_id: Optional[int] = None,
+) -> schemas.PromptReadWithDetails:
+    """
+    Stores a prompt and its questionnaire responses in one transaction: all of them or none.
+
+    Costs three INSERT statements (text blob, prompt, responses) and one commit however
+    many responses there are.
+    """
+    try:
+        [prompt_hash] = store_texts(db, [prompt.base_prompt])
+        db_prompt = _new_prompt(prompt, user_id, prompt_hash)
+        db.add(db_prompt)
+        db.flush()
+        _show_texts([db_prompt], [prompt.base_prompt])
+        response_ids = []
+        if responses:
+            statement, rows = _insert_responses_statement(db_prompt.id, responses)
+            response_ids = db.execute(statement, rows).scalars().all()
+        details = _prompt_details(db_prompt, responses, response_ids)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return details
 
 def get_prompts(db: Session, skip: int = 0, limit: int = 100) -> List[models.Prompt]:
     statement = select(models.Prompt).offset(skip).limit(limit)
     return db.exec(statement).all()
 
 def get_prompts_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[models.Prompt]:
+    # Offset paging; get_prompts_page(user_id=...) pages the same prompts by cursor.
     statement = select(models.Prompt).where(models.Prompt.user_id == user_id).offset(skip).limit(limit)
     return db.exec(statement).all()
 
+def _prompt_page_statement(limit: int, cursor: Optional[str], user_id: Optional[int]):
+    """
+    Newest-first keyset query on (timestamp, id), served by ix_prompt_timestamp_id.
+
+    Fetches one extra row so the caller can tell whether another page follows.
+
+    Raises:
+        InvalidCursorError: If `cursor` is malformed.
+    """
+    statement = select(models.Prompt)
+    if user_id is not None:
+        statement = statement.where(models.Prompt.user_id == user_id)
+    if cursor:
+        statement = statement.where(tuple_(models.Prompt.timestamp, models.Prompt.id) < decode_cursor(cursor))
+    return statement.order_by(models.Prompt.timestamp.desc(), models.Prompt.id.desc()).limit(limit + 1)
+
+def _split_page(rows: List[models.Prompt], limit: int) -> Tuple[List[models.Prompt], Optional[str]]:
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_cursor(last.timestamp, last.id)
+
+def get_prompts_page(
+    db: Session, limit: int = 100, cursor: Optional[str] = None, user_id: Optional[int] = None
+) -> Tuple[List[models.Prompt], Optional[str]]:
+    """
+    One page of prompts, newest first, and the cursor for the next page (None on the last one).
+
+    Unlike skip/limit, the cost doesn't grow with page depth and pages don't shift when
+    new prompts arrive.
+    """
+    return _split_page(db.exec(_prompt_page_statement(limit, cursor, user_id)).all(), limit)
+
+# Full-text search over prompts, questionnaire answers and model outputs (history_fts, see migrations.py)
+
+def _fts_query(query: str) -> str:
+    # Each word becomes a quoted FTS5 phrase, so user input can't be parsed as query syntax;
+    # the phrases are ANDed.
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+def _search_statement(query: str, limit: int, cursor: Optional[str]):
+    """
+    Best matches first (bm25; lower rank is better), ties broken by FTS rowid.
+
+    Raises:
+        InvalidCursorError: If `cursor` is malformed.
+    """
+    params = {"query": _fts_query(query), "limit": limit + 1}
+    after = ""
+    if cursor:
+        params["rank"], params["rowid"] = decode_rank_cursor(cursor)
+        after = "AND (rank, rowid) > (:rank, :rowid)"
+    return text(
+        "SELECT rowid, prompt_id, kind, snippet(history_fts, 0, '<mark>', '</mark>', '…', 16) AS snippet, rank "
+        f"FROM history_fts WHERE history_fts MATCH :query {after} ORDER BY rank, rowid LIMIT :limit"
+    ).bindparams(**params)
+
+def _split_search_page(rows, limit: int) -> Tuple[List[schemas.SearchHit], Optional[str]]:
+    hits = [
+        schemas.SearchHit(prompt_id=row.prompt_id, kind=row.kind, snippet=row.snippet, score=-row.rank)
+        for row in rows[:limit]
+    ]
+    next_cursor = encode_rank_cursor(rows[limit - 1].rank, rows[limit - 1].rowid) if len(rows) > limit else None
+    return hits, next_cursor
+
+def search_history(
+    db: Session, query: str, limit: int = 20, cursor: Optional[str] = None
+) -> Tuple[List[schemas.SearchHit], Optional[str]]:
+    """Ranked search hits with highlighted snippets, and the cursor for the next page."""
+    if not query.strip():
+        return [], None
+    return _split_search_page(db.execute(_search_statement(query, limit, cursor)).all(), limit)
+
+# Bulk export (see history_export.py). Core rows rather than ORM objects, so nothing
+# accumulates in the session's identity map however much is exported.
+
+def _blob_text(row, inline: str, blob: str) -> str:
+    return row._mapping[blob] if row._mapping[blob] is not None else row._mapping[inline]
+
+def _export_statements(after_id: int, limit: int):
+    """The next `limit` prompts after `after_id` in id order, and their children, with text blobs resolved."""
+    prompt, response, output = (m.__table__ for m in (models.Prompt, models.QuestionnaireResponse, models.ModelOutput))
+    prompt_blob, output_blob = models.TextBlob.__table__.alias(), models.TextBlob.__table__.alias()
+    prompts = (
+        select(
+            prompt.c.id, prompt.c.user_id, prompt.c.base_prompt, prompt_blob.c.body.label("base_prompt_blob"),
+            prompt.c.timestamp,
+        )
+        .select_from(prompt.outerjoin(prompt_blob, prompt_blob.c.hash == prompt.c.base_prompt_hash))
+        .where(prompt.c.id > after_id)
+        .order_by(prompt.c.id)
+        .limit(limit)
+    )
+    prompt_ids = select(prompts.subquery().c.id)
+    responses = select(response).where(response.c.prompt_id.in_(prompt_ids)).order_by(response.c.id)
+    outputs = (
+        select(output, output_blob.c.body.label("output_blob"))
+        .select_from(output.outerjoin(output_blob, output_blob.c.hash == output.c.output_hash))
+        .where(output.c.prompt_id.in_(prompt_ids))
+        .order_by(output.c.id)
+    )
+    return prompts, responses, outputs
+
+def _export_records(prompt_rows, response_rows, output_rows) -> List[dict]:
+    # Same shape as PromptReadWithDetails, so an export can be read back by the API's clients.
+    records = {
+        row.id: {
+            "id": row.id,
+            "user_id": row.user_id,
+            "base_prompt": _blob_text(row, "base_prompt", "base_prompt_blob"),
+            "timestamp": row.timestamp,
+            "questionnaire_responses": [],
+            "model_outputs": [],
+        }
+        for row in prompt_rows
+    }
+    for row in response_rows:
+        records[row.prompt_id]["questionnaire_responses"].append(
+            {"id": row.id, "prompt_id": row.prompt_id, "question": row.question, "answer": row.answer}
+        )
+    for row in output_rows:
+        records[row.prompt_id]["model_outputs"].append({
+            "id": row.id,
+            "prompt_id": row.prompt_id,
+            "model_name": row.model_name,
+            "output": _blob_text(row, "output", "output_blob"),
+            "timestamp": row.timestamp,
+            "served_by": row.served_by,
+            "hedge_leg": row.hedge_leg,
+        })
+    return list(records.values())
+
+def get_export_chunk(db: Session, after_id: int = 0, limit: int = 1000) -> List[dict]:
+    """
+    Up to `limit` prompts with id > `after_id`, oldest id first, each with its questionnaire
+    responses and model outputs, as plain dicts. Three indexed queries per chunk.
+    """
+    prompts, responses, outputs = _export_statements(after_id, limit)
+    return _export_records(db.execute(prompts).all(), db.execute(responses).all(), db.execute(outputs).all())
+
+# Bulk import (see history_import.py)
+
+IMPORT_DEDUPE_MODES = ("id", "content", "none")
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Stored timestamps are naive UTC (datetime.utcnow); an aware one would never equal them.
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _records_to_import(db: Session, records: List[schemas.PromptImport], hashes: List[str], dedupe: str) -> List[int]:
+    """Indexes of the records that aren't already stored (or repeated earlier in the batch)."""
+    prompt = models.Prompt.__table__
+    if dedupe == "id":
+        ids = [r.id for r in records if r.id is not None]
+        seen = set(db.execute(select(prompt.c.id).where(prompt.c.id.in_(ids))).scalars()) if ids else set()
+        keys = [r.id for r in records]
+    elif dedupe == "content":
+        seen = set(
+            db.execute(
+                select(prompt.c.base_prompt_hash, prompt.c.timestamp).where(prompt.c.base_prompt_hash.in_(set(hashes)))
+            ).tuples()
+        )
+        keys = [(h, _naive_utc(r.timestamp)) if r.timestamp is not None else None for h, r in zip(hashes, records)]
+    else:
+        return list(range(len(records)))
+    keep = []
+    for i, key in enumerate(keys):
+        if key is None:  # no id / timestamp to dedupe on
+            keep.append(i)
+        elif key not in seen:
+            seen.add(key)
+            keep.append(i)
+    return keep
+
+def _insert_imported_prompts(db: Session, rows: List[dict]) -> List[int]:
+    """Inserts prompt rows, keeping explicit ids; returns every row's id in order."""
+    table = models.Prompt.__table__
+    explicit = [row for row in rows if row["id"] is not None]
+    if explicit:
+        db.execute(insert(table), explicit)
+    auto = [row for row in rows if row["id"] is None]
+    # Multi-row INSERT ... RETURNING in slices; as in _prompt_details, sorted ids follow VALUES order.
+    assigned = []
+    for start in range(0, len(auto), 1000):
+        chunk = [{k: v for k, v in row.items() if k != "id"} for row in auto[start:start + 1000]]
+        assigned.extend(sorted(db.execute(insert(table).values(chunk).returning(table.c.id)).scalars()))
+    assigned_iter = iter(assigned)
+    return [row["id"] if row["id"] is not None else next(assigned_iter) for row in rows]
+
+def import_prompts(db: Session, records: List[schemas.PromptImport], dedupe: str = "id") -> schemas.ImportSummary:
+    """
+    Stores a batch of imported prompts, with their questionnaire responses and model outputs,
+    in one transaction using executemany / multi-row INSERTs.
+
+    dedupe:
+        "id": keep the records' ids and skip those already present; records without an id get a new one.
+        "content": assign new ids and skip prompts whose text and timestamp are already stored;
+            records without a timestamp are always stored.
+        "none": assign new ids and store everything.
+
+    Raises:
+        ValueError: If `dedupe` isn't one of IMPORT_DEDUPE_MODES.
+    """
+    if dedupe not in IMPORT_DEDUPE_MODES:
+        raise ValueError(f"Unknown dedupe mode {dedupe!r}; expected one of {', '.join(IMPORT_DEDUPE_MODES)}.")
+    now = datetime.utcnow()
+    hashes = [models.content_hash(r.base_prompt) for r in records]
+    timestamps = [_naive_utc(r.timestamp) or now for r in records]
+    keep = _records_to_import(db, records, hashes, dedupe)
+    kept = [records[i] for i in keep]
+    try:
+        text_hashes = store_texts(db, [r.base_prompt for r in kept] + [o.output for r in kept for o in r.model_outputs])
+        output_hashes = iter(text_hashes[len(kept):])
+        prompt_ids = _insert_imported_prompts(db, [
+            {
+                "id": records[i].id if dedupe == "id" else None,
+                "user_id": records[i].user_id,
+                "base_prompt": "",
+                "base_prompt_hash": hashes[i],
+                "timestamp": timestamps[i],
+            }
+            for i in keep
+        ])
+        response_rows = [
+            {"prompt_id": prompt_id, "question": qr.question, "answer": qr.answer}
+            for prompt_id, r in zip(prompt_ids, kept)
+            for qr in r.questionnaire_responses
+        ]
+        output_rows = [
+            {
+                "prompt_id": prompt_id,
+                "model_name": o.model_name,
+                "output": "",
+                "output_hash": next(output_hashes),
+                "timestamp": _naive_utc(o.timestamp) or now,
+                "served_by": o.served_by,
+                "hedge_leg": o.hedge_leg,
+            }
+            for prompt_id, r in zip(prompt_ids, kept)
+            for o in r.model_outputs
+        ]
+        if response_rows:
+            db.execute(insert(models.QuestionnaireResponse.__table__), response_rows)
+        if output_rows:
+            db.execute(insert(models.ModelOutput.__table__), output_rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return schemas.ImportSummary(
+        prompts=len(kept),
+        questionnaire_responses=len(response_rows),
+        model_outputs=len(output_rows),
+        skipped=len(records) - len(kept),
+    )
+
 # QuestionnaireResponse CRUD operations
 def create_questionnaire_response(db: Session, response: schemas.QuestionnaireResponseCreate, prompt_id: int) -> models.QuestionnaireResponse:
     db_response = models.QuestionnaireResponse.model_validate(response, update={"prompt_id": prompt_id})
@@ -59,16 +506,210 @@ def create_multiple_questionnaire_responses(db: Session, responses: List[schemas
 
 def get_questionnaire_responses_by_prompt(db: Session, prompt_id: int) -> List[models.QuestionnaireResponse]:
     statement = select(models.QuestionnaireResponse).where(models.QuestionnaireResponse.prompt_id == prompt_id)
-    return db.exec(statement).all()
+    rows = db.exec(statement).all()
+    if rows or db.exec(_hot_prompt(prompt_id)).first() is not None:
+        return rows
+    return _archived(prompt_id, lambda adb: adb.exec(statement).all()) or []
 
 # ModelOutput CRUD operations
 def create_model_output(db: Session, output: schemas.ModelOutputCreate, prompt_id: int) -> models.ModelOutput:
-    db_output = models.ModelOutput.model_validate(output, update={"prompt_id": prompt_id})
+    [output_hash] = store_texts(db, [output.output])
+    db_output = _new_model_output(output, prompt_id, output_hash)
     db.add(db_output)
     db.commit()
     db.refresh(db_output)
     return db_output
 
+def create_model_outputs(db: Session, outputs: List[Tuple[int, schemas.ModelOutputCreate]]) -> int:
+    """Inserts many (prompt_id, output) pairs in one transaction; returns how many were written."""
+    hashes = store_texts(db, [output.output for _prompt_id, output in outputs])
+    db.add_all(_new_model_output(output, prompt_id, h) for (prompt_id, output), h in zip(outputs, hashes))
+    db.commit()
+    return len(outputs)
+
+def compress_stored_outputs(db: Session, batch_size: int = 1000) -> int:
+    """
+    Rewrites ModelOutput rows still stored as plain text so they go through compression.
+
+    Walks the table in id order, one transaction per batch, so it can run against a live
+    database and be interrupted and restarted. Returns the number of rows rewritten;
+    outputs that don't shrink are rewritten as-is and stay plain text.
+    """
+    table = models.ModelOutput.__table__
+    rewrite = update(table).where(table.c.id == bindparam("row_id")).values(output=bindparam("output"))
+    last_id, rewritten = 0, 0
+    while True:
+        rows = db.execute(
+            select(table.c.id, table.c.output)
+            .where(table.c.id > last_id)
+            .where(func.typeof(table.c.output) == "text")
+            .where(func.length(table.c.output) >= OUTPUT_COMPRESSION_MIN_BYTES)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return rewritten
+        db.execute(rewrite, [{"row_id": row.id, "output": row.output} for row in rows])
+        db.commit()
+        rewritten += len(rows)
+        last_id = rows[-1].id
+
 def get_model_outputs_by_prompt(db: Session, prompt_id: int) -> List[models.ModelOutput]:
     statement = select(models.ModelOutput).where(models.ModelOutput.prompt_id == prompt_id)
-    return db.exec(statement).all()
+    rows = db.exec(statement).all()
+    if rows or db.exec(_hot_prompt(prompt_id)).first() is not None:
+        return rows
+    return _archived(prompt_id, lambda adb: adb.exec(statement).all()) or []
+
+
+# --- Async variants ---
+# Same operations on an AsyncSession, for the request path. Relationships can't be
+# lazy-loaded under asyncio, so anything a response serialises is loaded eagerly.
+
+async def create_user_async(db: AsyncSession, user: schemas.UserCreate) -> models.User:
+    db_user = models.User.model_validate(user)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+async def get_user_async(db: AsyncSession, user_id: int) -> Optional[models.User]:
+    return await db.get(models.User, user_id)
+
+async def get_user_by_username_async(db: AsyncSession, username: str) -> Optional[models.User]:
+    statement = select(models.User).where(models.User.username == username)
+    return (await db.exec(statement)).first()
+
+async def store_texts_async(db: AsyncSession, texts: List[str]) -> List[str]:
+    statement, rows, hashes = _store_texts_statement(texts)
+    if rows:
+        await db.execute(statement, rows)
+    return hashes
+
+async def find_model_outputs_async(
+    db: AsyncSession, base_prompt: str, model_name: Optional[str] = None
+) -> List[models.ModelOutput]:
+    return (await db.exec(_prompt_hash_statement(base_prompt, model_name))).all()
+
+async def create_prompt_async(db: AsyncSession, prompt: schemas.PromptCreate, user_id: Optional[int] = None) -> models.Prompt:
+    [prompt_hash] = await store_texts_async(db, [prompt.base_prompt])
+    db_prompt = _new_prompt(prompt, user_id, prompt_hash)
+    db.add(db_prompt)
+    await db.commit()
+    await db.refresh(db_prompt)
+    return db_prompt
+
+async def create_prompt_with_responses_async(
+    db: AsyncSession,
+    prompt: schemas.PromptCreate,
+    responses: List[schemas.QuestionnaireResponseCreate],
+    user_id: Optional[int] = None,
+) -> schemas.PromptReadWithDetails:
+    try:
+        [prompt_hash] = await store_texts_async(db, [prompt.base_prompt])
+        db_prompt = _new_prompt(prompt, user_id, prompt_hash)
+        db.add(db_prompt)
+        await db.flush()
+        _show_texts([db_prompt], [prompt.base_prompt])
+        response_ids = []
+        if responses:
+            statement, rows = _insert_responses_statement(db_prompt.id, responses)
+            response_ids = (await db.execute(statement, rows)).scalars().all()
+        details = _prompt_details(db_prompt, responses, response_ids)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return details
+
+async def get_prompt_async(db: AsyncSession, prompt_id: int) -> Optional[models.Prompt]:
+    # Always loaded with details: every caller serialises or reads them.
+    statement = _with_details(select(models.Prompt).where(models.Prompt.id == prompt_id))
+    prompt = (await db.exec(statement)).first()
+    return prompt or await _archived_async(prompt_id, lambda adb: adb.exec(statement).first())
+
+async def get_prompts_with_details_async(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[models.Prompt]:
+    statement = _with_details(select(models.Prompt).offset(skip).limit(limit))
+    return (await db.exec(statement)).all()
+
+async def get_prompts_async(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[models.Prompt]:
+    statement = select(models.Prompt).offset(skip).limit(limit)
+    return (await db.exec(statement)).all()
+
+async def get_prompts_by_user_async(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100) -> List[models.Prompt]:
+    statement = select(models.Prompt).where(models.Prompt.user_id == user_id).offset(skip).limit(limit)
+    return (await db.exec(statement)).all()
+
+async def get_prompts_page_async(
+    db: AsyncSession, limit: int = 100, cursor: Optional[str] = None, user_id: Optional[int] = None
+) -> Tuple[List[models.Prompt], Optional[str]]:
+    return _split_page((await db.exec(_prompt_page_statement(limit, cursor, user_id))).all(), limit)
+
+async def search_history_async(
+    db: AsyncSession, query: str, limit: int = 20, cursor: Optional[str] = None
+) -> Tuple[List[schemas.SearchHit], Optional[str]]:
+    if not query.strip():
+        return [], None
+    return _split_search_page((await db.execute(_search_statement(query, limit, cursor))).all(), limit)
+
+async def get_export_chunk_async(db: AsyncSession, after_id: int = 0, limit: int = 1000) -> List[dict]:
+    prompts, responses, outputs = _export_statements(after_id, limit)
+    return _export_records(
+        (await db.execute(prompts)).all(), (await db.execute(responses)).all(), (await db.execute(outputs)).all()
+    )
+
+async def import_prompts_async(
+    db: AsyncSession, records: List[schemas.PromptImport], dedupe: str = "id"
+) -> schemas.ImportSummary:
+    # Several dependent statements; run the sync version on the session's connection.
+    return await db.run_sync(import_prompts, records, dedupe)
+
+async def create_questionnaire_response_async(db: AsyncSession, response: schemas.QuestionnaireResponseCreate, prompt_id: int) -> models.QuestionnaireResponse:
+    db_response = models.QuestionnaireResponse.model_validate(response, update={"prompt_id": prompt_id})
+    db.add(db_response)
+    await db.commit()
+    await db.refresh(db_response)
+    return db_response
+
+async def create_multiple_questionnaire_responses_async(db: AsyncSession, responses: List[schemas.QuestionnaireResponseCreate], prompt_id: int) -> List[models.QuestionnaireResponse]:
+    db_responses = [
+        models.QuestionnaireResponse.model_validate(response_data, update={"prompt_id": prompt_id})
+        for response_data in responses
+    ]
+    db.add_all(db_responses)
+    await db.commit()
+    for db_response in db_responses:
+        await db.refresh(db_response)
+    return db_responses
+
+async def get_questionnaire_responses_by_prompt_async(db: AsyncSession, prompt_id: int) -> List[models.QuestionnaireResponse]:
+    statement = select(models.QuestionnaireResponse).where(models.QuestionnaireResponse.prompt_id == prompt_id)
+    rows = (await db.exec(statement)).all()
+    if rows or (await db.exec(_hot_prompt(prompt_id))).first() is not None:
+        return rows
+    return await _archived_async(prompt_id, lambda adb: adb.exec(statement).all()) or []
+
+async def create_model_output_async(db: AsyncSession, output: schemas.ModelOutputCreate, prompt_id: int) -> models.ModelOutput:
+    [output_hash] = await store_texts_async(db, [output.output])
+    db_output = _new_model_output(output, prompt_id, output_hash)
+    db.add(db_output)
+    await db.commit()
+    await db.refresh(db_output)
+    return db_output
+
+async def create_model_outputs_async(db: AsyncSession, outputs: List[Tuple[int, schemas.ModelOutputCreate]]) -> int:
+    hashes = await store_texts_async(db, [output.output for _prompt_id, output in outputs])
+    db_outputs = [_new_model_output(output, prompt_id, h) for (prompt_id, output), h in zip(outputs, hashes)]
+    db.add_all(db_outputs)
+    await db.flush()
+    # expire_on_commit is off on the request path, so these stay in the session as they are now.
+    _show_texts(db_outputs, [output.output for _prompt_id, output in outputs])
+    await db.commit()
+    return len(outputs)
+
+async def get_model_outputs_by_prompt_async(db: AsyncSession, prompt_id: int) -> List[models.ModelOutput]:
+    statement = select(models.ModelOutput).where(models.ModelOutput.prompt_id == prompt_id)
+    rows = (await db.exec(statement)).all()
+    if rows or (await db.exec(_hot_prompt(prompt_id))).first() is not None:
+        return rows
+    return await _archived_async(prompt_id, lambda adb: adb.exec(statement).all()) or []
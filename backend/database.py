@@ -1,14 +1,103 @@
+from typing import Dict
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.engine import Engine
 from sqlmodel import create_engine, SQLModel, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config import (
+    DATABASE_URL, DB_ECHO, DB_MAX_OVERFLOW, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_PROFILE, SQLITE_PRAGMAS,
+)
+from migrations import migrate
+
+# Same database through the aiosqlite driver, for the async request path.
+ASYNC_DATABASE_URL = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+# PRAGMAs run on every new connection, per DB_PROFILE. Compare them with
+# `python -m benchmarks.database_profiles`.
+SQLITE_PROFILES: Dict[str, Dict[str, object]] = {
+    # What the app ran with before profiles existed: rollback journal, an fsync per commit,
+    # and readers and the writer blocking each other.
+    "legacy": {},
+    # Readers never block the writer nor it them; commits only fsync at checkpoints, so a power
+    # cut (not an app crash) can lose the last few transactions.
+    "wal": {
+        # Must come before journal_mode, which writes the header of a new file. Existing databases
+        # switch on their next full VACUUM (see archive.enable_incremental_vacuum).
+        "auto_vacuum": "INCREMENTAL",  # lets archive.compact hand freed pages back a few at a time
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,  # ms to wait for the write lock instead of failing with "database is locked"
+        "temp_store": "MEMORY",
+        "cache_size": -65536,  # KiB, i.e. 64 MiB of page cache per connection
+        "mmap_size": 268435456,  # bytes of the file read through memory mapping
+    },
+}
+# WAL with an fsync per commit: nothing committed is lost even on power failure.
+SQLITE_PROFILES["wal_durable"] = {**SQLITE_PROFILES["wal"], "synchronous": "FULL"}
+
+
+def sqlite_pragmas(profile: str = DB_PROFILE, overrides: str = SQLITE_PRAGMAS) -> Dict[str, object]:
+    """
+    The profile's PRAGMAs with `overrides` ("name=value,...") applied on top.
+
+    Raises:
+        ValueError: If the profile is unknown.
+    """
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown database profile {profile!r}; expected one of {', '.join(SQLITE_PROFILES)}.")
+    pragmas = dict(SQLITE_PROFILES[profile])
+    for item in filter(None, (part.strip() for part in overrides.split(","))):
+        name, _, value = item.partition("=")
+        pragmas[name.strip()] = value.strip()
+    return pragmas
+
+
+def _set_pragmas_on_connect(engine: Engine, pragmas: Dict[str, object]) -> None:
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
 
-DATABASE_URL = "sqlite:///./prompts.db"
 
-# The connect_args={"check_same_thread": False} is needed only for SQLite.
-# It's not needed for other databases.
-engine = create_engine(DATABASE_URL, echo=True, connect_args={"check_same_thread": False})
+def _pool_args(url: str) -> dict:
+    # In-memory databases get a single-connection pool that takes no sizing arguments.
+    if url.rstrip("/").endswith((":memory:", "sqlite:")):
+        return {}
+    return {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT}
+
+
+def make_engine(url: str = DATABASE_URL, profile: str = DB_PROFILE, echo: bool = DB_ECHO) -> Engine:
+    # check_same_thread=False: pooled connections move between threads (sessions, the output writer).
+    engine = create_engine(url, echo=echo, connect_args={"check_same_thread": False}, **_pool_args(url))
+    _set_pragmas_on_connect(engine, sqlite_pragmas(profile))
+    return engine
+
+
+def make_async_engine(url: str = ASYNC_DATABASE_URL, profile: str = DB_PROFILE, echo: bool = DB_ECHO) -> AsyncEngine:
+    async_engine = create_async_engine(url, echo=echo, **_pool_args(url))
+    _set_pragmas_on_connect(async_engine.sync_engine, sqlite_pragmas(profile))
+    return async_engine
+
+
+engine = make_engine()
+async_engine = make_async_engine()
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    # create_all never alters existing tables; bring an older database up to date in place.
+    migrate(engine)
 
 def get_session():
+    # Sync sessions remain for scripts (batch_jobs.py), the response cache and tests.
     with Session(engine) as session:
         yield session
+
+async def get_async_session():
+    # expire_on_commit=False: attributes can't be lazily refreshed after a commit in async code,
+    # so keep the committed values readable for the response.
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
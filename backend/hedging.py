@@ -0,0 +1,135 @@
+import asyncio
+import math
+import threading
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from config import HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES, HEDGE_DEFAULT_DELAY, HEDGE_MIN_DELAY, HEDGE_WINDOW
+
+PRIMARY = "primary"
+HEDGE = "hedge"
+
+
+class LatencyTracker:
+    """
+    Sliding window of observed provider latencies per SDK model.
+
+    Only successful, uncached provider calls should be recorded; cache hits and fast
+    failures would drag the percentile down and make hedges fire too eagerly.
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, sdk_model: str, elapsed: float) -> None:
+        with self._lock:
+            samples = self._samples.get(sdk_model)
+            if samples is None:
+                samples = self._samples[sdk_model] = deque(maxlen=self.window)
+            samples.append(elapsed)
+
+    def percentile(self, sdk_model: str, percentile: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(sdk_model, ()))
+        if not samples:
+            return None
+        # Nearest-rank percentile.
+        rank = max(1, math.ceil(percentile * len(samples)))
+        return samples[rank - 1]
+
+    def sample_count(self, sdk_model: str) -> int:
+        with self._lock:
+            return len(self._samples.get(sdk_model, ()))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+
+class Hedger:
+    """
+    Fires a backup request when the primary one is slower than usual.
+
+    The hedge delay is the configured percentile of the primary model's recent
+    latency (or `default_delay` until `min_samples` calls have been observed),
+    never less than `min_delay`. Whichever leg returns a successful answer first
+    wins and the other is cancelled; if one leg fails, the other is awaited.
+    """
+
+    def __init__(
+        self,
+        tracker: LatencyTracker,
+        percentile: float = 0.95,
+        min_samples: int = 20,
+        default_delay: float = 5.0,
+        min_delay: float = 0.5,
+    ):
+        self.tracker = tracker
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.calls = 0
+        self.hedges_fired = 0
+        self.hedge_wins = 0
+
+    def delay_for(self, sdk_model: str) -> float:
+        observed = self.tracker.percentile(sdk_model, self.percentile)
+        if observed is None or self.tracker.sample_count(sdk_model) < self.min_samples:
+            return max(self.min_delay, self.default_delay)
+        return max(self.min_delay, observed)
+
+    async def run(
+        self,
+        sdk_model: str,
+        primary: Callable[[], Awaitable[str]],
+        backup: Callable[[], Awaitable[str]],
+    ) -> Tuple[str, str]:
+        """
+        Runs `primary`, adding `backup` if it hasn't finished within the hedge delay.
+
+        Both callables must return handler-style strings ("Error: ..." on failure).
+
+        Returns:
+            (output, leg) where leg is PRIMARY or HEDGE.
+        """
+        self.calls += 1
+        legs = {asyncio.create_task(primary()): PRIMARY}
+        try:
+            done, _pending = await asyncio.wait(legs, timeout=self.delay_for(sdk_model))
+            if not done:
+                self.hedges_fired += 1
+                legs[asyncio.create_task(backup())] = HEDGE
+
+            pending = set(legs)
+            output, leg = None, PRIMARY
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Prefer the primary if both land in the same tick.
+                for task in sorted(done, key=lambda t: legs[t] != PRIMARY):
+                    output, leg = task.result(), legs[task]
+                    if not output.startswith("Error:"):
+                        pending = set()
+                        break
+            if leg == HEDGE and not output.startswith("Error:"):
+                self.hedge_wins += 1
+            return output, leg
+        finally:
+            for task in legs:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "hedges_fired": self.hedges_fired, "hedge_wins": self.hedge_wins}
+
+
+latency_tracker = LatencyTracker(window=HEDGE_WINDOW)
+hedger = Hedger(
+    latency_tracker,
+    percentile=HEDGE_PERCENTILE,
+    min_samples=HEDGE_MIN_SAMPLES,
+    default_delay=HEDGE_DEFAULT_DELAY,
+    min_delay=HEDGE_MIN_DELAY,
+)
@@ -0,0 +1,213 @@
+"""
+Streaming export of the full prompt history.
+
+One record per prompt, shaped like PromptReadWithDetails (questionnaire responses
+and model outputs nested), read in keyset chunks of prompts so memory use depends
+on the chunk size and not on the size of the history. Formats:
+
+- ndjson: one JSON object per line.
+- arrow: an Arrow IPC stream, one record batch per chunk.
+- parquet: one row group per chunk.
+
+Arrow and Parquet need the optional `pyarrow` package.
+
+Served by GET /history/export. To export from the backend directory:
+
+    python history_export.py --format ndjson --output history.ndjson
+"""
+import argparse
+import json
+import sys
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import crud
+
+
+class ExportFormatUnavailable(RuntimeError):
+    """Raised for a columnar format when pyarrow isn't installed."""
+
+    def __init__(self, export_format: str):
+        super().__init__(f"The {export_format} export needs the optional 'pyarrow' package.")
+        self.export_format = export_format
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def iter_chunks(db: Session, chunk_size: int = 1000) -> Iterator[List[dict]]:
+    after_id = 0
+    while True:
+        records = crud.get_export_chunk(db, after_id=after_id, limit=chunk_size)
+        if not records:
+            return
+        yield records
+        after_id = records[-1]["id"]
+        # Keyset on id needs no snapshot; ending the read transaction lets WAL checkpoints run.
+        db.rollback()
+
+
+async def iter_chunks_async(db: AsyncSession, chunk_size: int = 1000) -> AsyncIterator[List[dict]]:
+    after_id = 0
+    while True:
+        records = await crud.get_export_chunk_async(db, after_id=after_id, limit=chunk_size)
+        if not records:
+            return
+        yield records
+        after_id = records[-1]["id"]
+        await db.rollback()
+
+
+def ndjson_lines(records: List[dict]) -> bytes:
+    return "".join(
+        json.dumps(record, default=_json_default, ensure_ascii=False) + "\n" for record in records
+    ).encode("utf-8")
+
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    response = pa.struct([("id", pa.int64()), ("prompt_id", pa.int64()), ("question", pa.string()), ("answer", pa.string())])
+    output = pa.struct([
+        ("id", pa.int64()), ("prompt_id", pa.int64()), ("model_name", pa.string()), ("output", pa.string()),
+        ("timestamp", pa.timestamp("us")), ("served_by", pa.string()), ("hedge_leg", pa.string()),
+    ])
+    return pa.schema([
+        ("id", pa.int64()),
+        ("user_id", pa.int64()),
+        ("base_prompt", pa.string()),
+        ("timestamp", pa.timestamp("us")),
+        ("questionnaire_responses", pa.list_(response)),
+        ("model_outputs", pa.list_(output)),
+    ])
+
+
+class _ChunkSink:
+    """Write-only file object that hands out what has been written since the last drain."""
+
+    mode = "wb"
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+class ColumnarEncoder:
+    """Turns record chunks into Arrow IPC or Parquet bytes, one batch / row group per chunk."""
+
+    def __init__(self, export_format: str):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ExportFormatUnavailable(export_format) from None
+        self._pa = pa
+        self._schema = _arrow_schema()
+        self._sink = _ChunkSink()
+        if export_format == "parquet":
+            self._writer = pq.ParquetWriter(self._sink, self._schema, compression="zstd")
+        else:
+            self._writer = pa.ipc.new_stream(self._sink, self._schema)
+
+    def encode(self, records: List[dict]) -> bytes:
+        self._writer.write_batch(self._pa.RecordBatch.from_pylist(records, schema=self._schema))
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._writer.close()  # Parquet footer / Arrow end-of-stream marker
+        return self._sink.drain()
+
+
+# format -> (media type, file extension)
+EXPORT_FORMATS: Dict[str, Tuple[str, str]] = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+Encoder = Tuple[Callable[[List[dict]], bytes], Callable[[], bytes]]
+
+
+def make_encoder(export_format: str) -> Encoder:
+    """
+    (encode chunk, finish) for a format. Columnar encoders are created here, so a missing
+    pyarrow is reported before any bytes are sent.
+
+    Raises:
+        ExportFormatUnavailable: If the format needs pyarrow and it isn't installed.
+    """
+    if export_format == "ndjson":
+        return ndjson_lines, lambda: b""
+    encoder = ColumnarEncoder(export_format)
+    return encoder.encode, encoder.close
+
+
+async def stream_export(db: AsyncSession, encoder: Encoder, chunk_size: int = 1000) -> AsyncIterator[bytes]:
+    encode, finish = encoder
+    async for records in iter_chunks_async(db, chunk_size):
+        yield encode(records)
+    yield finish()
+
+
+def export(db: Session, out, export_format: str = "ndjson", chunk_size: int = 1000) -> int:
+    """Writes the whole history to the binary file `out`; returns the number of prompts exported."""
+    encode, finish = make_encoder(export_format)
+    exported = 0
+    for records in iter_chunks(db, chunk_size):
+        out.write(encode(records))
+        exported += len(records)
+    out.write(finish())
+    return exported
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Export the prompt history with questionnaire responses and model outputs.")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--output", help="File to write (default: stdout).")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Prompts read per query.")
+    args = parser.parse_args(argv)
+
+    # Imported late so --help works without touching the database.
+    from database import engine
+
+    with Session(engine) as db:
+        if args.output:
+            with open(args.output, "wb") as out:
+                exported = export(db, out, args.format, args.chunk_size)
+        else:
+            exported = export(db, sys.stdout.buffer, args.format, args.chunk_size)
+    print(f"exported {exported} prompts", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
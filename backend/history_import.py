@@ -0,0 +1,162 @@
+"""
+Bulk import of prompt history from NDJSON.
+
+Each line is one prompt with nested questionnaire responses and model outputs,
+in the shape /history/export writes (schemas.PromptImport). Input is parsed a
+line at a time and stored in batches, one transaction per batch (see
+crud.import_prompts for the dedupe modes), so a file of any size runs in
+constant memory. Batches before a bad line stay committed; rerunning with
+dedupe "id" or "content" skips them.
+
+Served by POST /history/import. To import from the backend directory:
+
+    python history_import.py history.ndjson --dedupe content
+    python history_import.py - < history.ndjson
+"""
+import argparse
+import sys
+import time
+from typing import AsyncIterator, Callable, Iterable, Iterator, List, Optional, Union
+
+from pydantic import ValidationError
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import crud
+import schemas
+from config import logging
+
+
+class ImportLineError(ValueError):
+    """Raised for an input line that isn't a valid PromptImport record."""
+
+    def __init__(self, line_number: int, reason: str):
+        super().__init__(f"Line {line_number}: {reason}")
+        self.line_number = line_number
+
+
+def parse_line(line: Union[str, bytes], line_number: int) -> Optional[schemas.PromptImport]:
+    """
+    Returns None for a blank line.
+
+    Raises:
+        ImportLineError: If the line isn't valid JSON or doesn't match PromptImport.
+    """
+    if not line.strip():
+        return None
+    try:
+        return schemas.PromptImport.model_validate_json(line)
+    except ValidationError as e:
+        raise ImportLineError(line_number, str(e)) from None
+
+
+def iter_batches(lines: Iterable[Union[str, bytes]], batch_size: int) -> Iterator[List[schemas.PromptImport]]:
+    batch = []
+    for line_number, line in enumerate(lines, start=1):
+        record = parse_line(line, line_number)
+        if record is None:
+            continue
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def aiter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Splits a byte stream (e.g. a request body) into lines without reading it all first."""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+async def aiter_batches(chunks: AsyncIterator[bytes], batch_size: int) -> AsyncIterator[List[schemas.PromptImport]]:
+    batch = []
+    line_number = 0
+    async for line in aiter_lines(chunks):
+        line_number += 1
+        record = parse_line(line, line_number)
+        if record is None:
+            continue
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _add(total: schemas.ImportSummary, batch: schemas.ImportSummary) -> None:
+    total.prompts += batch.prompts
+    total.questionnaire_responses += batch.questionnaire_responses
+    total.model_outputs += batch.model_outputs
+    total.skipped += batch.skipped
+
+
+def describe(summary: schemas.ImportSummary, elapsed: float) -> str:
+    rows = summary.prompts + summary.questionnaire_responses + summary.model_outputs
+    return (
+        f"{summary.prompts} prompts, {summary.questionnaire_responses} questionnaire responses, "
+        f"{summary.model_outputs} model outputs, {summary.skipped} skipped ({rows / max(elapsed, 1e-9):,.0f} rows/s)"
+    )
+
+
+def import_lines(
+    db: Session,
+    lines: Iterable[Union[str, bytes]],
+    dedupe: str = "id",
+    batch_size: int = 5000,
+    progress: Optional[Callable[[schemas.ImportSummary], None]] = None,
+) -> schemas.ImportSummary:
+    """Imports NDJSON lines batch by batch; `progress` gets the running totals after each batch."""
+    total = schemas.ImportSummary()
+    for batch in iter_batches(lines, batch_size):
+        _add(total, crud.import_prompts(db, batch, dedupe))
+        if progress:
+            progress(total)
+    return total
+
+
+async def import_stream(
+    db: AsyncSession, chunks: AsyncIterator[bytes], dedupe: str = "id", batch_size: int = 5000
+) -> schemas.ImportSummary:
+    total = schemas.ImportSummary()
+    started = time.monotonic()
+    async for batch in aiter_batches(chunks, batch_size):
+        _add(total, await crud.import_prompts_async(db, batch, dedupe))
+        logging.info(f"History import: {describe(total, time.monotonic() - started)}")
+    return total
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Import prompt history from NDJSON (the /history/export format).")
+    parser.add_argument("path", help="NDJSON file, or - for stdin.")
+    parser.add_argument("--dedupe", choices=crud.IMPORT_DEDUPE_MODES, default="id", help="See crud.import_prompts.")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Prompts per transaction.")
+    args = parser.parse_args(argv)
+
+    # Imported late so --help works without touching the database.
+    from database import engine
+
+    started = time.monotonic()
+
+    def report(total: schemas.ImportSummary) -> None:
+        print(describe(total, time.monotonic() - started), file=sys.stderr)
+
+    with Session(engine) as db:
+        if args.path == "-":
+            total = import_lines(db, sys.stdin.buffer, args.dedupe, args.batch_size, report)
+        else:
+            with open(args.path, "rb") as lines:
+                total = import_lines(db, lines, args.dedupe, args.batch_size, report)
+    print(f"done: {describe(total, time.monotonic() - started)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,33 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import uvicorn
-from typing import List
+import asyncio
+from typing import List, Optional, Union
 import os
+import json
 import secrets
 import logging
 from dotenv import load_dotenv
 
 # SQLModel imports (using modern approach from HEAD)
-from sqlmodel import Session
-from database import get_session, create_db_and_tables
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import get_async_session, create_db_and_tables
 import schemas
 import crud
+from pagination import InvalidCursorError
+from history_export import EXPORT_FORMATS, ExportFormatUnavailable, make_encoder, stream_export
+from history_import import ImportLineError, import_stream
 from security import verify_credentials
 from questionnaire import generate_questions
-from prompt_optimizer import optimize_prompt
+from prompt_optimizer import optimize_prompt, build_model_prompt
 from model_recommender import recommend_models
+from api_handlers import client_factory, resilience, usage  # same module instances the handlers use
+from rate_limiter import rate_limiter
+from model_dispatcher import MODEL_MAP, call_model, dispatch, stream_dispatch, warm_models
+from hedging import hedger
+from single_flight import single_flight
+from write_behind import OutputWriter, get_output_writer, output_writer
 
 # Load environment variables from .env file
 load_dotenv()
@@ -35,6 +47,13 @@ app.add_middleware(
 @app.on_event("startup")
 def startup_event():
     create_db_and_tables()
+    warm_models()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await client_factory.aclose_all()
+    # Commit every output that was already acknowledged to a client.
+    await asyncio.to_thread(output_writer.close)
 
 @app.get("/")
 async def root():
@@ -43,7 +62,22 @@ async def root():
 @app.get("/health")
 async def health_check():
     # Basic health check. Can be expanded to check DB connection later.
-    return {"status": "healthy"}
+    # A provider whose circuit breaker is not closed is failing fast, so report degraded.
+    breakers = resilience.breaker_states()
+    degraded = any(state["state"] != resilience.CLOSED for state in breakers.values())
+    return {"status": "degraded" if degraded else "healthy", "circuit_breakers": breakers}
+
+@app.get("/metrics")
+async def metrics(current_user: str = Depends(verify_credentials)):
+    # Operational counters for the provider call path.
+    return {
+        "http_pools": client_factory.pool_stats(),
+        "rate_limits": rate_limiter.stats(),
+        "hedging": hedger.stats(),
+        "single_flight": single_flight.stats(),
+        "token_usage": usage.stats(),
+        "write_behind": output_writer.stats(),
+    }
 
 # --- History Endpoints ---
 
@@ -51,19 +85,89 @@ async def health_check():
 async def list_all_prompts(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: str = Depends(verify_credentials)  # Protect endpoint
 ):
-    prompts = crud.get_prompts(db=db, skip=skip, limit=limit)
+    # Offset paging, kept for existing clients; deep pages get slower. Prefer /history/prompts/page.
+    prompts = await crud.get_prompts_async(db=db, skip=skip, limit=limit)
     return prompts
 
+@app.get("/history/prompts/page", response_model=schemas.PromptPage)
+async def list_prompts_page(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: str = Depends(verify_credentials)  # Protect endpoint
+):
+    """Newest-first history with keyset pagination: pass `next_cursor` back as `cursor` until it is null."""
+    try:
+        prompts, next_cursor = await crud.get_prompts_page_async(db=db, limit=limit, cursor=cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return schemas.PromptPage(items=prompts, next_cursor=next_cursor)
+
+@app.get("/history/search", response_model=schemas.SearchPage)
+async def search_history(
+    q: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: str = Depends(verify_credentials)  # Protect endpoint
+):
+    """Full-text search over prompts, questionnaire answers and model outputs, best matches first."""
+    try:
+        hits, next_cursor = await crud.search_history_async(db=db, query=q, limit=limit, cursor=cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return schemas.SearchPage(items=hits, next_cursor=next_cursor)
+
+@app.get("/history/export")
+async def export_history(
+    format: str = Query("ndjson", pattern=f"^({'|'.join(EXPORT_FORMATS)})$"),
+    chunk_size: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_async_session),
+    current_user: str = Depends(verify_credentials)  # Protect endpoint
+):
+    """
+    Streams every prompt with its questionnaire responses and model outputs, oldest first:
+    NDJSON (one PromptReadWithDetails per line), or Arrow IPC / Parquet if pyarrow is installed.
+    """
+    try:
+        encoder = make_encoder(format)  # before streaming starts, so a missing pyarrow is still a clean error
+    except ExportFormatUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        stream_export(db, encoder, chunk_size),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="history.{extension}"'},
+    )
+
+@app.post("/history/import", response_model=schemas.ImportSummary)
+async def import_history(
+    request: Request,
+    dedupe: str = Query("id", pattern=f"^({'|'.join(crud.IMPORT_DEDUPE_MODES)})$"),
+    batch_size: int = Query(5000, ge=1, le=50000),
+    db: AsyncSession = Depends(get_async_session),
+    current_user: str = Depends(verify_credentials)  # Protect endpoint
+):
+    """
+    Bulk-imports an NDJSON body in the /history/export format, a batch per transaction.
+
+    On a bad line the batches before it stay imported; a rerun with the same dedupe mode skips them.
+    """
+    try:
+        return await import_stream(db, request.stream(), dedupe=dedupe, batch_size=batch_size)
+    except ImportLineError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/history/prompt/{prompt_id}", response_model=schemas.PromptReadWithDetails)
 async def get_prompt_details(
     prompt_id: int,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: str = Depends(verify_credentials)  # Protect endpoint
 ):
-    db_prompt = crud.get_prompt(db=db, prompt_id=prompt_id)
+    db_prompt = await crud.get_prompt_async(db=db, prompt_id=prompt_id)
     if db_prompt is None:
         raise HTTPException(status_code=404, detail="Prompt not found")
     return db_prompt
@@ -82,36 +186,25 @@ async def generate_questionnaire_endpoint(
 @app.post("/submit_questionnaire", response_model=schemas.PromptReadWithDetails)
 async def submit_questionnaire_endpoint(
     request: schemas.SubmitQuestionnaireRequest,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: str = Depends(verify_credentials)  # Protect endpoint
 ):
-    # Create the Prompt entry
-    prompt_create_schema = schemas.PromptCreate(base_prompt=request.base_prompt)
-    created_prompt = crud.create_prompt(db=db, prompt=prompt_create_schema, user_id=None)
-
-    # Create the associated QuestionnaireResponse entries
-    if request.responses:
-        crud.create_multiple_questionnaire_responses(
-            db=db, responses=request.responses, prompt_id=created_prompt.id
-        )
-
-    # Fetch the prompt with its details to return
-    detailed_prompt = crud.get_prompt(db=db, prompt_id=created_prompt.id)
-    if detailed_prompt is None:
-        raise HTTPException(status_code=500, detail="Failed to create or retrieve prompt after submission")
-
-    return detailed_prompt
+    # The prompt and all of its responses are stored in one transaction, and the response
+    # is built from what was written rather than read back.
+    return await crud.create_prompt_with_responses_async(
+        db=db, prompt=schemas.PromptCreate(base_prompt=request.base_prompt), responses=request.responses
+    )
 
 # --- Prompt Optimization Endpoint ---
 
 @app.post("/optimize_prompt", response_model=schemas.OptimizedPromptResponse)
 async def optimize_prompt_endpoint(
     request: schemas.OptimizePromptRequest,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: str = Depends(verify_credentials)  # Protect endpoint
 ):
     # Fetch the base prompt
-    prompt_obj = crud.get_prompt(db=db, prompt_id=request.prompt_id)
+    prompt_obj = await crud.get_prompt_async(db=db, prompt_id=request.prompt_id)
     if not prompt_obj:
         raise HTTPException(status_code=404, detail="Prompt not found")
 
@@ -133,10 +226,10 @@ async def optimize_prompt_endpoint(
 @app.post("/recommend_models", response_model=schemas.RecommendedModelsResponse)
 async def recommend_models_endpoint(
     request: schemas.RecommendModelsRequest,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: str = Depends(verify_credentials)  # Protect endpoint
 ):
-    prompt_obj = crud.get_prompt(db=db, prompt_id=request.prompt_id)
+    prompt_obj = await crud.get_prompt_async(db=db, prompt_id=request.prompt_id)
     if not prompt_obj:
         raise HTTPException(status_code=404, detail="Prompt not found")
 
@@ -157,52 +250,162 @@ async def recommend_models_endpoint(
 @app.post("/create_prompt/", response_model=schemas.PromptRead)
 async def create_prompt(
     prompt: schemas.PromptCreate, 
-    db: Session = Depends(get_session), 
+    db: AsyncSession = Depends(get_async_session), 
     current_user: str = Depends(verify_credentials)
 ):
-    return crud.create_prompt(db=db, prompt=prompt, user_id=None)
+    return await crud.create_prompt_async(db=db, prompt=prompt, user_id=None)
 
-@app.get("/prompts/", response_model=List[schemas.PromptRead])
+@app.get("/prompts/", response_model=Union[List[schemas.PromptRead], schemas.PromptPage])
 async def get_prompts(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_session), 
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_session), 
     current_user: str = Depends(verify_credentials)
 ):
-    return crud.get_prompts(db=db, skip=skip, limit=limit)
-
-# --- Advanced Model Response Endpoint (when API handlers are available) ---
-# Uncomment when api_handlers module is implemented
-"""
-try:
-    from api_handlers import openai_handler, claude_handler, grok_handler, gemini_handler
-    
-    # Model mapping for advanced endpoint
-    MODEL_MAP = {
-        "GPT-4.1": ("gpt-4o", openai_handler, 8192),
-        "GPT-4.1 Mini": ("gpt-4-turbo", openai_handler, 8192),
-        "GPT-4.1 Nano": ("gpt-3.5-turbo", openai_handler, 4096),
-        "Claude Opus 4": ("claude-3-opus-20240229", claude_handler, 4096),
-        "Claude Sonnet 4": ("claude-3-sonnet-20240229", claude_handler, 4096),
-        "Grok-3": ("grok-3", grok_handler, 8192),
-        "Grok-3 Mini": ("grok-3-mini", grok_handler, 8192),
-        "Gemini 2.5 Pro": ("gemini-1.5-pro-latest", gemini_handler, 8192),
-        "Gemini 2.5 Flash": ("gemini-1.5-flash-latest", gemini_handler, 8192),
-    }
+    """
+    Without `cursor`, a plain list by skip/limit (kept for existing clients). With it, newest-first
+    keyset pages like /history/prompts/page: send an empty `cursor=` for the first page, then each
+    page's `next_cursor` until it is null.
+    """
+    if cursor is None:
+        return await crud.get_prompts_async(db=db, skip=skip, limit=limit)
+    if skip or not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="Cursor paging takes no skip and a limit between 1 and 1000.")
+    try:
+        prompts, next_cursor = await crud.get_prompts_page_async(db=db, limit=limit, cursor=cursor or None)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return schemas.PromptPage(items=prompts, next_cursor=next_cursor)
+
+# --- Model Response Endpoints ---
 
-    @app.post("/get_model_response", response_model=schemas.ModelResponseResponse)
-    async def get_model_response_endpoint(
-        request: schemas.ModelResponseRequest,
-        db: Session = Depends(get_session),
-        current_user: str = Depends(verify_credentials)
-    ):
-        # Implementation here when handlers are available
-        pass
-        
-except ImportError:
-    # API handlers not available, endpoint will be disabled
-    pass
-"""
+async def _get_prompt_or_404(db: AsyncSession, prompt_id: int):
+    prompt_obj = await crud.get_prompt_async(db=db, prompt_id=prompt_id)
+    if not prompt_obj:
+        raise HTTPException(status_code=404, detail=f"Prompt with ID {prompt_id} not found")
+    return prompt_obj
+
+async def _save_model_result(
+    db: AsyncSession, writer: Optional[OutputWriter], prompt_id: int, model_name: str, prompt_text: str, output: str, cached: bool = False,
+    served_by: Optional[str] = None, hedge_leg: Optional[str] = None,
+) -> schemas.ModelResponseResponse:
+    if output.startswith("Error:"):
+        # Handler error strings are surfaced to the caller but never stored as outputs.
+        return schemas.ModelResponseResponse(
+            prompt_id=prompt_id,
+            model_name=model_name,
+            output="",
+            optimized_prompt_used=prompt_text,
+            error=output,
+        )
+    model_output = schemas.ModelOutputCreate(model_name=model_name, output=output, served_by=served_by, hedge_leg=hedge_leg)
+    if writer is not None:
+        # Acknowledged now, committed with the writer's next batch.
+        writer.submit(prompt_id, model_output)
+    else:
+        await crud.create_model_output_async(db=db, output=model_output, prompt_id=prompt_id)
+    return schemas.ModelResponseResponse(
+        prompt_id=prompt_id,
+        model_name=model_name,
+        output=output,
+        optimized_prompt_used=prompt_text,
+        cached=cached,
+        served_by=served_by,
+        hedge_leg=hedge_leg,
+    )
+
+@app.post("/get_model_response", response_model=schemas.ModelResponseResponse)
+async def get_model_response_endpoint(
+    request: schemas.ModelResponseRequest,
+    db: AsyncSession = Depends(get_async_session),
+    writer: Optional[OutputWriter] = Depends(get_output_writer),
+    current_user: str = Depends(verify_credentials)
+):
+    if request.model_name not in MODEL_MAP:
+        raise HTTPException(status_code=400, detail=f"Model '{request.model_name}' is not supported.")
+    prompt_obj = await _get_prompt_or_404(db, request.prompt_id)
+
+    result = await call_model(
+        request.model_name,
+        build_model_prompt(prompt_obj, request.model_name),
+        use_cache=not request.bypass_cache,
+        hedge=request.hedge,
+    )
+    response = await _save_model_result(
+        db, writer, prompt_obj.id, result.model_name, result.prompt_text, result.output, result.cached,
+        result.served_by, result.hedge_leg,
+    )
+    if response.error:
+        raise HTTPException(status_code=502, detail=f"LLM API call failed: {response.error}")
+    return response
+
+@app.post("/get_model_responses", response_model=schemas.MultiModelResponseResponse)
+async def get_model_responses_endpoint(
+    request: schemas.MultiModelResponseRequest,
+    db: AsyncSession = Depends(get_async_session),
+    writer: Optional[OutputWriter] = Depends(get_output_writer),
+    current_user: str = Depends(verify_credentials)
+):
+    """Fans the prompt out to every requested model concurrently."""
+    unsupported = [name for name in request.model_names if name not in MODEL_MAP]
+    if unsupported:
+        raise HTTPException(status_code=400, detail=f"Model '{unsupported[0]}' is not supported.")
+    prompt_obj = await _get_prompt_or_404(db, request.prompt_id)
+
+    # dict.fromkeys de-duplicates model names while keeping request order.
+    prompts = {name: build_model_prompt(prompt_obj, name) for name in dict.fromkeys(request.model_names)}
+    responses = []
+    async for result in dispatch(prompts, use_cache=not request.bypass_cache, hedge=request.hedge):
+        # Each output is persisted as soon as its model finishes.
+        responses.append(
+            await _save_model_result(
+                db, writer, prompt_obj.id, result.model_name, result.prompt_text, result.output, result.cached,
+                result.served_by, result.hedge_leg,
+            )
+        )
+    order = list(prompts)
+    responses.sort(key=lambda r: order.index(r.model_name))
+    return schemas.MultiModelResponseResponse(prompt_id=prompt_obj.id, responses=responses)
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/stream_model_responses")
+async def stream_model_responses_endpoint(
+    request: schemas.MultiModelResponseRequest,
+    db: AsyncSession = Depends(get_async_session),
+    writer: Optional[OutputWriter] = Depends(get_output_writer),
+    current_user: str = Depends(verify_credentials)
+):
+    """
+    Streams completions from every requested model as Server-Sent Events.
+
+    Emits `chunk` events as text arrives, then one `done` or `error` event per model,
+    and a final `end` event. Completed outputs are queued for storage when their `done` event fires.
+    """
+    unsupported = [name for name in request.model_names if name not in MODEL_MAP]
+    if unsupported:
+        raise HTTPException(status_code=400, detail=f"Model '{unsupported[0]}' is not supported.")
+    prompt_obj = await _get_prompt_or_404(db, request.prompt_id)
+    prompt_id = prompt_obj.id
+    prompts = {name: build_model_prompt(prompt_obj, name) for name in dict.fromkeys(request.model_names)}
+
+    async def event_stream():
+        async for event in stream_dispatch(prompts, use_cache=not request.bypass_cache):
+            if event.kind == "chunk":
+                yield _sse_event("chunk", {"model_name": event.model_name, "text": event.text})
+                continue
+            # "error" events carry the handler's error string, which _save_model_result won't store.
+            response = await _save_model_result(db, writer, prompt_id, event.model_name, event.prompt_text, event.text, event.cached)
+            yield _sse_event("error" if response.error else "done", response.model_dump())
+        yield _sse_event("end", {"prompt_id": prompt_id})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # Legacy endpoints maintained for backward compatibility
 @app.post("/generate_questionnaire_legacy")
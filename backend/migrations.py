@@ -0,0 +1,220 @@
+"""
+In-place schema migrations for existing databases.
+
+SQLModel.metadata.create_all() creates missing tables but never alters one that
+already exists, so columns and indexes added to models.py after a database was
+first created have to be brought in here. The applied schema version is kept in
+SQLite's `PRAGMA user_version`, so no bookkeeping table is needed.
+
+Every migration must be idempotent: a fresh database already has the current
+schema from create_all() and still runs each migration once to record its
+version, and a migration interrupted half-way is simply run again.
+
+Run from the backend directory:
+
+    python migrations.py            # apply everything pending to prompts.db
+    python migrations.py --status
+
+From version 4 on, the history search triggers call `history_text()`, an
+application-defined SQL function that only exists on connections opened through
+SQLAlchemy in this process (compression.py registers it on connect). Inserting
+or updating prompts and model outputs from anywhere else, such as the sqlite3
+CLI or a plain `sqlite3.connect()`, fails with "no such function: history_text";
+reads and deletes work everywhere. Scripts can call
+`compression.register_sqlite_functions(conn)` on their connection first.
+"""
+import argparse
+from typing import Callable, List, NamedTuple, Optional
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import SQLModel
+
+from config import logging
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[Connection], None]
+
+
+def _has_column(conn: Connection, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+def _add_hedge_columns(conn: Connection) -> None:
+    # ModelOutput.served_by / hedge_leg arrived with hedged requests.
+    for column in ("served_by", "hedge_leg"):
+        if not _has_column(conn, "modeloutput", column):
+            conn.exec_driver_sql(f"ALTER TABLE modeloutput ADD COLUMN {column} VARCHAR")
+
+
+def _add_history_indexes(conn: Connection) -> None:
+    # Names match what create_all() gives the `index=True` fields and Prompt.__table_args__.
+    # The (timestamp, id) index also serves plain timestamp range scans.
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_questionnaireresponse_prompt_id ON questionnaireresponse (prompt_id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_modeloutput_prompt_id ON modeloutput (prompt_id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_prompt_user_id ON prompt (user_id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_prompt_timestamp_id ON prompt (timestamp, id)")
+    conn.exec_driver_sql("ANALYZE")
+
+
+# Searchable text columns: (table, column, kind, prompt id column, rowid tag).
+# FTS rowids are `source id * 4 + tag`, so each source row maps to exactly one FTS row.
+SEARCH_SOURCES = (
+    ("prompt", "base_prompt", "prompt", "id", 1),
+    ("questionnaireresponse", "answer", "questionnaire_response", "prompt_id", 2),
+    ("modeloutput", "output", "model_output", "prompt_id", 3),
+)
+
+
+def _create_search_triggers(conn: Connection, table: str, column: str, body: str, kind: str, prompt_id: str, tag: int) -> None:
+    insert = (
+        f"INSERT INTO history_fts (rowid, body, kind, prompt_id) "
+        f"VALUES (NEW.id * 4 + {tag}, {body}, '{kind}', NEW.{prompt_id})"
+    )
+    delete = f"DELETE FROM history_fts WHERE rowid = OLD.id * 4 + {tag}"
+    conn.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN {insert}; END")
+    conn.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN {delete}; END")
+    conn.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF {column} ON {table} "
+        f"BEGIN {delete}; {insert}; END"
+    )
+
+
+def _add_history_search(conn: Connection) -> None:
+    # Triggers keep the index in step with every write path (crud, batch jobs, raw SQL).
+    conn.exec_driver_sql(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS history_fts "
+        "USING fts5(body, kind UNINDEXED, prompt_id UNINDEXED, tokenize='porter unicode61')"
+    )
+    conn.exec_driver_sql("DELETE FROM history_fts")
+    for table, column, kind, prompt_id, tag in SEARCH_SOURCES:
+        _create_search_triggers(conn, table, column, f"NEW.{column}", kind, prompt_id, tag)
+        conn.exec_driver_sql(
+            f"INSERT INTO history_fts (rowid, body, kind, prompt_id) "
+            f"SELECT id * 4 + {tag}, {column}, '{kind}', {prompt_id} FROM {table}"
+        )
+
+
+def _index_decompressed_outputs(conn: Connection) -> None:
+    # ModelOutput.output may now hold compressed BLOBs, so the search triggers read it through
+    # history_text() (registered on every connection by compression.py). Rows stored so far
+    # are plain text and already indexed correctly. From here on, writes to modeloutput need
+    # that function on the connection; see the module docstring.
+    for event in ("insert", "delete", "update"):
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS modeloutput_fts_{event}")
+    _create_search_triggers(conn, "modeloutput", "output", "history_text(NEW.output)", "model_output", "prompt_id", 3)
+
+
+def _blob_body(column: str, hash_column: str) -> str:
+    # Deduplicated rows keep their text in textblob (see crud.store_texts) and an empty inline column.
+    # Like the output triggers, this makes prompt writes need history_text() on the connection.
+    return (
+        f"COALESCE((SELECT history_text(body) FROM textblob WHERE hash = NEW.{hash_column}), "
+        f"history_text(NEW.{column}))"
+    )
+
+
+def _add_text_blobs(conn: Connection) -> None:
+    # Existing rows keep their inline text until `python compression.py --dedupe` moves them.
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS textblob (hash VARCHAR NOT NULL, body VARCHAR NOT NULL, PRIMARY KEY (hash))"
+    )
+    for table, column, kind, prompt_id, tag in SEARCH_SOURCES:
+        if table == "questionnaireresponse":
+            continue
+        hash_column = f"{column}_hash"
+        if not _has_column(conn, table, hash_column):
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {hash_column} VARCHAR REFERENCES textblob (hash)")
+        conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS ix_{table}_{hash_column} ON {table} ({hash_column})")
+        for event in ("insert", "delete", "update"):
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_fts_{event}")
+        _create_search_triggers(conn, table, column, _blob_body(column, hash_column), kind, prompt_id, tag)
+
+
+def _autoincrement_prompt_ids(conn: Connection) -> None:
+    # A plain INTEGER PRIMARY KEY hands out max(id) + 1, so once the newest prompts were archived
+    # their ids would come back for new ones. SQLite only adds AUTOINCREMENT by rebuilding the table;
+    # its indexes and search triggers go with the old one and are recreated.
+    sql = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'prompt'").scalar()
+    if "AUTOINCREMENT" in sql.upper():  # created by create_all() with the current model
+        return
+    columns = "id, user_id, base_prompt, base_prompt_hash, timestamp"
+    conn.exec_driver_sql(
+        "CREATE TABLE prompt_new (id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, user_id INTEGER, "
+        "base_prompt VARCHAR NOT NULL, base_prompt_hash VARCHAR, timestamp DATETIME NOT NULL, "
+        "FOREIGN KEY(user_id) REFERENCES user (id), FOREIGN KEY(base_prompt_hash) REFERENCES textblob (hash))"
+    )
+    # Copying the ids in also starts the sequence after the highest of them.
+    conn.exec_driver_sql(f"INSERT INTO prompt_new ({columns}) SELECT {columns} FROM prompt")
+    conn.exec_driver_sql("DROP TABLE prompt")
+    conn.exec_driver_sql("ALTER TABLE prompt_new RENAME TO prompt")
+    conn.exec_driver_sql("CREATE INDEX ix_prompt_user_id ON prompt (user_id)")
+    conn.exec_driver_sql("CREATE INDEX ix_prompt_timestamp_id ON prompt (timestamp, id)")
+    conn.exec_driver_sql("CREATE INDEX ix_prompt_base_prompt_hash ON prompt (base_prompt_hash)")
+    table, column, kind, prompt_id, tag = SEARCH_SOURCES[0]
+    _create_search_triggers(conn, table, column, _blob_body(column, f"{column}_hash"), kind, prompt_id, tag)
+    conn.exec_driver_sql("ANALYZE prompt")
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "model_output_hedge_columns", _add_hedge_columns),
+    Migration(2, "history_indexes", _add_history_indexes),
+    Migration(3, "history_search", _add_history_search),
+    Migration(4, "index_decompressed_outputs", _index_decompressed_outputs),
+    Migration(5, "text_blobs", _add_text_blobs),
+    Migration(6, "prompt_autoincrement", _autoincrement_prompt_ids),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(conn: Connection) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def migrate(engine: Engine, target: Optional[int] = None) -> List[int]:
+    """
+    Applies pending migrations up to `target` (default: all of them), each in its own transaction.
+
+    Returns:
+        The versions that were applied, in order.
+    """
+    target = LATEST_VERSION if target is None else target
+    applied = []
+    with engine.connect() as conn:
+        version = current_version(conn)
+    for migration in MIGRATIONS:
+        if migration.version <= version or migration.version > target:
+            continue
+        logging.info(f"Applying migration {migration.version} ({migration.name}).")
+        with engine.begin() as conn:
+            migration.apply(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {migration.version}")
+        applied.append(migration.version)
+    return applied
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Bring an existing prompts database up to the current schema.")
+    parser.add_argument("--target", type=int, help="Stop after this version (default: latest).")
+    parser.add_argument("--status", action="store_true", help="Print the current and latest versions and exit.")
+    args = parser.parse_args(argv)
+
+    # Imported late so --help works without touching the database.
+    import models  # noqa: F401  (registers the tables for create_all)
+    from database import engine
+
+    if args.status:
+        with engine.connect() as conn:
+            print(f"schema version {current_version(conn)} (latest {LATEST_VERSION})")
+        return
+    SQLModel.metadata.create_all(engine)  # tables the database doesn't have yet
+    applied = migrate(engine, args.target)
+    print(f"applied {', '.join(map(str, applied)) if applied else 'nothing'}")
+
+
+if __name__ == "__main__":
+    main()
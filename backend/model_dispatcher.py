@@ -0,0 +1,299 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from api_handlers import openai_handler, claude_handler, grok_handler, gemini_handler
+from response_cache import make_key, response_cache
+from rate_limiter import RateLimitExceeded, estimate_tokens, rate_limiter
+from hedging import HEDGE, hedger, latency_tracker
+from single_flight import single_flight
+from config import HEDGE_ENABLED
+from prompt_optimizer import split_instructions, standard_instructions
+
+# Friendly model name -> (SDK model name, handler module, max output tokens)
+MODEL_MAP = {
+    "GPT-4.1": ("gpt-4o", openai_handler, 8192),
+    "GPT-4.1 Mini": ("gpt-4-turbo", openai_handler, 8192),
+    "GPT-4.1 Nano": ("gpt-3.5-turbo", openai_handler, 4096),
+    "Claude Opus 4": ("claude-3-opus-20240229", claude_handler, 4096),
+    "Claude Sonnet 4": ("claude-3-sonnet-20240229", claude_handler, 4096),
+    "Grok-3": ("grok-3", grok_handler, 8192),
+    "Grok-3 Mini": ("grok-3-mini", grok_handler, 8192),
+    "Gemini 2.5 Pro": ("gemini-1.5-pro-latest", gemini_handler, 8192),
+    "Gemini 2.5 Flash": ("gemini-1.5-flash-latest", gemini_handler, 8192),
+}
+
+# Where a hedged call sends its backup request. Models not listed are hedged against themselves.
+HEDGE_FALLBACKS = {
+    "Claude Opus 4": "Claude Sonnet 4",
+    "Gemini 2.5 Pro": "Gemini 2.5 Flash",
+}
+
+
+class UnsupportedModelError(ValueError):
+    """Raised when a friendly model name has no entry in MODEL_MAP."""
+
+    def __init__(self, model_name: str):
+        super().__init__(f"Model '{model_name}' is not supported.")
+        self.model_name = model_name
+
+
+@dataclass
+class DispatchResult:
+    model_name: str
+    sdk_model: str
+    prompt_text: str
+    output: str
+    elapsed: float
+    cached: bool = False
+    served_by: Optional[str] = None  # friendly name of the model that produced `output`
+    hedge_leg: Optional[str] = None  # "primary" or "hedge" for hedged calls, else None
+    coalesced: bool = False  # True if this result was shared from an identical in-flight call
+
+    @property
+    def is_error(self) -> bool:
+        # Handlers never raise; failures come back as "Error: ..." strings.
+        return self.output.startswith("Error:")
+
+
+def resolve_model(model_name: str) -> Tuple[str, object, int]:
+    """
+    Looks up the SDK model name, handler module and token limit for a friendly model name.
+
+    Raises:
+        UnsupportedModelError: If the model is not in MODEL_MAP.
+    """
+    try:
+        return MODEL_MAP[model_name]
+    except KeyError:
+        raise UnsupportedModelError(model_name) from None
+
+
+def provider_name(handler) -> str:
+    """Short provider key for a handler module, e.g. "openai" for api_handlers.openai_handler."""
+    return handler.__name__.rsplit(".", 1)[-1].replace("_handler", "")
+
+
+def _handler_args(prompt_text: str) -> Tuple[str, dict]:
+    """
+    (prompt, kwargs) for a handler call: the optimizer's standard instructions travel as a
+    separate `system` block, a stable prefix providers can cache once it is long enough.
+    """
+    instructions, task = split_instructions(prompt_text)
+    return (task, {"system": instructions}) if instructions else (prompt_text, {})
+
+
+async def _call_provider(handler, sdk_model: str, prompt_text: str) -> str:
+    """Calls a handler under the provider/model rate limits; returns its text or an error string."""
+    provider = provider_name(handler)
+    prompt, kwargs = _handler_args(prompt_text)
+    try:
+        async with rate_limiter.limit(provider, sdk_model, estimate_tokens(prompt_text)):
+            return await handler.get_llm_response_async(prompt, sdk_model, **kwargs)
+    except RateLimitExceeded as e:
+        logging.warning(f"Rejected {provider} call to {sdk_model}: {e}")
+        return f"Error: {e}"
+
+
+async def _timed_call(handler, sdk_model: str, prompt_text: str) -> str:
+    """_call_provider that also feeds successful latencies to the hedging tracker."""
+    started = time.perf_counter()
+    output = await _call_provider(handler, sdk_model, prompt_text)
+    if not output.startswith("Error:"):
+        latency_tracker.record(sdk_model, time.perf_counter() - started)
+    return output
+
+
+def warm_models() -> None:
+    """
+    Lets handlers that keep per-model state (currently Gemini) build it before the first request,
+    for the standard instruction block a plain prompt sends as `system` (see _handler_args).
+    """
+    groups: Dict[Tuple[object, str], list] = {}
+    for model_name, (sdk_model, handler, _max_tokens) in MODEL_MAP.items():
+        groups.setdefault((handler, standard_instructions(model_name)), []).append(sdk_model)
+    for (handler, system), sdk_models in groups.items():
+        warm = getattr(handler, "warm_models", None)
+        if warm is not None:
+            warm(sdk_models, system=system or None)
+
+
+def cache_key_for(model_name: str, prompt_text: str) -> str:
+    # Only what reaches the provider: the handlers don't send MODEL_MAP's max_tokens (each uses
+    # its own fixed settings per SDK model), so keying on it would split identical calls.
+    sdk_model, _handler, _max_tokens = resolve_model(model_name)
+    return make_key(prompt_text, sdk_model)
+
+
+async def call_model(
+    model_name: str, prompt_text: str, use_cache: bool = True, hedge: Optional[bool] = None
+) -> DispatchResult:
+    """
+    Sends a single prompt to the handler registered for `model_name`.
+
+    Uses the handler's native async client, so many calls can be in flight on one event loop.
+    Successful responses are served from and written to the response cache unless
+    `use_cache` is False, in which case the provider is always called (and the fresh
+    answer still refreshes the cache).
+
+    With `hedge` (default: HEDGE_ENABLED), a backup request goes to HEDGE_FALLBACKS[model_name]
+    (or the same model) if the primary is slower than its usual latency; the first good
+    answer wins. Answers from a different fallback model are not cached under this model.
+
+    Concurrent calls with the same cache key share one upstream call (see single_flight).
+    """
+    if hedge is None:
+        hedge = HEDGE_ENABLED
+    sdk_model, handler, _max_tokens = resolve_model(model_name)
+    key = cache_key_for(model_name, prompt_text)
+    started = time.perf_counter()
+
+    if use_cache:
+        cached_output = await asyncio.to_thread(response_cache.get, key)
+        if cached_output is not None:
+            return DispatchResult(
+                model_name=model_name,
+                sdk_model=sdk_model,
+                prompt_text=prompt_text,
+                output=cached_output,
+                elapsed=time.perf_counter() - started,
+                cached=True,
+                served_by=model_name,
+            )
+
+    async def upstream() -> Tuple[str, str, Optional[str]]:
+        served_by, hedge_leg = model_name, None
+        if hedge:
+            fallback_name = HEDGE_FALLBACKS.get(model_name, model_name)
+            fallback_sdk_model, fallback_handler, _max_tokens = resolve_model(fallback_name)
+            output, hedge_leg = await hedger.run(
+                sdk_model,
+                lambda: _timed_call(handler, sdk_model, prompt_text),
+                lambda: _timed_call(fallback_handler, fallback_sdk_model, prompt_text),
+            )
+            if hedge_leg == HEDGE:
+                served_by = fallback_name
+        else:
+            output = await _timed_call(handler, sdk_model, prompt_text)
+
+        if served_by == model_name:
+            await asyncio.to_thread(response_cache.set, key, sdk_model, output)
+        return output, served_by, hedge_leg
+
+    # Hedged and unhedged calls may legitimately return different models' answers, so they don't share.
+    flight_key = f"{key}:hedged" if hedge else key
+    (output, served_by, hedge_leg), coalesced = await single_flight.do(flight_key, upstream)
+    return DispatchResult(
+        model_name=model_name,
+        sdk_model=sdk_model,
+        prompt_text=prompt_text,
+        output=output,
+        elapsed=time.perf_counter() - started,
+        served_by=served_by,
+        hedge_leg=hedge_leg,
+        coalesced=coalesced,
+    )
+
+
+async def dispatch(
+    prompts: Dict[str, str], use_cache: bool = True, hedge: Optional[bool] = None
+) -> AsyncIterator[DispatchResult]:
+    """
+    Sends prompts to several models concurrently and yields results as they complete.
+
+    Args:
+        prompts: Mapping of friendly model name -> final prompt text for that model.
+
+    Yields:
+        A DispatchResult per model, in completion order. Total wall-clock time is
+        bounded by the slowest model rather than the sum of all of them.
+    """
+    # Validate every model up front so a typo doesn't leave half the calls in flight.
+    for model_name in prompts:
+        resolve_model(model_name)
+
+    tasks = [asyncio.create_task(call_model(name, text, use_cache, hedge)) for name, text in prompts.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+@dataclass
+class StreamEvent:
+    """One event from stream_dispatch: a text chunk, the final output, or an error."""
+    kind: str  # "chunk", "done" or "error"
+    model_name: str
+    text: str
+    prompt_text: str
+    cached: bool = False
+
+
+async def _pump_stream(model_name: str, prompt_text: str, queue: asyncio.Queue, use_cache: bool = True) -> None:
+    sdk_model, handler, _max_tokens = resolve_model(model_name)
+    key = cache_key_for(model_name, prompt_text)
+    if use_cache:
+        cached_output = await asyncio.to_thread(response_cache.get, key)
+        if cached_output is not None:
+            # A cache hit is delivered as one chunk so clients render it the same way.
+            await queue.put(StreamEvent("chunk", model_name, cached_output, prompt_text, cached=True))
+            await queue.put(StreamEvent("done", model_name, cached_output, prompt_text, cached=True))
+            return
+
+    chunks = []
+    prompt, kwargs = _handler_args(prompt_text)
+    try:
+        # The rate-limit slot is held for the whole stream, not just until the first token.
+        async with rate_limiter.limit(provider_name(handler), sdk_model, estimate_tokens(prompt_text)):
+            async for chunk in handler.stream_llm_response(prompt, sdk_model, **kwargs):
+                if chunk.startswith("Error:"):
+                    # Handlers yield a single error string and stop; anything streamed before it is discarded.
+                    await queue.put(StreamEvent("error", model_name, chunk, prompt_text))
+                    return
+                chunks.append(chunk)
+                await queue.put(StreamEvent("chunk", model_name, chunk, prompt_text))
+    except RateLimitExceeded as e:
+        await queue.put(StreamEvent("error", model_name, f"Error: {e}", prompt_text))
+        return
+    except Exception as e:
+        # Handlers already map SDK errors; this only guards the queue against a stuck consumer.
+        await queue.put(StreamEvent("error", model_name, f"Error: {e}", prompt_text))
+        return
+
+    output = "".join(chunks).strip()
+    if not output:
+        await queue.put(StreamEvent("error", model_name, "Error: Model returned no content.", prompt_text))
+    else:
+        await asyncio.to_thread(response_cache.set, key, sdk_model, output)
+        await queue.put(StreamEvent("done", model_name, output, prompt_text))
+
+
+async def stream_dispatch(prompts: Dict[str, str], use_cache: bool = True) -> AsyncIterator[StreamEvent]:
+    """
+    Streams several models concurrently, interleaving their chunks as they arrive.
+
+    Every model ends with exactly one "done" or "error" event; "done" carries the
+    full stripped output so callers can persist it without re-assembling chunks.
+    Streams are never hedged: a second leg can't un-send chunks already delivered.
+    """
+    for model_name in prompts:
+        resolve_model(model_name)
+
+    queue: asyncio.Queue = asyncio.Queue()
+    tasks = [asyncio.create_task(_pump_stream(name, text, queue, use_cache)) for name, text in prompts.items()]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            event = await queue.get()
+            if event.kind != "chunk":
+                remaining -= 1
+            yield event
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
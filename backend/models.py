@@ -1,7 +1,22 @@
+import hashlib
+
+from sqlalchemy import Column, Index, event
+from sqlalchemy.orm import attributes, object_session
 from sqlmodel import Field, Relationship, SQLModel
 from typing import List, Optional
 from datetime import datetime
 
+from compression import CompressedText
+
+def content_hash(text: str) -> str:
+    """Key of `text` in the TextBlob table."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class TextBlob(SQLModel, table=True):
+    # Content-addressed text shared by every Prompt / ModelOutput with the same body; see crud.store_texts.
+    hash: str = Field(primary_key=True)
+    body: str = Field(sa_column=Column(CompressedText, nullable=False))
+
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     username: str = Field(index=True, unique=True)
@@ -9,18 +24,26 @@ class User(SQLModel, table=True):
     prompts: List["Prompt"] = Relationship(back_populates="user")
 
 class Prompt(SQLModel, table=True):
+    # Keyset pagination walks prompts newest-first on (timestamp, id); see crud.get_prompts_page.
+    # AUTOINCREMENT: ids of archived prompts (see archive.py) must never be handed out again.
+    __table_args__ = (Index("ix_prompt_timestamp_id", "timestamp", "id"), {"sqlite_autoincrement": True})
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: Optional[int] = Field(default=None, foreign_key="user.id", nullable=True)
+    user_id: Optional[int] = Field(default=None, foreign_key="user.id", nullable=True, index=True)
+    # Rows written through crud keep their text in TextBlob and leave base_prompt empty;
+    # it is filled back in on load (see _resolve_blob below).
     base_prompt: str
+    base_prompt_hash: Optional[str] = Field(default=None, foreign_key="textblob.hash", index=True)
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
     user: Optional[User] = Relationship(back_populates="prompts")
+    base_prompt_blob: Optional[TextBlob] = Relationship(sa_relationship_kwargs={"lazy": "joined"})
     questionnaire_responses: List["QuestionnaireResponse"] = Relationship(back_populates="prompt")
     model_outputs: List["ModelOutput"] = Relationship(back_populates="prompt")
 
 class QuestionnaireResponse(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    prompt_id: int = Field(foreign_key="prompt.id")
+    prompt_id: int = Field(foreign_key="prompt.id", index=True)
     question: str
     answer: str
 
@@ -28,9 +51,45 @@ class QuestionnaireResponse(SQLModel, table=True):
 
 class ModelOutput(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    prompt_id: int = Field(foreign_key="prompt.id")
+    prompt_id: int = Field(foreign_key="prompt.id", index=True)
     model_name: str
-    output: str
+    # Compressed at rest; see compression.py. Empty when the text lives in TextBlob. Reads always return str.
+    output: str = Field(sa_column=Column(CompressedText, nullable=False))
+    output_hash: Optional[str] = Field(default=None, foreign_key="textblob.hash", index=True)
     timestamp: datetime = Field(default_factory=datetime.utcnow)
+    # Set for hedged calls: which model actually answered and whether the "primary" or "hedge" leg won.
+    served_by: Optional[str] = None
+    hedge_leg: Optional[str] = None
 
     prompt: Prompt = Relationship(back_populates="model_outputs")
+    output_blob: Optional[TextBlob] = Relationship(sa_relationship_kwargs={"lazy": "joined"})
+
+class CachedResponse(SQLModel, table=True):
+    # SHA-256 of (final prompt, SDK model, params sent to the provider); see response_cache.make_key
+    key: str = Field(primary_key=True)
+    sdk_model: str = Field(index=True)
+    output: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+# (text attribute, hash attribute, blob relationship) for each model whose text lives in TextBlob.
+BLOB_FIELDS = {
+    Prompt: ("base_prompt", "base_prompt_hash", "base_prompt_blob"),
+    ModelOutput: ("output", "output_hash", "output_blob"),
+}
+
+def _resolve_blob(target, attrs=None) -> None:
+    text_attr, hash_attr, blob_attr = BLOB_FIELDS[type(target)]
+    if attrs is not None and text_attr not in attrs:
+        return
+    blob_hash = target.__dict__.get(hash_attr)
+    if blob_hash is None:
+        return  # stored inline (written before deduplication, or outside crud)
+    # The blob normally arrives with the row through the joined eager load; a partial
+    # refresh of expired attributes doesn't include it, so fall back to the identity map / a lookup.
+    blob = target.__dict__.get(blob_attr) or object_session(target).get(TextBlob, blob_hash)
+    # Set as the loaded value, so the session doesn't see a change to flush.
+    attributes.set_committed_value(target, text_attr, blob.body)
+
+for _model in BLOB_FIELDS:
+    event.listen(_model, "load", lambda target, context: _resolve_blob(target))
+    event.listen(_model, "refresh", lambda target, context, attrs: _resolve_blob(target, attrs))
@@ -0,0 +1,60 @@
+import base64
+import binascii
+from datetime import datetime
+from typing import Tuple
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor wasn't produced by one of the encoders below."""
+
+    def __init__(self, cursor: str):
+        super().__init__("Invalid pagination cursor.")
+        self.cursor = cursor
+
+
+def _encode(key: str, row_id: int) -> str:
+    # Clients pass cursors back unchanged; the encoding is not part of the API.
+    return base64.urlsafe_b64encode(f"{key}|{row_id}".encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> Tuple[str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        key, row_id = raw.rsplit("|", 1)
+        return key, int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursorError(cursor) from None
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Opaque token for the keyset position just after (timestamp, row_id)."""
+    return _encode(timestamp.isoformat(), row_id)
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Raises:
+        InvalidCursorError: If the token is malformed.
+    """
+    key, row_id = _decode(cursor)
+    try:
+        return datetime.fromisoformat(key), row_id
+    except ValueError:
+        raise InvalidCursorError(cursor) from None
+
+
+def encode_rank_cursor(rank: float, row_id: int) -> str:
+    """Opaque token for the position just after (rank, row_id) in a ranked result list."""
+    return _encode(repr(rank), row_id)
+
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, int]:
+    """
+    Raises:
+        InvalidCursorError: If the token is malformed.
+    """
+    key, row_id = _decode(cursor)
+    try:
+        return float(key), row_id
+    except ValueError:
+        raise InvalidCursorError(cursor) from None
@@ -1,6 +1,19 @@
-from typing import List
+from typing import List, Tuple
 import schemas
 
+# Boilerplate appended after the prompt-specific text. Kept verbatim in one place so
+# split_instructions can recognise it and the handlers can send it as a separate, stable
+# instruction block. At a few dozen tokens it is far below the providers' minimum for
+# prompt caching (api_handlers/usage.py), so it is not cached yet.
+ROLE_INSTRUCTION = "Act as an expert in the relevant domain."
+STEP_BY_STEP_INSTRUCTION = "Think step by step to ensure a comprehensive and accurate response."
+CLARITY_INSTRUCTION = "Ensure your response is clear, concise, and directly addresses the query."
+GPT4_INSTRUCTION = "Leverage advanced reasoning capabilities."
+CLAUDE_INSTRUCTION = "Be thorough and analytical in your response."
+STANDARD_INSTRUCTIONS = frozenset({
+    ROLE_INSTRUCTION, STEP_BY_STEP_INSTRUCTION, CLARITY_INSTRUCTION, GPT4_INSTRUCTION, CLAUDE_INSTRUCTION,
+})
+
 def optimize_prompt(
     base_prompt: str,
     questionnaire_answers: List[schemas.QuestionnaireResponseRead],
@@ -35,25 +48,58 @@ def optimize_prompt(
         # Check if any answer already implies a role
         role_implied = any("role of" in qa.answer.lower() or "act as" in qa.answer.lower() for qa in questionnaire_answers)
         if not role_implied:
-            optimized_prompt += "\nAct as an expert in the relevant domain."
+            optimized_prompt += f"\n{ROLE_INSTRUCTION}"
 
     # Strategy 2: Requesting step-by-step thinking (if not already implied)
     if "step-by-step" not in base_prompt.lower() and "step by step" not in base_prompt.lower():
-        optimized_prompt += "\nThink step by step to ensure a comprehensive and accurate response."
+        optimized_prompt += f"\n{STEP_BY_STEP_INSTRUCTION}"
 
     # Strategy 3: Adding clarity/conciseness request
     if "clear and concise" not in base_prompt.lower():
-        optimized_prompt += "\nEnsure your response is clear, concise, and directly addresses the query."
+        optimized_prompt += f"\n{CLARITY_INSTRUCTION}"
 
     # Placeholder for target_model specific optimizations
     if "gpt-4" in target_model.lower():
-        optimized_prompt += "\nLeverage advanced reasoning capabilities."
+        optimized_prompt += f"\n{GPT4_INSTRUCTION}"
     elif "claude" in target_model.lower():
-        optimized_prompt += "\nBe thorough and analytical in your response."
+        optimized_prompt += f"\n{CLAUDE_INSTRUCTION}"
 
     return optimized_prompt.strip()
 
 
+def split_instructions(prompt_text: str) -> Tuple[str, str]:
+    """
+    Splits a final prompt into (instructions, task).
+
+    `instructions` is the run of standard boilerplate lines at the end of the prompt
+    (empty if there is none) and `task` is everything before it. Joining them back with
+    a newline gives the original prompt.
+    """
+    lines = prompt_text.split("\n")
+    split_at = len(lines)
+    while split_at > 1 and lines[split_at - 1].strip() in STANDARD_INSTRUCTIONS:
+        split_at -= 1
+    return "\n".join(lines[split_at:]), "\n".join(lines[:split_at])
+
+
+def standard_instructions(target_model: str) -> str:
+    """The instruction block optimize_prompt appends for `target_model` when nothing in the prompt overrides it."""
+    return split_instructions(optimize_prompt("-", [], target_model))[0]
+
+
+def build_model_prompt(prompt_obj, model_name: str) -> str:
+    """Final prompt text for a stored Prompt row (with its questionnaire answers) and a target model."""
+    questionnaire_responses_read = [
+        schemas.QuestionnaireResponseRead.model_validate(qr_model)
+        for qr_model in (prompt_obj.questionnaire_responses or [])
+    ]
+    return optimize_prompt(
+        base_prompt=prompt_obj.base_prompt,
+        questionnaire_answers=questionnaire_responses_read,
+        target_model=model_name
+    )
+
+
 # Compatibility function for backward compatibility with master branch signature
 def optimize_prompt_legacy(initial_prompt: str, questionnaire_answers: List[str], target_model: str) -> str:
     """Legacy function signature for backward compatibility"""
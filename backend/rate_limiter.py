@@ -0,0 +1,180 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from config import (
+    RATE_LIMITS,
+    RATE_LIMIT_MODEL_MAX_IN_FLIGHT,
+    RATE_LIMIT_MAX_QUEUE,
+    RATE_LIMIT_QUEUE_TIMEOUT,
+)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call cannot be admitted: the wait queue is full or the wait timed out."""
+
+
+def estimate_tokens(text: str) -> int:
+    # Rough English-text heuristic (~4 characters per token); good enough for budgeting.
+    return max(1, math.ceil(len(text) / 4))
+
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at `rate_per_minute`.
+
+    Waiters are served one at a time in arrival order, so a large request cannot be
+    starved by a stream of small ones.
+    """
+
+    def __init__(self, rate_per_minute: int):
+        self.capacity = float(rate_per_minute)
+        self.tokens = float(rate_per_minute)
+        self.refill_per_second = rate_per_minute / 60.0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    async def take(self, amount: float = 1) -> None:
+        # A request larger than the whole bucket would never fit; let it through on a full bucket.
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.refill_per_second)
+                self._refill()
+            self.tokens -= amount
+
+
+class _ProviderState:
+    def __init__(self, rpm: int, tpm: int, max_in_flight: int):
+        self.rpm = TokenBucket(rpm) if rpm > 0 else None
+        self.tpm = TokenBucket(tpm) if tpm > 0 else None
+        self.max_in_flight = max_in_flight
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+
+class RateLimiter:
+    """
+    Governs provider calls with request/token buckets and in-flight caps.
+
+    Each provider has optional requests-per-minute and tokens-per-minute buckets plus a
+    max in-flight semaphore; each SDK model has its own in-flight semaphore on top.
+    Callers wait in a bounded queue rather than failing fast; they are only rejected
+    when the queue is full or they have waited longer than `queue_timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        provider_limits: Optional[Dict[str, dict]] = None,
+        model_max_in_flight: int = 16,
+        max_queue: int = 256,
+        queue_timeout: float = 60.0,
+    ):
+        self.provider_limits = provider_limits or {}
+        self.model_max_in_flight = model_max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._providers: Dict[str, _ProviderState] = {}
+        self._models: Dict[str, asyncio.Semaphore] = {}
+
+    def _provider(self, provider: str) -> _ProviderState:
+        state = self._providers.get(provider)
+        if state is None:
+            limits = self.provider_limits.get(provider, {})
+            state = _ProviderState(
+                rpm=limits.get("rpm", 0),
+                tpm=limits.get("tpm", 0),
+                max_in_flight=limits.get("max_in_flight", 32),
+            )
+            self._providers[provider] = state
+        return state
+
+    def _model(self, model: str) -> asyncio.Semaphore:
+        semaphore = self._models.get(model)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.model_max_in_flight)
+            self._models[model] = semaphore
+        return semaphore
+
+    async def _admit(self, state: _ProviderState, model_semaphore: asyncio.Semaphore, tokens: int, acquired: list) -> None:
+        await state.semaphore.acquire()
+        acquired.append(state.semaphore)
+        await model_semaphore.acquire()
+        acquired.append(model_semaphore)
+        if state.rpm:
+            await state.rpm.take(1)
+        if state.tpm:
+            await state.tpm.take(tokens)
+
+    @asynccontextmanager
+    async def limit(self, provider: str, model: str, tokens: int = 1) -> AsyncIterator[None]:
+        """
+        Holds a slot for one provider call for the duration of the `async with` block.
+
+        Raises:
+            RateLimitExceeded: If the wait queue is full or admission takes longer than queue_timeout.
+        """
+        state = self._provider(provider)
+        if state.waiting >= self.max_queue:
+            state.rejected += 1
+            raise RateLimitExceeded(f"{provider} request queue is full ({self.max_queue} waiting).")
+
+        acquired = []
+        state.waiting += 1
+        try:
+            await asyncio.wait_for(self._admit(state, self._model(model), tokens, acquired), self.queue_timeout)
+        except asyncio.TimeoutError:
+            state.timed_out += 1
+            for semaphore in acquired:
+                semaphore.release()
+            raise RateLimitExceeded(f"Timed out after {self.queue_timeout:g}s waiting for {provider} capacity.") from None
+        except BaseException:
+            for semaphore in acquired:
+                semaphore.release()
+            raise
+        finally:
+            state.waiting -= 1
+
+        state.admitted += 1
+        state.in_flight += 1
+        try:
+            yield
+        finally:
+            state.in_flight -= 1
+            for semaphore in acquired:
+                semaphore.release()
+
+    def stats(self) -> Dict[str, dict]:
+        stats = {}
+        for provider, state in sorted(self._providers.items()):
+            stats[provider] = {
+                "in_flight": state.in_flight,
+                "max_in_flight": state.max_in_flight,
+                "waiting": state.waiting,
+                "admitted": state.admitted,
+                "rejected": state.rejected,
+                "timed_out": state.timed_out,
+                "rpm_available": round(state.rpm.tokens, 2) if state.rpm else None,
+                "tpm_available": round(state.tpm.tokens, 2) if state.tpm else None,
+            }
+        return stats
+
+
+rate_limiter = RateLimiter(
+    provider_limits=RATE_LIMITS,
+    model_max_in_flight=RATE_LIMIT_MODEL_MAX_IN_FLIGHT,
+    max_queue=RATE_LIMIT_MAX_QUEUE,
+    queue_timeout=RATE_LIMIT_QUEUE_TIMEOUT,
+)
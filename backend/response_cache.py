@@ -0,0 +1,124 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete
+from sqlmodel import Session
+
+import models
+from config import RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS, logging
+from database import engine as default_engine
+
+
+def make_key(prompt_text: str, sdk_model: str, params: Optional[dict] = None) -> str:
+    """
+    Builds the cache key for a model call.
+
+    The key is a SHA-256 over the final prompt text, the resolved SDK model name and
+    the generation params, so any change to one of them is a miss. Pass only params
+    that are actually sent to the provider.
+    """
+    payload = json.dumps(
+        {"prompt": prompt_text, "model": sdk_model, "params": params or {}},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for LLM responses.
+
+    An in-process LRU with TTL sits in front of the CachedResponse table, which
+    survives restarts. Handler error strings ("Error: ...") are never stored.
+    """
+
+    def __init__(self, engine=None, max_entries: int = 512, ttl_seconds: int = 86400, enabled: bool = True):
+        self.engine = engine
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, output)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, output = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return output
+                del self._entries[key]
+
+        if self.engine is None:
+            return None
+        with Session(self.engine) as session:
+            row = session.get(models.CachedResponse, key)
+            if row is None:
+                return None
+            age = (datetime.utcnow() - row.created_at).total_seconds()
+            if age >= self.ttl_seconds:
+                session.delete(row)
+                session.commit()
+                return None
+            output = row.output
+        # Promote to the memory tier for the rest of its remaining lifetime.
+        self._remember(key, output, self.ttl_seconds - age)
+        return output
+
+    def set(self, key: str, sdk_model: str, output: str) -> None:
+        if not self.enabled or output.startswith("Error:"):
+            return
+
+        self._remember(key, output, self.ttl_seconds)
+        if self.engine is None:
+            return
+        try:
+            with Session(self.engine) as session:
+                session.merge(models.CachedResponse(key=key, sdk_model=sdk_model, output=output))
+                session.commit()
+        except Exception as e:
+            # The persistent tier is best-effort; a failed write must not fail the request.
+            logging.warning(f"Failed to persist cached response for {sdk_model}: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.engine is not None:
+            with Session(self.engine) as session:
+                session.exec(delete(models.CachedResponse))
+                session.commit()
+
+    def purge_expired(self) -> int:
+        """Deletes expired rows from the persistent tier and returns how many were removed."""
+        if self.engine is None:
+            return 0
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+        with Session(self.engine) as session:
+            result = session.exec(delete(models.CachedResponse).where(models.CachedResponse.created_at < cutoff))
+            session.commit()
+            return result.rowcount
+
+    def _remember(self, key: str, output: str, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, output)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+response_cache = ResponseCache(
+    engine=default_engine,
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+    enabled=RESPONSE_CACHE_ENABLED,
+)
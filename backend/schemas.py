@@ -20,6 +20,10 @@ class PromptRead(SQLModel):
     base_prompt: str
     timestamp: datetime
 
+class PromptPage(SQLModel):
+    items: List[PromptRead]
+    next_cursor: Optional[str] = None  # pass back as `cursor` for the next page; None on the last page
+
 # QuestionnaireResponse Schemas
 class QuestionnaireResponseCreate(SQLModel):
     question: str
@@ -35,6 +39,8 @@ class QuestionnaireResponseRead(SQLModel):
 class ModelOutputCreate(SQLModel):
     model_name: str
     output: str
+    served_by: Optional[str] = None
+    hedge_leg: Optional[str] = None
 
 class ModelOutputRead(SQLModel):
     id: int
@@ -42,12 +48,43 @@ class ModelOutputRead(SQLModel):
     model_name: str
     output: str
     timestamp: datetime
+    served_by: Optional[str] = None
+    hedge_leg: Optional[str] = None
 
 # Schemas for nested data (ReadWithDetails)
 class PromptReadWithDetails(PromptRead):
     questionnaire_responses: List[QuestionnaireResponseRead] = []
     model_outputs: List[ModelOutputRead] = []
 
+# --- Schemas for History Search ---
+class SearchHit(SQLModel):
+    prompt_id: int
+    kind: str  # "prompt", "questionnaire_response" or "model_output"
+    snippet: str  # matched terms wrapped in <mark></mark>
+    score: float  # higher is more relevant
+
+class SearchPage(SQLModel):
+    items: List[SearchHit]
+    next_cursor: Optional[str] = None
+
+# --- History Import ---
+class ModelOutputImport(ModelOutputCreate):
+    timestamp: Optional[datetime] = None  # default: time of import
+
+class PromptImport(PromptCreate):
+    # One NDJSON line of an import; /history/export writes this shape. Unknown keys are ignored.
+    id: Optional[int] = None
+    user_id: Optional[int] = None
+    timestamp: Optional[datetime] = None  # default: time of import
+    questionnaire_responses: List[QuestionnaireResponseCreate] = []
+    model_outputs: List[ModelOutputImport] = []
+
+class ImportSummary(SQLModel):
+    prompts: int = 0
+    questionnaire_responses: int = 0
+    model_outputs: int = 0
+    skipped: int = 0  # prompts left out as duplicates
+
 # --- Schemas for Questionnaire Generation ---
 class InitialPromptRequest(SQLModel):
     base_prompt: str
@@ -79,9 +116,26 @@ class RecommendedModelsResponse(SQLModel):
 class ModelResponseRequest(SQLModel):
     prompt_id: int
     model_name: str
+    bypass_cache: bool = False
+    hedge: Optional[bool] = None  # None: use the server's HEDGE_ENABLED default
 
 class ModelResponseResponse(SQLModel):
     prompt_id: int
     model_name: str
     output: str
     optimized_prompt_used: Optional[str] = None
+    error: Optional[str] = None
+    cached: bool = False
+    served_by: Optional[str] = None
+    hedge_leg: Optional[str] = None
+
+# --- Schemas for Multi-Model Comparison Endpoint ---
+class MultiModelResponseRequest(SQLModel):
+    prompt_id: int
+    model_names: List[str]
+    bypass_cache: bool = False
+    hedge: Optional[bool] = None  # applies to /get_model_responses; streams are never hedged
+
+class MultiModelResponseResponse(SQLModel):
+    prompt_id: int
+    responses: List[ModelResponseResponse] = []
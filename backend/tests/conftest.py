@@ -1,14 +1,19 @@
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlmodel import create_engine, Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from backend.migrations import migrate
 <<<<<<< HEAD
 from unittest.mock import patch
 import os
+import tempfile
 
 # Import the main FastAPI app and the dependency override mechanism
 # Adjust the import path based on your project structure.
 # Assuming 'main.py' is in the 'backend' directory, and 'tests' is also in 'backend'.
-from backend.main import app, get_session  # Main app and original get_session
+from backend.main import app, get_async_session, get_output_writer  # Main app and the dependencies it uses
 from backend import config # To mock API keys
 
 # 1. Mock API Keys before they are loaded by config.py
@@ -35,59 +40,64 @@ def mock_api_keys_for_tests():
              patch.object(config, 'GOOGLE_API_KEY', 'test_google_key'):
             yield
 
-# 2. In-memory SQLite database fixture
-# Using a session-scoped engine to create it once per test session.
-# Individual test functions will get a new session from this engine.
-SQLITE_DATABASE_URL_TEST = "sqlite:///:memory:"
+# 2. File-backed SQLite database fixture
+# The API writes through the aiosqlite engine while tests inspect rows through the sync
+# one, so both need the same database; an in-memory database is private to one connection.
+SQLITE_DATABASE_URL_TEST = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
 test_engine = create_engine(
     SQLITE_DATABASE_URL_TEST,
     connect_args={"check_same_thread": False}, # Needed for SQLite
     echo=False # Can be True for debugging SQL
 )
+# NullPool: each TestClient runs its own event loop, and aiosqlite connections can't outlive theirs.
+test_async_engine = create_async_engine(
+    SQLITE_DATABASE_URL_TEST.replace("sqlite://", "sqlite+aiosqlite://", 1), poolclass=NullPool
+)
 
 @pytest.fixture(scope="session")
 def db_engine():
     # SQLModel.metadata.drop_all(test_engine) # Optional: ensure clean state if run multiple times locally
     SQLModel.metadata.create_all(test_engine)
+    migrate(test_engine)  # objects create_all doesn't know about, e.g. the history search index
     return test_engine
 
-@pytest.fixture(scope="function") # Each test function gets a fresh session and transaction
+@pytest.fixture(scope="function") # Each test function gets a fresh session and empty tables
 def db_session(db_engine):
-    connection = db_engine.connect()
-    transaction = connection.begin()
-    session = Session(bind=connection, autocommit=False, autoflush=False)
+    session = Session(db_engine, autoflush=False)
     yield session
     session.close()
-    transaction.rollback() # Rollback changes after each test
-    connection.close()
+    # The API commits through its own engine, so a rollback can't undo its writes; empty the tables instead.
+    with db_engine.begin() as connection:
+        for table in reversed(SQLModel.metadata.sorted_tables):
+            connection.execute(table.delete())
 
 
-# 3. Override get_session dependency for API tests
-# This fixture will provide a test session to the FastAPI app's dependencies.
+# 3. Override get_async_session dependency for API tests
+# Endpoints get an AsyncSession on the test database.
 @pytest.fixture(scope="function")
 def test_app_db_session(db_session): # Depends on the db_session fixture
-    # This is the session that will be injected into endpoint dependencies
-    def override_get_session():
-        try:
-            yield db_session
-        finally:
-            # db_session fixture already handles close/rollback
-            pass
+    async def override_get_async_session():
+        async with AsyncSession(test_async_engine, expire_on_commit=False) as session:
+            yield session
 
     # Override the dependency in the app
-    original_get_session = app.dependency_overrides.get(get_session)
-    app.dependency_overrides[get_session] = override_get_session
+    original_get_async_session = app.dependency_overrides.get(get_async_session)
+    app.dependency_overrides[get_async_session] = override_get_async_session
+    # Store model outputs inline so tests can read them as soon as the response arrives.
+    app.dependency_overrides[get_output_writer] = lambda: None
     yield db_session # Provide the session to the test if needed directly
 
+    del app.dependency_overrides[get_output_writer]
+
     # Restore original dependency (or clear it) after the test
-    if original_get_session:
-        app.dependency_overrides[get_session] = original_get_session
+    if original_get_async_session:
+        app.dependency_overrides[get_async_session] = original_get_async_session
     else:
-        del app.dependency_overrides[get_session]
+        del app.dependency_overrides[get_async_session]
 
 
 # 4. TestClient fixture
-# This uses the overridden get_session through test_app_db_session
+# This uses the overridden get_async_session through test_app_db_session
 @pytest.fixture(scope="function")
 def client(test_app_db_session): # Ensures db session override is active
     # The TestClient will use the app with the overridden dependency
@@ -98,42 +108,51 @@ def client(test_app_db_session): # Ensures db session override is active
 # mock_api_keys_for_tests (session, autouse=True) runs first.
 # db_engine (session) sets up the database once.
 # db_session (function) gives a transactional session to each test.
-# test_app_db_session (function) overrides FastAPI's session for a test.
+# test_app_db_session (function) overrides FastAPI's async session for a test.
 # client (function) uses the app with the overridden session.
 =======
-from typing import Generator
+import os
+import tempfile
+from typing import AsyncGenerator, Generator
 
-# Import your FastAPI app and the real get_session dependency
-from backend.main import app
-from backend.database import get_session # This is what we need to override
+# Import your FastAPI app and the session dependency it actually uses
+from backend.main import app, get_async_session, get_output_writer # This is what we need to override
 
-# Define the test database URL (in-memory SQLite)
-TEST_DATABASE_URL = "sqlite:///:memory:"
+# Define the test database URL (file-backed SQLite, so the sync and async engines share it)
+TEST_DATABASE_URL = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
 
 # Create a test engine
 test_engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False}, echo=False) # echo=False for cleaner test output
+test_async_engine = create_async_engine(TEST_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1), poolclass=NullPool)
 
 # Fixture for a database session
 @pytest.fixture(scope="function") # "function" scope for test isolation: db is clean for each test
 def db_session() -> Generator[Session, None, None]:
     # Create tables for each test function
     SQLModel.metadata.create_all(test_engine)
+    migrate(test_engine)
 
     with Session(test_engine) as session:
         yield session
 
     # Drop tables after each test function to ensure isolation
     SQLModel.metadata.drop_all(test_engine)
+    with test_engine.begin() as connection:
+        connection.exec_driver_sql("DROP TABLE IF EXISTS history_fts")
+        connection.exec_driver_sql("PRAGMA user_version = 0")
 
 # Fixture for the TestClient, using the db_session override
 @pytest.fixture(scope="function") # Client should also be function-scoped if db is function-scoped
 def client(db_session: Session) -> Generator[TestClient, None, None]:
 
-    # Dependency override for get_session
-    def get_session_override() -> Generator[Session, None, None]:
-        yield db_session
+    # Dependency override for get_async_session
+    async def get_async_session_override() -> AsyncGenerator[AsyncSession, None]:
+        async with AsyncSession(test_async_engine, expire_on_commit=False) as session:
+            yield session
 
-    app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_async_session] = get_async_session_override
+    # Store model outputs inline so tests can read them as soon as the response arrives.
+    app.dependency_overrides[get_output_writer] = lambda: None
 
     with TestClient(app) as test_client:
         yield test_client
@@ -1,8 +1,19 @@
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import patch
+from unittest.mock import patch, AsyncMock
+# The breakers main.py reports on (it imports the package as top-level `api_handlers`).
+from backend.main import resilience
 
 # Fixtures 'client' and 'db_session' are from conftest.py
+
+@pytest.fixture(autouse=True)
+def memory_only_response_cache():
+    # Model endpoints read through the response cache; keep it off the real prompts.db.
+    from backend import model_dispatcher
+    from backend.response_cache import ResponseCache
+    with patch.object(model_dispatcher, "response_cache", ResponseCache(engine=None)):
+        yield
+
 # Basic auth credentials from backend/security.py (hardcoded)
 TEST_AUTH = ("admin", "password123")
 INVALID_AUTH = ("wrong", "user")
@@ -11,7 +22,19 @@ INVALID_AUTH = ("wrong", "user")
 def test_health_check(client: TestClient):
     response = client.get("/health")
     assert response.status_code == 200
-    assert response.json() == {"status": "healthy"}
+    assert response.json()["status"] == "healthy"
+    assert "circuit_breakers" in response.json()
+
+def test_health_check_reports_open_breaker(client: TestClient):
+    breaker = resilience.get_breaker("openai")
+    try:
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        data = client.get("/health").json()
+        assert data["status"] == "degraded"
+        assert data["circuit_breakers"]["openai"]["state"] == "open"
+    finally:
+        resilience.reset_breakers()
 
 def test_root_endpoint(client: TestClient):
     response = client.get("/")
@@ -87,6 +110,103 @@ def test_get_history_prompts_with_data(client: TestClient):
     assert len(data) == 1
     assert data[0]["base_prompt"] == "History test prompt"
 
+def test_get_history_prompts_page(client: TestClient):
+    for text in ("first", "second", "third"):
+        client.post("/submit_questionnaire", json={"base_prompt": text, "responses": []}, auth=TEST_AUTH)
+
+    page = client.get("/history/prompts/page", params={"limit": 2}, auth=TEST_AUTH).json()
+    assert [p["base_prompt"] for p in page["items"]] == ["third", "second"]
+    assert page["next_cursor"]
+
+    page = client.get("/history/prompts/page", params={"limit": 2, "cursor": page["next_cursor"]}, auth=TEST_AUTH).json()
+    assert [p["base_prompt"] for p in page["items"]] == ["first"]
+    assert page["next_cursor"] is None
+
+def test_get_prompts_cursor_mode(client: TestClient):
+    for text in ("first", "second", "third"):
+        client.post("/submit_questionnaire", json={"base_prompt": text, "responses": []}, auth=TEST_AUTH)
+
+    assert len(client.get("/prompts/", params={"skip": 1}, auth=TEST_AUTH).json()) == 2  # offset mode unchanged
+    page = client.get("/prompts/", params={"limit": 2, "cursor": ""}, auth=TEST_AUTH).json()
+    assert [p["base_prompt"] for p in page["items"]] == ["third", "second"]
+    page = client.get("/prompts/", params={"limit": 2, "cursor": page["next_cursor"]}, auth=TEST_AUTH).json()
+    assert [p["base_prompt"] for p in page["items"]] == ["first"]
+    assert page["next_cursor"] is None
+    assert client.get("/prompts/", params={"cursor": "garbage"}, auth=TEST_AUTH).status_code == 400
+    assert client.get("/prompts/", params={"cursor": "", "skip": 5}, auth=TEST_AUTH).status_code == 400
+
+def test_get_history_prompts_page_bad_cursor(client: TestClient):
+    response = client.get("/history/prompts/page", params={"cursor": "garbage"}, auth=TEST_AUTH)
+    assert response.status_code == 400
+
+def test_search_history(client: TestClient):
+    for text in ("Plan a marathon training block", "Write a limerick about marathons", "Unrelated prompt"):
+        client.post("/submit_questionnaire", json={"base_prompt": text, "responses": []}, auth=TEST_AUTH)
+
+    page = client.get("/history/search", params={"q": "marathon", "limit": 1}, auth=TEST_AUTH).json()
+    assert len(page["items"]) == 1
+    assert page["items"][0]["kind"] == "prompt"
+    assert "<mark>" in page["items"][0]["snippet"]
+
+    rest = client.get("/history/search", params={"q": "marathon", "cursor": page["next_cursor"]}, auth=TEST_AUTH).json()
+    assert len(rest["items"]) == 1
+    assert rest["next_cursor"] is None
+    assert rest["items"][0]["prompt_id"] != page["items"][0]["prompt_id"]
+
+def test_export_history_ndjson(client: TestClient, db_session):
+    import json
+    from backend import crud, schemas
+    for i in range(3):
+        res = client.post(
+            "/submit_questionnaire",
+            json={"base_prompt": f"Export {i}", "responses": [{"question": "Tone?", "answer": f"answer {i}"}]},
+            auth=TEST_AUTH,
+        )
+    crud.create_model_output(db_session, schemas.ModelOutputCreate(model_name="M1", output="Exported output"), res.json()["id"])
+
+    response = client.get("/history/export", params={"chunk_size": 2}, auth=TEST_AUTH)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["base_prompt"] for r in records] == ["Export 0", "Export 1", "Export 2"]
+    assert records[1]["questionnaire_responses"][0]["answer"] == "answer 1"
+    assert [o["output"] for o in records[2]["model_outputs"]] == ["Exported output"]
+
+def test_export_history_rejects_unknown_format(client: TestClient):
+    assert client.get("/history/export", params={"format": "csv"}, auth=TEST_AUTH).status_code == 422
+
+def test_export_history_parquet(client: TestClient):
+    pq = pytest.importorskip("pyarrow.parquet")
+    import io
+    client.post("/submit_questionnaire", json={"base_prompt": "Columnar", "responses": []}, auth=TEST_AUTH)
+
+    response = client.get("/history/export", params={"format": "parquet"}, auth=TEST_AUTH)
+    assert response.status_code == 200
+    assert pq.read_table(io.BytesIO(response.content)).column("base_prompt").to_pylist() == ["Columnar"]
+
+def test_import_history_ndjson(client: TestClient):
+    import json
+    lines = [
+        {"id": 500 + i, "base_prompt": f"Imported {i}", "questionnaire_responses": [{"question": "Tone?", "answer": "Dry"}],
+         "model_outputs": [{"model_name": "M1", "output": f"Out {i}"}]}
+        for i in range(3)
+    ]
+    body = "\n".join(json.dumps(line) for line in lines) + "\n"
+
+    response = client.post("/history/import", params={"batch_size": 2}, content=body, auth=TEST_AUTH)
+    assert response.status_code == 200
+    assert response.json() == {"prompts": 3, "questionnaire_responses": 3, "model_outputs": 3, "skipped": 0}
+    assert client.post("/history/import", content=body, auth=TEST_AUTH).json()["skipped"] == 3
+
+    detail = client.get("/history/prompt/501", auth=TEST_AUTH).json()
+    assert detail["base_prompt"] == "Imported 1"
+    assert [o["output"] for o in detail["model_outputs"]] == ["Out 1"]
+
+def test_import_history_rejects_bad_line(client: TestClient):
+    response = client.post("/history/import", content='{"base_prompt": "ok"}\nnot json\n', auth=TEST_AUTH)
+    assert response.status_code == 400
+    assert "Line 2" in response.json()["detail"]
+
 def test_get_history_prompt_details(client: TestClient):
     # Create a prompt with details
     submit_payload = {
@@ -147,10 +267,11 @@ def test_optimize_prompt(client: TestClient):
 
 # --- /get_model_response Endpoint (with mocking) ---
 # This is where we mock the actual LLM handler calls
-@patch("backend.api_handlers.openai_handler.get_llm_response")
-@patch("backend.api_handlers.claude_handler.get_llm_response")
-@patch("backend.api_handlers.grok_handler.get_llm_response")
-@patch("backend.api_handlers.gemini_handler.get_llm_response")
+# (on the top-level `api_handlers` package, which is what model_dispatcher imports)
+@patch("api_handlers.openai_handler.get_llm_response_async", new_callable=AsyncMock)
+@patch("api_handlers.claude_handler.get_llm_response_async", new_callable=AsyncMock)
+@patch("api_handlers.grok_handler.get_llm_response_async", new_callable=AsyncMock)
+@patch("api_handlers.gemini_handler.get_llm_response_async", new_callable=AsyncMock)
 def test_get_model_response_openai(
     mock_gemini, mock_grok, mock_claude, mock_openai, client: TestClient, db_session
 ):
@@ -186,7 +307,29 @@ def test_get_model_response_openai(
     assert outputs[0].output == "Mocked OpenAI Output"
 
 
-@patch("backend.api_handlers.claude_handler.get_llm_response")
+
+@patch("api_handlers.openai_handler.get_llm_response_async", new_callable=AsyncMock)
+def test_get_model_response_writes_behind(mock_openai, client: TestClient, db_session):
+    from backend import crud
+    from backend.main import app, get_output_writer
+    from backend.write_behind import OutputWriter
+    mock_openai.return_value = "Queued output"
+    writer = OutputWriter(engine=db_session.get_bind(), max_delay=60.0)
+    app.dependency_overrides[get_output_writer] = lambda: writer
+
+    submit_res = client.post("/submit_questionnaire", json={"base_prompt": "Later", "responses": []}, auth=TEST_AUTH)
+    prompt_id = submit_res.json()["id"]
+    response = client.post("/get_model_response", json={"prompt_id": prompt_id, "model_name": "GPT-4.1"}, auth=TEST_AUTH)
+
+    # Acknowledged before the commit; stored once the writer flushes.
+    assert response.status_code == 200
+    assert response.json()["output"] == "Queued output"
+    assert crud.get_model_outputs_by_prompt(db=db_session, prompt_id=prompt_id) == []
+    writer.close(timeout=5)
+    assert [o.output for o in crud.get_model_outputs_by_prompt(db=db_session, prompt_id=prompt_id)] == ["Queued output"]
+
+
+@patch("api_handlers.claude_handler.get_llm_response_async", new_callable=AsyncMock)
 def test_get_model_response_claude_handler_error(mock_claude, client: TestClient):
     mock_claude.return_value = "Error: Claude simulated error" # Handler's error format
 
@@ -217,3 +360,83 @@ def test_get_model_response_prompt_not_found(client: TestClient):
     response = client.post("/get_model_response", json=model_req_payload, auth=TEST_AUTH)
     assert response.status_code == 404
     assert "Prompt with ID 9999 not found" in response.json()["detail"]
+
+# --- /get_model_responses Endpoint (concurrent fan-out) ---
+def test_get_model_responses_fan_out(client: TestClient, db_session):
+    from backend import crud, model_dispatcher
+    openai_mod = model_dispatcher.MODEL_MAP["GPT-4.1"][1]
+    claude_mod = model_dispatcher.MODEL_MAP["Claude Opus 4"][1]
+
+    prompt_payload = {"base_prompt": "Compare me", "responses": []}
+    submit_res = client.post("/submit_questionnaire", json=prompt_payload, auth=TEST_AUTH)
+    prompt_id = submit_res.json()["id"]
+
+    with patch.object(openai_mod, "get_llm_response_async", new=AsyncMock(return_value="OpenAI says hi")), \
+         patch.object(claude_mod, "get_llm_response_async", new=AsyncMock(return_value="Error: Claude simulated error")):
+        payload = {"prompt_id": prompt_id, "model_names": ["GPT-4.1", "Claude Opus 4"]}
+        response = client.post("/get_model_responses", json=payload, auth=TEST_AUTH)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [r["model_name"] for r in data["responses"]] == ["GPT-4.1", "Claude Opus 4"]
+    assert data["responses"][0]["output"] == "OpenAI says hi"
+    assert data["responses"][1]["error"] == "Error: Claude simulated error"
+
+    # Only the successful output is persisted
+    outputs = crud.get_model_outputs_by_prompt(db=db_session, prompt_id=prompt_id)
+    assert [o.model_name for o in outputs] == ["GPT-4.1"]
+
+def test_get_model_responses_unsupported_model(client: TestClient):
+    payload = {"prompt_id": 1, "model_names": ["GPT-4.1", "NonExistentModel-123"]}
+    response = client.post("/get_model_responses", json=payload, auth=TEST_AUTH)
+    assert response.status_code == 400
+    assert "Model 'NonExistentModel-123' is not supported" in response.json()["detail"]
+
+# --- /stream_model_responses Endpoint (Server-Sent Events) ---
+def test_stream_model_responses_sse(client: TestClient, db_session):
+    from backend import crud, model_dispatcher
+    openai_mod = model_dispatcher.MODEL_MAP["GPT-4.1"][1]
+
+    async def fake_stream(prompt, model_name, system=None):
+        for chunk in ["Streamed ", "answer"]:
+            yield chunk
+
+    submit_res = client.post("/submit_questionnaire", json={"base_prompt": "Stream me", "responses": []}, auth=TEST_AUTH)
+    prompt_id = submit_res.json()["id"]
+
+    with patch.object(openai_mod, "stream_llm_response", new=fake_stream):
+        payload = {"prompt_id": prompt_id, "model_names": ["GPT-4.1"]}
+        response = client.post("/stream_model_responses", json=payload, auth=TEST_AUTH)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    body = response.text
+    assert body.count("event: chunk") == 2
+    assert "event: done" in body
+    assert body.rstrip().endswith(f'data: {{"prompt_id": {prompt_id}}}')
+
+    outputs = crud.get_model_outputs_by_prompt(db=db_session, prompt_id=prompt_id)
+    assert [o.output for o in outputs] == ["Streamed answer"]
+
+def test_get_model_response_cache_hit_and_bypass(client: TestClient):
+    from backend import model_dispatcher
+    openai_mod = model_dispatcher.MODEL_MAP["GPT-4.1"][1]
+
+    submit_res = client.post("/submit_questionnaire", json={"base_prompt": "Cache me", "responses": []}, auth=TEST_AUTH)
+    prompt_id = submit_res.json()["id"]
+
+    mock_call = AsyncMock(return_value="Cached answer")
+    with patch.object(openai_mod, "get_llm_response_async", new=mock_call):
+        first = client.post("/get_model_response", json={"prompt_id": prompt_id, "model_name": "GPT-4.1"}, auth=TEST_AUTH)
+        second = client.post("/get_model_response", json={"prompt_id": prompt_id, "model_name": "GPT-4.1"}, auth=TEST_AUTH)
+        bypassed = client.post(
+            "/get_model_response",
+            json={"prompt_id": prompt_id, "model_name": "GPT-4.1", "bypass_cache": True},
+            auth=TEST_AUTH,
+        )
+
+    assert first.json()["cached"] is False
+    assert second.json()["cached"] is True
+    assert second.json()["output"] == "Cached answer"
+    assert bypassed.json()["cached"] is False
+    assert mock_call.await_count == 2
@@ -148,7 +148,7 @@ def test_root_unauthenticated(client):
 def test_health_authenticated(client, basic_auth_headers):
     response = client.get("/health", auth=basic_auth_headers)
     assert response.status_code == 200
-    assert response.json() == {"status": "healthy"}
+    assert response.json()["status"] == "healthy"
 
 def test_health_unauthenticated(client):
     response = client.get("/health")
@@ -0,0 +1,20 @@
+import pytest
+from unittest.mock import patch
+
+from backend.api_handlers import resilience
+# The handlers and the dispatcher import the package as top-level `api_handlers` (as the app
+# runs from backend/), which is a separate module instance from `backend.api_handlers`.
+from backend.api_handlers.openai_handler import resilience as handler_resilience
+
+
+@pytest.fixture(autouse=True)
+def fast_resilience():
+    # Retries stay on so their behaviour is exercised, but without real backoff sleeps,
+    # and breaker state from one test must not leak into the next.
+    for module in (resilience, handler_resilience):
+        module.reset_breakers()
+    with patch.object(resilience, "RETRY_BASE_DELAY", 0.0), patch.object(resilience, "RETRY_MAX_DELAY", 0.0), \
+            patch.object(handler_resilience, "RETRY_BASE_DELAY", 0.0), patch.object(handler_resilience, "RETRY_MAX_DELAY", 0.0):
+        yield
+    for module in (resilience, handler_resilience):
+        module.reset_breakers()
@@ -0,0 +1,122 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session
+
+from backend import crud, database, schemas
+
+
+@pytest.fixture
+def history_archive(tmp_path, monkeypatch):
+    # crud's own import of the module, so the fallback sees the replacement.
+    archive = crud.archive.HistoryArchive(str(tmp_path), bucket="month")
+    monkeypatch.setattr(crud.archive, "history_archive", archive)
+    yield archive
+    archive.close()
+
+
+def _record(i: int, timestamp: str, output: str) -> schemas.PromptImport:
+    return schemas.PromptImport(
+        id=i,
+        base_prompt=f"Prompt {i}",
+        timestamp=timestamp,
+        questionnaire_responses=[{"question": "Tone?", "answer": f"answer {i}"}],
+        model_outputs=[{"model_name": "M1", "output": output}],
+    )
+
+
+def test_old_prompts_move_to_monthly_archives(db_session: Session, history_archive, tmp_path):
+    crud.import_prompts(db_session, [
+        _record(1, "2023-01-10T00:00:00", "Old output"),
+        _record(2, "2023-02-10T00:00:00", "Shared output"),
+        _record(3, "2024-06-01T00:00:00", "Shared output"),
+    ])
+
+    moved = history_archive.archive_before(db_session.get_bind(), datetime(2024, 1, 1), batch_size=1)
+
+    assert moved == 2
+    assert sorted(p.name for p in tmp_path.glob("*.db")) == ["prompts-2023-01.db", "prompts-2023-02.db"]
+    assert [p.id for p in db_session.execute(text("SELECT id FROM prompt")).all()] == [3]
+    assert len(crud.search_history(db=db_session, query="prompt")[0]) == 1
+    # The blob still used by prompt 3 stays; the one only prompt 1 used goes with it.
+    assert db_session.execute(text("SELECT count(*) FROM textblob")).scalar() == 2  # "Prompt 3", "Shared output"
+
+    db_session.expunge_all()
+    prompt = crud.get_prompt_with_details(db=db_session, prompt_id=2)
+    assert prompt.base_prompt == "Prompt 2"
+    assert prompt.questionnaire_responses[0].answer == "answer 2"
+    assert [o.output for o in prompt.model_outputs] == ["Shared output"]
+    assert [o.output for o in crud.get_model_outputs_by_prompt(db=db_session, prompt_id=1)] == ["Old output"]
+    assert crud.get_prompt(db=db_session, prompt_id=42) is None
+    assert crud.get_questionnaire_responses_by_prompt(db=db_session, prompt_id=42) == []
+    assert history_archive.archive_before(db_session.get_bind(), datetime(2024, 1, 1)) == 0
+
+
+def test_archived_prompt_comes_back_with_its_relationships(db_session: Session, history_archive):
+    crud.import_prompts(db_session, [_record(5, "2022-03-01T00:00:00", "Archived output")])
+    history_archive.archive_before(db_session.get_bind(), datetime(2024, 1, 1))
+
+    prompt = crud.get_prompt(db=db_session, prompt_id=5)
+
+    assert [r.answer for r in prompt.questionnaire_responses] == ["answer 5"]
+    assert [o.output for o in prompt.model_outputs] == ["Archived output"]
+
+
+def test_archived_ids_are_not_reused(db_session: Session, history_archive):
+    crud.import_prompts(db_session, [_record(1, "2022-01-01T00:00:00", "Old"), _record(2, "2022-01-02T00:00:00", "Old")])
+    history_archive.archive_before(db_session.get_bind(), datetime(2024, 1, 1))
+
+    prompt = crud.create_prompt(db=db_session, prompt=schemas.PromptCreate(base_prompt="New"))
+
+    assert prompt.id > 2  # the hot table is empty, so a plain INTEGER PRIMARY KEY would start over at 1
+    assert crud.get_model_outputs_by_prompt(db=db_session, prompt_id=prompt.id) == []
+
+
+def test_hot_prompt_without_children_does_not_read_the_archive(db_session: Session, history_archive):
+    crud.import_prompts(db_session, [_record(4, "2022-01-01T00:00:00", "Archived output")])
+    history_archive.archive_before(db_session.get_bind(), datetime(2024, 1, 1))
+    # As if the id had been handed out again, e.g. before prompt ids were AUTOINCREMENT.
+    crud.import_prompts(db_session, [schemas.PromptImport(id=4, base_prompt="Hot prompt")])
+
+    assert crud.get_model_outputs_by_prompt(db=db_session, prompt_id=4) == []
+    assert crud.get_questionnaire_responses_by_prompt(db=db_session, prompt_id=4) == []
+
+
+def test_async_lookup_falls_back_to_the_archive(db_session: Session, history_archive):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    crud.import_prompts(db_session, [_record(7, "2022-05-01T00:00:00", "Archived output")])
+    history_archive.archive_before(db_session.get_bind(), datetime(2024, 1, 1))
+
+    async def run():
+        engine = create_async_engine(str(db_session.get_bind().url).replace("sqlite://", "sqlite+aiosqlite://", 1))
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                return await crud.get_prompt_async(db, 7), await crud.get_model_outputs_by_prompt_async(db, 7)
+        finally:
+            await engine.dispose()
+
+    prompt, outputs = asyncio.run(run())
+    assert prompt.base_prompt == "Prompt 7"
+    assert [o.output for o in outputs] == ["Archived output"]
+
+
+def test_compact_hands_free_pages_back(tmp_path):
+    engine = database.make_engine(f"sqlite:///{tmp_path / 'hot.db'}", profile="wal", echo=False)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE filler (body TEXT)")
+        conn.execute(text("INSERT INTO filler VALUES (:body)"), [{"body": "x" * 2000}] * 200)
+        conn.exec_driver_sql("DELETE FROM filler")
+
+    assert crud.archive.compact(engine, pages=10) == 10
+    assert crud.archive.compact(engine, pages=100000) > 0
+    assert crud.archive.compact(engine) == 0
+    engine.dispose()
+
+
+def test_unknown_bucket_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="Unknown archive bucket"):
+        crud.archive.HistoryArchive(str(tmp_path), bucket="week")
@@ -0,0 +1,148 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from sqlmodel import Session
+
+from backend import batch_jobs, crud, schemas
+
+
+def _make_prompts(db_session: Session, count: int):
+    return [
+        crud.create_prompt(db=db_session, prompt=schemas.PromptCreate(base_prompt=f"Prompt {i}")).id
+        for i in range(count)
+    ]
+
+
+def test_local_batch_job_writes_model_outputs(db_session: Session):
+    prompt_ids = _make_prompts(db_session, 3)
+    local = batch_jobs.LocalBatchProvider(polls_until_done=2)
+
+    summary = batch_jobs.run_batch_job(
+        db_session, prompt_ids, ["GPT-4.1", "Claude Opus 4"],
+        providers={"openai": local, "claude": local}, poll_interval=0,
+    )
+
+    assert summary.items == 6
+    assert summary.succeeded == 6
+    assert summary.provider_batches == 2
+    outputs = crud.get_model_outputs_by_prompt(db=db_session, prompt_id=prompt_ids[0])
+    assert {o.model_name for o in outputs} == {"GPT-4.1", "Claude Opus 4"}
+    assert all(o.output.startswith("[") for o in outputs)
+
+
+def test_batches_are_split_at_provider_limit(db_session: Session):
+    prompt_ids = _make_prompts(db_session, 5)
+    local = batch_jobs.LocalBatchProvider(polls_until_done=0)
+    local.max_batch_size = 2
+
+    summary = batch_jobs.run_batch_job(db_session, prompt_ids, ["GPT-4.1"], providers={"openai": local}, poll_interval=0)
+
+    assert summary.provider_batches == 3
+    assert sorted(len(items) for items in local.submitted.values()) == [1, 2, 2]
+
+
+def test_error_results_are_counted_not_stored(db_session: Session):
+    prompt_ids = _make_prompts(db_session, 2)
+    local = batch_jobs.LocalBatchProvider(
+        responder=lambda item: "Error: refused" if item.prompt_id == prompt_ids[0] else "ok", polls_until_done=0
+    )
+
+    summary = batch_jobs.run_batch_job(db_session, prompt_ids, ["GPT-4.1"], providers={"openai": local}, poll_interval=0)
+
+    assert (summary.succeeded, summary.failed) == (1, 1)
+    assert crud.get_model_outputs_by_prompt(db=db_session, prompt_id=prompt_ids[0]) == []
+
+
+def test_models_without_batch_api_run_interactively(db_session: Session):
+    prompt_ids = _make_prompts(db_session, 2)
+    result = MagicMock(output="interactive answer")
+
+    async def fake_call_model(model_name, prompt_text):
+        return result
+
+    with patch.object(batch_jobs, "call_model", new=fake_call_model):
+        summary = batch_jobs.run_batch_job(db_session, prompt_ids, ["Grok-3"], providers={}, poll_interval=0)
+
+    assert summary.provider_batches == 0
+    assert summary.succeeded == 2
+
+
+def test_unknown_model_is_rejected(db_session: Session):
+    with pytest.raises(ValueError, match="not supported"):  # UnsupportedModelError
+        batch_jobs.run_batch_job(db_session, [1], ["Unknown"], providers={}, poll_interval=0)
+
+
+def test_custom_ids_are_valid_for_anthropic():
+    custom_id = batch_jobs._custom_id(42, "gpt-3.5-turbo")
+    assert custom_id == "p42-gpt-3_5-turbo"
+
+
+def test_openai_request_and_result_formats():
+    item = batch_jobs.BatchItem("p1-gpt-4o", 1, "GPT-4.1", "gpt-4o", "Hello", 8192)
+    provider = batch_jobs.OpenAIBatchProvider(client=MagicMock())
+    request = provider.build_requests([item])[0]
+    assert request["url"] == "/v1/chat/completions"
+    assert request["body"]["messages"] == [{"role": "user", "content": "Hello"}]
+
+    ok = {"custom_id": "a", "response": {"status_code": 200, "body": {"choices": [{"message": {"content": " Hi "}}]}}}
+    failed = {"custom_id": "b", "response": {"status_code": 400, "body": {"error": {"message": "bad"}}}}
+    assert provider._parse_line(ok) == "Hi"
+    assert provider._parse_line(failed).startswith("Error:")
+
+
+def test_anthropic_results_parsing():
+    text_block = MagicMock(type="text", text="Answer")
+    succeeded = MagicMock(custom_id="a")
+    succeeded.result.type = "succeeded"
+    succeeded.result.message.content = [text_block]
+    expired = MagicMock(custom_id="b")
+    expired.result.type = "expired"
+    client = MagicMock()
+    client.messages.batches.results.return_value = [succeeded, expired]
+
+    outputs = batch_jobs.AnthropicBatchProvider(client).results("batch_1")
+
+    assert outputs == {"a": "Answer", "b": "Error: Anthropic batch request expired."}
+
+
+def test_prompt_ids_are_queried_in_chunks(db_session: Session, monkeypatch):
+    prompt_ids = _make_prompts(db_session, 5)
+    monkeypatch.setattr(batch_jobs, "PROMPT_ID_CHUNK_SIZE", 2)
+
+    items = batch_jobs.build_items(db_session, reversed(prompt_ids), ["GPT-4.1"])
+
+    assert [item.prompt_id for item in items] == sorted(prompt_ids)
+
+
+def test_rerun_resumes_batches_submitted_before_a_failure(db_session: Session, tmp_path):
+    prompt_ids = _make_prompts(db_session, 2)
+    state_path = str(tmp_path / "batch_state.json")
+    local = batch_jobs.LocalBatchProvider(polls_until_done=0)
+    broken = MagicMock(max_batch_size=100000)
+    broken.submit.side_effect = RuntimeError("provider down")
+
+    with pytest.raises(RuntimeError):
+        batch_jobs.run_batch_job(
+            db_session, prompt_ids, ["GPT-4.1", "Claude Opus 4"],
+            providers={"openai": local, "claude": broken}, poll_interval=0, state_path=state_path,
+        )
+    assert len(local.submitted) == 1
+
+    summary = batch_jobs.run_batch_job(
+        db_session, prompt_ids, ["GPT-4.1", "Claude Opus 4"],
+        providers={"openai": local, "claude": local}, poll_interval=0, state_path=state_path,
+    )
+
+    assert summary.succeeded == 4
+    assert summary.provider_batches == 2
+    assert [len(items) for items in local.submitted.values()] == [2, 2]  # the OpenAI batch was not resubmitted
+    assert not (tmp_path / "batch_state.json").exists()
+
+
+def test_claude_batches_need_an_sdk_with_message_batches():
+    client = MagicMock()
+    del client.messages.batches
+
+    with patch.object(batch_jobs.openai_handler, "client", None), \
+            patch.object(batch_jobs.claude_handler, "client", client):
+        assert batch_jobs.default_providers() == {}
+    assert batch_jobs.AnthropicBatchProvider.supported(MagicMock())
@@ -1,5 +1,6 @@
+import asyncio
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from backend.api_handlers import claude_handler
 from backend.config import ANTHROPIC_API_KEY # To check if it's mocked
 
@@ -138,3 +139,69 @@ def test_get_llm_response_multiple_text_blocks_concatenated(patch_anthropic_clie
 
     response = claude_handler.get_llm_response("Test prompt", "claude-3-sonnet-20240229")
     assert response == "Hello World!"
+
+# --- Async variant ---
+def test_get_llm_response_async_success():
+    mock_async_client = MagicMock()
+    mock_async_client.messages.create = AsyncMock()
+    mock_text_block = MagicMock()
+    mock_text_block.type = "text"
+    mock_text_block.text = "Async Claude response"
+    mock_message = MagicMock()
+    mock_message.content = [mock_text_block]
+    mock_async_client.messages.create.return_value = mock_message
+
+    with patch.object(claude_handler, 'async_client', mock_async_client):
+        response = asyncio.run(claude_handler.get_llm_response_async("Test prompt", "claude-3-opus-20240229"))
+
+    mock_async_client.messages.create.assert_awaited_once_with(
+        model="claude-3-opus-20240229",
+        max_tokens=4096,
+        messages=[{"role": "user", "content": "Test prompt"}]
+    )
+    assert response == "Async Claude response"
+
+def test_get_llm_response_async_generic_exception():
+    mock_async_client = MagicMock()
+    mock_async_client.messages.create = AsyncMock(side_effect=Exception("Some generic error"))
+
+    with patch.object(claude_handler, 'async_client', mock_async_client):
+        response = asyncio.run(claude_handler.get_llm_response_async("Test prompt", "claude-3-opus-20240229"))
+
+    assert "Error: An unexpected error occurred while contacting Anthropic." in response
+
+# --- Prompt caching ---
+def test_short_system_instructions_are_sent_plain(patch_anthropic_client):
+    mock_text_block = MagicMock(type="text", text="Answer")
+    patch_anthropic_client.messages.create.return_value = MagicMock(content=[mock_text_block])
+
+    claude_handler.get_llm_response("Task", "claude-3-opus-20240229", system="Be thorough.")
+
+    request = patch_anthropic_client.messages.create.call_args.kwargs
+    assert request["messages"] == [{"role": "user", "content": "Task"}]
+    # Below the minimum cacheable length a breakpoint would never write to the cache.
+    assert request["system"] == "Be thorough."
+
+def test_long_system_instructions_are_sent_as_cache_breakpoint():
+    long_block = "Follow the house style guide. " * 200  # well over 1024 tokens
+    assert claude_handler.system_param(long_block) == [
+        {"type": "text", "text": long_block, "cache_control": {"type": "ephemeral"}}
+    ]
+
+def test_cache_token_usage_is_recorded(patch_anthropic_client):
+    usage = claude_handler.usage  # the instance the handler records into
+    usage.reset()
+    mock_response = MagicMock(content=[MagicMock(type="text", text="ok")])
+    mock_response.usage.input_tokens = 12
+    mock_response.usage.output_tokens = 5
+    mock_response.usage.cache_read_input_tokens = 1100
+    mock_response.usage.cache_creation_input_tokens = 0
+    patch_anthropic_client.messages.create.return_value = mock_response
+
+    claude_handler.get_llm_response("Task", "claude-3-opus-20240229", system="Be thorough.")
+
+    stats = usage.stats()["claude-3-opus-20240229"]
+    assert stats["cache_read_tokens"] == 1100
+    assert stats["input_tokens"] == 12
+    assert stats["cache_read_ratio"] == round(1100 / 1112, 4)
+    usage.reset()
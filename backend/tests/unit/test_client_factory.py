@@ -0,0 +1,64 @@
+import asyncio
+import httpx
+import pytest
+
+from backend.api_handlers import client_factory
+
+
+@pytest.fixture(autouse=True)
+def fresh_pools():
+    client_factory.close_all()
+    asyncio.run(client_factory.aclose_all())
+    client_factory._counters.clear()
+    yield
+    client_factory.close_all()
+    asyncio.run(client_factory.aclose_all())
+    client_factory._counters.clear()
+
+
+def test_clients_are_shared_per_host():
+    first = client_factory.get_http_client(client_factory.OPENAI_HOST)
+    again = client_factory.get_http_client(client_factory.OPENAI_HOST)
+    other = client_factory.get_http_client(client_factory.ANTHROPIC_HOST)
+
+    assert first is again
+    assert first is not other
+    assert client_factory.get_async_http_client(client_factory.XAI_HOST) is \
+        client_factory.get_async_http_client(client_factory.XAI_HOST)
+
+
+def test_timeout_uses_configured_values():
+    timeout = client_factory.build_timeout()
+    assert timeout.connect == client_factory.PROVIDER_HTTP_CONNECT_TIMEOUT
+    assert timeout.read == client_factory.PROVIDER_HTTP_READ_TIMEOUT
+
+
+def test_pool_stats_counts_requests():
+    http_client = client_factory.get_http_client(client_factory.OPENAI_HOST)
+    # Swap the network transport for an in-process one; the counting hooks stay attached to the client.
+    http_client._transport = httpx.MockTransport(lambda request: httpx.Response(200, json={}))
+
+    http_client.get("https://api.openai.com/v1/models")
+    http_client.get("https://api.openai.com/v1/models")
+
+    stats = client_factory.pool_stats()[client_factory.OPENAI_HOST]
+    assert stats["requests"] == 2
+    assert stats["max_connections"] == client_factory.PROVIDER_HTTP_MAX_CONNECTIONS
+    assert stats["keepalive_expiry"] == client_factory.PROVIDER_HTTP_KEEPALIVE_EXPIRY
+
+
+def test_pool_stats_counts_requests_from_many_threads():
+    from concurrent.futures import ThreadPoolExecutor
+    http_client = client_factory.get_http_client(client_factory.OPENAI_HOST)
+    http_client._transport = httpx.MockTransport(lambda request: httpx.Response(200, json={}))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: http_client.get("https://api.openai.com/v1/models"), range(400)))
+
+    assert client_factory.pool_stats()[client_factory.OPENAI_HOST]["requests"] == 400
+
+
+def test_close_all_drops_pools():
+    client_factory.get_http_client(client_factory.OPENAI_HOST)
+    client_factory.close_all()
+    assert client_factory.OPENAI_HOST not in client_factory.pool_stats()
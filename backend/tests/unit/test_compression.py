@@ -0,0 +1,30 @@
+import zlib
+
+import pytest
+
+from backend import compression
+
+LONG_TEXT = "The quarterly report shows steady growth across every region. " * 40
+
+def test_long_text_round_trips_compressed():
+    stored = compression.compress_text(LONG_TEXT, min_bytes=256)
+    assert compression.is_compressed(stored)
+    assert len(stored) < len(LONG_TEXT) / 5
+    assert compression.decompress_text(stored) == LONG_TEXT
+
+def test_short_text_is_stored_plain():
+    assert compression.compress_text("short answer", min_bytes=256) == "short answer"
+
+def test_incompressible_text_is_stored_plain():
+    # zlib's header and checksum outweigh any saving on a tiny value
+    assert compression.compress_text("ok", min_bytes=0) == "ok"
+
+def test_legacy_and_unicode_values_read_back():
+    assert compression.decompress_text("written before compression") == "written before compression"
+    assert compression.decompress_text(None) is None
+    text = "Résumé — 日本語 " * 50
+    assert compression.decompress_text(compression.compress_text(text, min_bytes=0)) == text
+
+def test_unknown_codec_version_is_rejected():
+    with pytest.raises(compression.UnknownCodecError):
+        compression.decompress_text(compression.MAGIC + bytes([99]) + zlib.compress(b"x"))
@@ -1,3 +1,6 @@
+import asyncio
+from datetime import datetime
+
 import pytest
 from sqlmodel import Session
 from backend import crud, schemas, models
@@ -163,3 +166,333 @@ def test_relationships_prompt_with_details(db_session: Session):
 
     assert len(retrieved_prompt.model_outputs) == 2
     assert {mo.model_name for mo in retrieved_prompt.model_outputs} == {"M1", "M2"}
+
+
+def test_create_prompt_with_responses_is_one_commit(db_session: Session):
+    responses = [schemas.QuestionnaireResponseCreate(question=f"Q{i}", answer=f"A{i}") for i in range(20)]
+
+    def submit():
+        return crud.create_prompt_with_responses(
+            db=db_session, prompt=schemas.PromptCreate(base_prompt="Bulk"), responses=responses
+        )
+
+    details, queries = _count_queries(db_session.get_bind(), submit)
+    # One INSERT for the prompt text blob, one for the prompt and one multi-row INSERT for every response.
+    assert queries == 3
+    assert details.id is not None
+    assert [r.question for r in details.questionnaire_responses] == [f"Q{i}" for i in range(20)]
+    assert all(r.id is not None and r.prompt_id == details.id for r in details.questionnaire_responses)
+    assert len(crud.get_questionnaire_responses_by_prompt(db=db_session, prompt_id=details.id)) == 20
+
+def test_create_prompt_with_responses_is_all_or_nothing(db_session: Session):
+    # Skips validation so the INSERT itself fails (question is NOT NULL).
+    bad = schemas.QuestionnaireResponseCreate.model_construct(question=None, answer="A")
+    with pytest.raises(Exception):
+        crud.create_prompt_with_responses(
+            db=db_session,
+            prompt=schemas.PromptCreate(base_prompt="Never stored"),
+            responses=[schemas.QuestionnaireResponseCreate(question="Q", answer="A"), bad],
+        )
+    assert crud.get_prompts(db=db_session) == []
+
+
+def test_model_output_is_compressed_at_rest(db_session: Session):
+    from sqlalchemy import text
+    prompt = crud.create_prompt(db=db_session, prompt=schemas.PromptCreate(base_prompt="Long answer please"), user_id=None)
+    long_output = "Each paragraph restates the conclusion in slightly different words. " * 50
+    db_mo = crud.create_model_output(db=db_session, output=schemas.ModelOutputCreate(model_name="M1", output=long_output), prompt_id=prompt.id)
+
+    stored_type, stored_size = db_session.execute(
+        text("SELECT typeof(body), length(body) FROM textblob JOIN modeloutput ON hash = output_hash WHERE id = :id"),
+        {"id": db_mo.id},
+    ).one()
+    assert stored_type == "blob"
+    assert stored_size < len(long_output) / 5
+    prompt_id = prompt.id
+    db_session.expunge_all()
+    assert crud.get_model_outputs_by_prompt(db=db_session, prompt_id=prompt_id)[0].output == long_output
+    # Search indexes the decompressed text
+    assert [h.kind for h in crud.search_history(db=db_session, query="paragraph restates")[0]] == ["model_output"]
+
+def test_compress_stored_outputs_backfills_plain_rows(db_session: Session):
+    from sqlalchemy import text
+    prompt = crud.create_prompt(db=db_session, prompt=schemas.PromptCreate(base_prompt="Legacy"), user_id=None)
+    long_output = "An answer written before outputs were compressed. " * 30
+    for output in (long_output, "short"):
+        db_session.execute(
+            text("INSERT INTO modeloutput (prompt_id, model_name, output, timestamp) VALUES (:p, 'M', :o, '2024-01-01')"),
+            {"p": prompt.id, "o": output},
+        )
+    db_session.commit()
+
+    assert crud.compress_stored_outputs(db=db_session, batch_size=1) == 1
+    types = db_session.execute(text("SELECT typeof(output) FROM modeloutput ORDER BY id")).scalars().all()
+    assert types == ["blob", "text"]
+    assert crud.compress_stored_outputs(db=db_session) == 0
+    assert {o.output for o in crud.get_model_outputs_by_prompt(db=db_session, prompt_id=prompt.id)} == {long_output, "short"}
+
+
+def test_get_prompts_page_walks_newest_first(db_session: Session):
+    created = [crud.create_prompt(db=db_session, prompt=schemas.PromptCreate(base_prompt=f"p{i}"), user_id=None) for i in range(5)]
+    # Two prompts sharing a timestamp are still ordered (by id) and neither is skipped.
+    created[3].timestamp = created[2].timestamp
+    db_session.add(created[3])
+    db_session.commit()
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = crud.get_prompts_page(db=db_session, limit=2, cursor=cursor)
+        seen.extend(p.base_prompt for p in page)
+        if cursor is None:
+            break
+    assert seen == ["p4", "p3", "p2", "p1", "p0"]
+
+def test_get_prompts_page_is_stable_when_new_prompts_arrive(db_session: Session):
+    for i in range(4):
+        crud.create_prompt(db=db_session, prompt=schemas.PromptCreate(base_prompt=f"p{i}"), user_id=None)
+    first, cursor = crud.get_prompts_page(db=db_session, limit=2)
+    crud.create_prompt(db=db_session, prompt=schemas.PromptCreate(base_prompt="newer"), user_id=None)
+
+    second, cursor = crud.get_prompts_page(db=db_session, limit=2, cursor=cursor)
+    assert [p.base_prompt for p in first] == ["p3", "p2"]
+    assert [p.base_prompt for p in second] == ["p1", "p0"]
+    assert cursor is None
+
+def test_get_prompts_page_rejects_bad_cursor(db_session: Session):
+    with pytest.raises(ValueError, match="Invalid pagination cursor"):
+        crud.get_prompts_page(db=db_session, cursor="not-a-cursor")
+
+
+def test_search_history_ranks_and_pages(db_session: Session):
+    first = crud.create_prompt(db=db_session, prompt=schemas.PromptCreate(base_prompt="Summarise quarterly revenue"), user_id=None)
+    second = crud.create_prompt(db=db_session, prompt=schemas.PromptCreate(base_prompt="Draft a poem"), user_id=None)
+    crud.create_model_output(db=db_session, output=schemas.ModelOutputCreate(model_name="M1", output="Revenue grew, revenue doubled"), prompt_id=second.id)
+    crud.create_questionnaire_response(db=db_session, response=schemas.QuestionnaireResponseCreate(question="Audience?", answer="investors"), prompt_id=first.id)
+
+    hits, cursor = crud.search_history(db=db_session, query="revenue", limit=1)
+    assert len(hits) == 1 and cursor
+    more, cursor = crud.search_history(db=db_session, query="revenue", limit=1, cursor=cursor)
+    assert cursor is None
+    assert {(h.kind, h.prompt_id) for h in hits + more} == {("prompt", first.id), ("model_output", second.id)}
+    assert hits[0].score >= more[0].score
+    assert "<mark>" in hits[0].snippet
+
+    # Stemmed, and query syntax characters are treated as plain text
+    assert [h.kind for h in crud.search_history(db=db_session, query='investor"')[0]] == ["questionnaire_response"]
+    assert crud.search_history(db=db_session, query="OR (") == ([], None)
+    assert crud.search_history(db=db_session, query="   ") == ([], None)
+
+
+def _count_queries(engine, fn):
+    """Returns (result, number of SQL statements executed) for fn()."""
+    from sqlalchemy import event
+    statements = []
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        return fn(), len(statements)
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+
+@pytest.mark.parametrize("n_outputs", [1, 25])
+def test_get_prompt_with_details_query_count_is_bounded(db_session: Session, n_outputs):
+    prompt = crud.create_prompt(db=db_session, prompt=schemas.PromptCreate(base_prompt="Counted"), user_id=None)
+    crud.create_multiple_questionnaire_responses(db=db_session, responses=[
+        schemas.QuestionnaireResponseCreate(question="Q1", answer="A1"),
+    ], prompt_id=prompt.id)
+    crud.create_model_outputs(db=db_session, outputs=[
+        (prompt.id, schemas.ModelOutputCreate(model_name=f"M{i}", output=f"O{i}")) for i in range(n_outputs)
+    ])
+    prompt_id = prompt.id
+    db_session.expunge_all()
+
+    def fetch_and_read():
+        detailed = crud.get_prompt_with_details(db=db_session, prompt_id=prompt_id)
+        return len(detailed.questionnaire_responses), len(detailed.model_outputs)
+
+    counts, queries = _count_queries(db_session.get_bind(), fetch_and_read)
+    assert counts == (1, n_outputs)
+    # The prompt, then one SELECT ... IN per relationship, however many children there are.
+    assert queries == 3
+
+def test_get_prompts_with_details_avoids_n_plus_one(db_session: Session):
+    for i in range(10):
+        prompt = crud.create_prompt(db=db_session, prompt=schemas.PromptCreate(base_prompt=f"p{i}"), user_id=None)
+        crud.create_model_output(db=db_session, output=schemas.ModelOutputCreate(model_name="M", output="O"), prompt_id=prompt.id)
+    db_session.expunge_all()
+
+    def fetch_and_read():
+        return [len(p.model_outputs) + len(p.questionnaire_responses) for p in crud.get_prompts_with_details(db=db_session)]
+
+    sizes, queries = _count_queries(db_session.get_bind(), fetch_and_read)
+    assert sizes == [1] * 10
+    assert queries == 3
+
+
+# --- Async variants ---
+
+def _run_with_async_session(scenario):
+    """Runs `scenario(session)` against a fresh in-memory aiosqlite database."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlmodel import SQLModel
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    async def run():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                return await scenario(session)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+def test_async_user_round_trip():
+    async def scenario(db):
+        db_user = await crud.create_user_async(db=db, user=schemas.UserCreate(username="asyncuser"))
+        assert db_user.id is not None
+        assert (await crud.get_user_async(db=db, user_id=db_user.id)).username == "asyncuser"
+        assert (await crud.get_user_by_username_async(db=db, username="asyncuser")).id == db_user.id
+        assert await crud.get_user_async(db=db, user_id=999) is None
+
+    _run_with_async_session(scenario)
+
+def test_async_get_prompt_loads_details_eagerly():
+    async def scenario(db):
+        prompt = await crud.create_prompt_async(db=db, prompt=schemas.PromptCreate(base_prompt="Async prompt"))
+        await crud.create_multiple_questionnaire_responses_async(db=db, responses=[
+            schemas.QuestionnaireResponseCreate(question="Q1", answer="A1"),
+        ], prompt_id=prompt.id)
+        await crud.create_model_output_async(
+            db=db, output=schemas.ModelOutputCreate(model_name="M1", output="O1"), prompt_id=prompt.id
+        )
+        return await crud.get_prompt_async(db=db, prompt_id=prompt.id)
+
+    retrieved = _run_with_async_session(scenario)
+    # Read after the session is gone: the relationships must already be loaded.
+    assert [qr.question for qr in retrieved.questionnaire_responses] == ["Q1"]
+    assert [mo.output for mo in retrieved.model_outputs] == ["O1"]
+
+def test_async_list_queries():
+    async def scenario(db):
+        for text in ("p1", "p2", "p3"):
+            await crud.create_prompt_async(db=db, prompt=schemas.PromptCreate(base_prompt=text))
+        prompts = await crud.get_prompts_async(db=db, skip=1, limit=1)
+        saved = await crud.create_model_outputs_async(db=db, outputs=[
+            (prompts[0].id, schemas.ModelOutputCreate(model_name="M1", output="O1")),
+            (prompts[0].id, schemas.ModelOutputCreate(model_name="M2", output="O2")),
+        ])
+        outputs = await crud.get_model_outputs_by_prompt_async(db=db, prompt_id=prompts[0].id)
+        return prompts, saved, outputs
+
+    prompts, saved, outputs = _run_with_async_session(scenario)
+    assert [p.base_prompt for p in prompts] == ["p2"]
+    assert saved == 2
+    assert {o.model_name for o in outputs} == {"M1", "M2"}
+
+def test_identical_texts_are_stored_once(db_session: Session):
+    from sqlalchemy import text
+    long_output = "The same deterministic answer, word for word. " * 20
+    prompt_ids = []
+    for _ in range(3):
+        prompt = crud.create_prompt(db=db_session, prompt=schemas.PromptCreate(base_prompt="Same question"), user_id=None)
+        crud.create_model_output(db=db_session, output=schemas.ModelOutputCreate(model_name="M1", output=long_output), prompt_id=prompt.id)
+        prompt_ids.append(prompt.id)
+
+    assert db_session.execute(text("SELECT count(*) FROM textblob")).scalar() == 2
+    # Inline columns are left empty; the text is resolved on read.
+    assert db_session.execute(text("SELECT DISTINCT output FROM modeloutput")).scalars().all() == [""]
+    db_session.expunge_all()
+    prompt = crud.get_prompt_with_details(db=db_session, prompt_id=prompt_ids[0])
+    assert prompt.base_prompt == "Same question"
+    assert prompt.model_outputs[0].output == long_output
+    assert not db_session.dirty
+
+def test_find_model_outputs_by_prompt_text(db_session: Session):
+    prompt = crud.create_prompt(db=db_session, prompt=schemas.PromptCreate(base_prompt="Has this run?"), user_id=None)
+    crud.create_model_outputs(db_session, [
+        (prompt.id, schemas.ModelOutputCreate(model_name="M1", output="one")),
+        (prompt.id, schemas.ModelOutputCreate(model_name="M2", output="two")),
+    ])
+
+    assert [mo.output for mo in crud.find_model_outputs(db_session, "Has this run?", "M2")] == ["two"]
+    assert len(crud.find_model_outputs(db_session, "Has this run?")) == 2
+    assert crud.find_model_outputs(db_session, "Has this run? ", "M2") == []
+
+def test_dedupe_stored_texts_moves_inline_rows(db_session: Session):
+    from sqlalchemy import text
+    for _ in range(2):
+        db_session.execute(text("INSERT INTO prompt (base_prompt, timestamp) VALUES ('Legacy prompt', '2024-01-01')"))
+    db_session.commit()
+
+    assert crud.dedupe_stored_texts(db_session, batch_size=1) == 2
+    assert crud.dedupe_stored_texts(db_session) == 0
+    assert db_session.execute(text("SELECT count(*) FROM textblob")).scalar() == 1
+    assert [p.base_prompt for p in crud.get_prompts(db=db_session)] == ["Legacy prompt"] * 2
+    assert len(crud.find_model_outputs(db_session, "Legacy prompt")) == 0
+    assert len(crud.search_history(db=db_session, query="legacy")[0]) == 2
+
+def test_get_export_chunk_walks_prompts_with_children(db_session: Session):
+    ids = []
+    for i in range(3):
+        prompt = crud.create_prompt(db=db_session, prompt=schemas.PromptCreate(base_prompt=f"Export {i}"), user_id=None)
+        crud.create_model_output(db=db_session, output=schemas.ModelOutputCreate(model_name="M1", output=f"Out {i}"), prompt_id=prompt.id)
+        ids.append(prompt.id)
+
+    first = crud.get_export_chunk(db_session, after_id=0, limit=2)
+    rest = crud.get_export_chunk(db_session, after_id=first[-1]["id"], limit=2)
+    assert [r["id"] for r in first + rest] == ids
+    assert [r["base_prompt"] for r in rest] == ["Export 2"]
+    assert [o["output"] for o in rest[0]["model_outputs"]] == ["Out 2"]
+    assert crud.get_export_chunk(db_session, after_id=ids[-1]) == []
+
+def _import_record(i: int, **fields) -> schemas.PromptImport:
+    fields.setdefault("timestamp", "2024-01-01T00:00:00")
+    return schemas.PromptImport(
+        base_prompt=f"Imported {i}",
+        questionnaire_responses=[{"question": "Tone?", "answer": f"answer {i}"}],
+        model_outputs=[{"model_name": "M1", "output": "Shared output"}],
+        **fields,
+    )
+
+def test_import_prompts_skips_known_ids(db_session: Session):
+    summary = crud.import_prompts(db_session, [_import_record(1, id=10), _import_record(2, id=11)])
+    assert summary == schemas.ImportSummary(prompts=2, questionnaire_responses=2, model_outputs=2)
+
+    again = crud.import_prompts(db_session, [_import_record(1, id=10), _import_record(3, id=12), _import_record(3, id=12)])
+    assert again == schemas.ImportSummary(prompts=1, questionnaire_responses=1, model_outputs=1, skipped=2)
+
+    db_session.expunge_all()
+    prompt = crud.get_prompt_with_details(db=db_session, prompt_id=12)
+    assert prompt.base_prompt == "Imported 3"
+    assert prompt.questionnaire_responses[0].answer == "answer 3"
+    assert [o.output for o in prompt.model_outputs] == ["Shared output"]
+    assert len(crud.find_model_outputs(db_session, "Imported 1")) == 1
+
+def test_import_prompts_dedupes_by_content(db_session: Session):
+    crud.import_prompts(db_session, [_import_record(1, id=10)], dedupe="content")
+    # A different id with the same text and timestamp is the same prompt; a new id is assigned otherwise.
+    summary = crud.import_prompts(db_session, [_import_record(1, id=99), _import_record(2, id=10)], dedupe="content")
+
+    assert summary.prompts == 1 and summary.skipped == 1
+    assert sorted(p.base_prompt for p in crud.get_prompts(db=db_session)) == ["Imported 1", "Imported 2"]
+    assert crud.get_prompt(db=db_session, prompt_id=99) is None
+    assert len(crud.search_history(db=db_session, query="imported")[0]) == 2
+    with pytest.raises(ValueError):
+        crud.import_prompts(db_session, [], dedupe="fuzzy")
+
+def test_import_prompts_stores_aware_timestamps_as_naive_utc(db_session: Session):
+    crud.import_prompts(db_session, [_import_record(1)], dedupe="content")
+    # The same instant written with an offset, as another exporter might, is still a duplicate.
+    again = crud.import_prompts(db_session, [
+        _import_record(1, timestamp="2024-01-01T00:00:00+00:00"),
+        _import_record(1, timestamp="2024-01-01T02:00:00+02:00"),
+        _import_record(2, timestamp="2024-01-01T02:00:00+02:00"),
+    ], dedupe="content")
+
+    assert (again.prompts, again.skipped) == (1, 2)
+    stored = {p.base_prompt: p.timestamp for p in crud.get_prompts(db=db_session)}
+    assert stored["Imported 2"] == datetime(2024, 1, 1)
@@ -0,0 +1,24 @@
+import pytest
+from sqlalchemy import text
+
+from backend import database
+
+
+def test_sqlite_pragmas_applies_overrides_to_the_profile():
+    pragmas = database.sqlite_pragmas("wal", "busy_timeout=100, mmap_size=0")
+    assert pragmas["journal_mode"] == "WAL"
+    assert pragmas["busy_timeout"] == "100"
+    assert pragmas["mmap_size"] == "0"
+    assert database.sqlite_pragmas("legacy", "") == {}
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError, match="Unknown database profile"):
+        database.sqlite_pragmas("turbo", "")
+
+def test_engine_sets_profile_pragmas_on_connect(tmp_path):
+    engine = database.make_engine(f"sqlite:///{tmp_path / 'profile.db'}", profile="wal_durable", echo=False)
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 2  # FULL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    engine.dispose()
@@ -1,5 +1,6 @@
+import asyncio
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from backend.api_handlers import gemini_handler
 from backend.config import GOOGLE_API_KEY # To check if it's mocked
 
@@ -14,6 +15,8 @@ def patch_gemini_client_and_configure():
 
         # Mock genai.GenerativeModel to return our mock_model_instance
         with patch.object(gemini_handler.genai, 'GenerativeModel', return_value=mock_model_instance) as mock_generative_model_class:
+            # Models are cached across calls; start each test from an empty registry.
+            gemini_handler.clear_model_cache()
             yield {
                 "mock_configure": mock_configure,
                 "mock_generative_model_class": mock_generative_model_class,
@@ -142,3 +145,49 @@ def test_get_llm_response_empty_response_text(patch_gemini_client_and_configure)
     mock_model_instance.generate_content.return_value = mock_api_response
     response_empty = gemini_handler.get_llm_response("Test", "gemini-1.5-flash-latest")
     assert response_empty == ""
+
+# --- Async variant ---
+def test_get_llm_response_async_success(patch_gemini_client_and_configure):
+    mock_model_instance = patch_gemini_client_and_configure["mock_model_instance"]
+    mock_part = MagicMock()
+    mock_part.text = "Async Gemini response"
+    mock_api_response = MagicMock()
+    mock_api_response.parts = [mock_part]
+    mock_model_instance.generate_content_async = AsyncMock(return_value=mock_api_response)
+
+    with patch.object(gemini_handler, 'GOOGLE_API_KEY', 'test_google_key'):
+        response = asyncio.run(gemini_handler.get_llm_response_async("Test prompt", "gemini-1.5-pro-latest"))
+
+    mock_model_instance.generate_content_async.assert_awaited_once_with("Test prompt")
+    assert response == "Async Gemini response"
+
+def test_get_llm_response_async_rate_limit(patch_gemini_client_and_configure):
+    mock_model_instance = patch_gemini_client_and_configure["mock_model_instance"]
+    mock_model_instance.generate_content_async = AsyncMock(side_effect=Exception("ResourceExhausted: quota"))
+
+    with patch.object(gemini_handler, 'GOOGLE_API_KEY', 'test_google_key'):
+        response = asyncio.run(gemini_handler.get_llm_response_async("Test prompt", "gemini-1.5-pro-latest"))
+
+    assert "Error: Google Gemini API rate limit exceeded." in response
+
+# --- Model registry ---
+def test_model_is_built_once_and_reused(patch_gemini_client_and_configure):
+    mock_model_class = patch_gemini_client_and_configure["mock_generative_model_class"]
+    first = gemini_handler.get_model("gemini-1.5-pro-latest")
+    second = gemini_handler.get_model("gemini-1.5-pro-latest")
+    assert first is second
+    mock_model_class.assert_called_once_with("gemini-1.5-pro-latest")
+
+def test_model_registry_keys_on_config(patch_gemini_client_and_configure):
+    mock_model_class = patch_gemini_client_and_configure["mock_generative_model_class"]
+    gemini_handler.get_model("gemini-1.5-pro-latest")
+    gemini_handler.get_model("gemini-1.5-pro-latest", generation_config={"temperature": 0.2})
+    gemini_handler.get_model("gemini-1.5-pro-latest", generation_config={"temperature": 0.2})
+    assert mock_model_class.call_count == 2
+
+def test_warm_models_prebuilds_each_model(patch_gemini_client_and_configure):
+    mock_model_class = patch_gemini_client_and_configure["mock_generative_model_class"]
+    with patch.object(gemini_handler, 'GOOGLE_API_KEY', 'test_google_key'):
+        assert gemini_handler.warm_models(["gemini-1.5-pro-latest", "gemini-1.5-flash-latest"], system="Be brief.") == 2
+        gemini_handler.get_llm_response("Test prompt", "gemini-1.5-flash-latest", system="Be brief.")
+    assert mock_model_class.call_count == 2
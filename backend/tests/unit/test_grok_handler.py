@@ -1,5 +1,6 @@
+import asyncio
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from backend.api_handlers import grok_handler # Uses openai library
 from backend.config import XAI_API_KEY # To check if it's mocked
 
@@ -87,3 +88,60 @@ def test_get_llm_response_no_choices(patch_grok_client):
     model_name = "grok-3-mini"
     response = grok_handler.get_llm_response(prompt, model_name)
     assert "Error: xAI Grok API returned no response or empty content." in response
+
+# --- Async variant ---
+def test_get_llm_response_async_success():
+    mock_async_client = MagicMock()
+    mock_async_client.chat.completions.create = AsyncMock()
+    mock_completion = MagicMock()
+    mock_completion.choices = [MagicMock()]
+    mock_completion.choices[0].message.content = "Async Grok response"
+    mock_async_client.chat.completions.create.return_value = mock_completion
+
+    with patch.object(grok_handler, 'async_client', mock_async_client):
+        response = asyncio.run(grok_handler.get_llm_response_async("Test prompt", "grok-3"))
+
+    mock_async_client.chat.completions.create.assert_awaited_once_with(
+        model="grok-3",
+        messages=[{"role": "user", "content": "Test prompt"}]
+    )
+    assert response == "Async Grok response"
+
+def test_get_llm_response_async_empty_prompt():
+    with patch.object(grok_handler, 'async_client', MagicMock()):
+        response = asyncio.run(grok_handler.get_llm_response_async("", "grok-3"))
+    assert "Error: Prompt cannot be empty." in response
+
+# --- Streaming ---
+class _AsyncChunkStream:
+    def __init__(self, contents):
+        self._chunks = []
+        for content in contents:
+            chunk = MagicMock()
+            chunk.choices = [MagicMock()]
+            chunk.choices[0].delta.content = content
+            self._chunks.append(chunk)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self._chunks:
+            yield chunk
+
+async def _drain(stream):
+    return [chunk async for chunk in stream]
+
+def test_stream_request_matches_the_sdk_signature():
+    # The fake clients accept any keyword; check what the handler sends against the pinned SDK.
+    import inspect
+    mock_async_client = MagicMock()
+    mock_async_client.chat.completions.create = AsyncMock()
+    mock_async_client.chat.completions.create.return_value = _AsyncChunkStream(["ok"])
+
+    with patch.object(grok_handler, 'async_client', mock_async_client):
+        chunks = asyncio.run(_drain(grok_handler.stream_llm_response("Task", "grok-3", system="Be brief.")))
+
+    assert chunks == ["ok"]
+    create = grok_handler.openai.resources.chat.AsyncCompletions.create
+    inspect.signature(create).bind(None, **mock_async_client.chat.completions.create.await_args.kwargs)
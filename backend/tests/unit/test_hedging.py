@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+
+from backend.hedging import HEDGE, PRIMARY, Hedger, LatencyTracker
+
+
+def _leg(delay, output):
+    async def _call():
+        await asyncio.sleep(delay)
+        return output
+    return _call
+
+
+def test_percentile_nearest_rank():
+    tracker = LatencyTracker(window=100)
+    for value in range(1, 101):
+        tracker.record("m", value / 100)
+    assert tracker.percentile("m", 0.95) == 0.95
+    assert tracker.percentile("m", 0.5) == 0.5
+    assert tracker.percentile("other", 0.95) is None
+
+
+def test_window_drops_old_samples():
+    tracker = LatencyTracker(window=3)
+    for value in (10.0, 1.0, 1.0, 1.0):
+        tracker.record("m", value)
+    assert tracker.sample_count("m") == 3
+    assert tracker.percentile("m", 1.0) == 1.0
+
+
+def test_delay_uses_default_until_enough_samples():
+    tracker = LatencyTracker()
+    hedger = Hedger(tracker, percentile=0.9, min_samples=5, default_delay=3.0, min_delay=0.1)
+    assert hedger.delay_for("m") == 3.0
+    for _ in range(5):
+        tracker.record("m", 0.2)
+    assert hedger.delay_for("m") == 0.2
+
+
+def test_fast_primary_never_fires_hedge():
+    hedger = Hedger(LatencyTracker(), min_samples=0, default_delay=0.2, min_delay=0.2)
+    backup_calls = []
+
+    async def backup():
+        backup_calls.append(1)
+        return "backup"
+
+    output, leg = asyncio.run(hedger.run("m", _leg(0.0, "primary"), backup))
+    assert (output, leg) == ("primary", PRIMARY)
+    assert backup_calls == []
+    assert hedger.stats()["hedges_fired"] == 0
+
+
+def test_slow_primary_loses_to_hedge_and_is_cancelled():
+    hedger = Hedger(LatencyTracker(), min_samples=1, default_delay=0.05, min_delay=0.05)
+    cancelled = []
+
+    async def slow_primary():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return "primary"
+
+    async def run():
+        result = await hedger.run("m", slow_primary, _leg(0.0, "backup"))
+        await asyncio.sleep(0)  # let the cancellation land
+        return result
+
+    output, leg = asyncio.run(run())
+    assert (output, leg) == ("backup", HEDGE)
+    assert cancelled == [True]
+    assert hedger.stats() == {"calls": 1, "hedges_fired": 1, "hedge_wins": 1}
+
+
+def test_failed_hedge_falls_back_to_primary():
+    hedger = Hedger(LatencyTracker(), min_samples=1, default_delay=0.05, min_delay=0.05)
+    output, leg = asyncio.run(hedger.run("m", _leg(0.2, "primary"), _leg(0.0, "Error: backup down")))
+    assert (output, leg) == ("primary", PRIMARY)
+    assert hedger.stats()["hedge_wins"] == 0
+
+
+@pytest.mark.parametrize("primary_output", ["Error: a", "Error: b"])
+def test_both_legs_failing_returns_an_error(primary_output):
+    hedger = Hedger(LatencyTracker(), min_samples=1, default_delay=0.01, min_delay=0.01)
+    output, _leg_name = asyncio.run(hedger.run("m", _leg(0.05, primary_output), _leg(0.0, "Error: backup")))
+    assert output.startswith("Error:")
@@ -0,0 +1,136 @@
+import sqlite3
+
+import pytest
+from sqlmodel import SQLModel, create_engine
+
+from backend import compression, migrations
+
+# prompts.db as created before hedge columns and history indexes existed.
+LEGACY_SCHEMA = """
+CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR NOT NULL);
+CREATE TABLE prompt (id INTEGER PRIMARY KEY, user_id INTEGER, base_prompt VARCHAR NOT NULL, timestamp DATETIME NOT NULL);
+CREATE TABLE questionnaireresponse (id INTEGER PRIMARY KEY, prompt_id INTEGER NOT NULL, question VARCHAR NOT NULL, answer VARCHAR NOT NULL);
+CREATE TABLE modeloutput (id INTEGER PRIMARY KEY, prompt_id INTEGER NOT NULL, model_name VARCHAR NOT NULL, output VARCHAR NOT NULL, timestamp DATETIME NOT NULL);
+INSERT INTO prompt VALUES (1, NULL, 'kept', '2024-01-01 00:00:00');
+INSERT INTO modeloutput VALUES (1, 1, 'GPT-4.1', 'old output', '2024-01-01 00:00:00');
+"""
+
+def _index_names(path):
+    with sqlite3.connect(path) as conn:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'ix_%'")}
+
+def test_migrate_upgrades_legacy_database_in_place(tmp_path):
+    path = tmp_path / "legacy.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+    engine = create_engine(f"sqlite:///{path}")
+
+    assert migrations.migrate(engine) == [m.version for m in migrations.MIGRATIONS]
+    assert migrations.migrate(engine) == []  # already current
+
+    with sqlite3.connect(path) as conn:
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(modeloutput)")]
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == migrations.LATEST_VERSION
+        assert conn.execute("SELECT output, served_by FROM modeloutput").fetchall() == [("old output", None)]
+    assert {"served_by", "hedge_leg", "output_hash"} <= set(columns)
+    assert {
+        "ix_questionnaireresponse_prompt_id", "ix_modeloutput_prompt_id", "ix_prompt_user_id", "ix_prompt_timestamp_id",
+        "ix_prompt_base_prompt_hash", "ix_modeloutput_output_hash",
+    } <= _index_names(path)
+
+def test_migrate_stops_at_target(tmp_path):
+    path = tmp_path / "legacy.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+    engine = create_engine(f"sqlite:///{path}")
+
+    assert migrations.migrate(engine, target=1) == [1]
+    assert "ix_modeloutput_prompt_id" not in _index_names(path)
+    assert migrations.migrate(engine)[0] == 2
+
+def test_migrate_is_a_no_op_on_a_fresh_schema(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    SQLModel.metadata.create_all(engine)
+    before = _index_names(tmp_path / "fresh.db")
+
+    assert migrations.migrate(engine) == [m.version for m in migrations.MIGRATIONS]
+    assert _index_names(tmp_path / "fresh.db") == before
+
+def test_history_search_index_backfills_and_tracks_writes(tmp_path):
+    path = tmp_path / "legacy.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+    migrations.migrate(create_engine(f"sqlite:///{path}"))
+
+    def matches(term):
+        return conn.execute(
+            "SELECT kind, prompt_id FROM history_fts WHERE history_fts MATCH ? ORDER BY rowid", (term,)
+        ).fetchall()
+
+    with sqlite3.connect(path) as conn:
+        compression.register_sqlite_functions(conn)  # the output triggers read through history_text()
+        assert matches("kept") == [("prompt", 1)]  # rows from before the migration
+        conn.execute("INSERT INTO questionnaireresponse (prompt_id, question, answer) VALUES (1, 'Tone?', 'friendly')")
+        assert matches("friendly") == [("questionnaire_response", 1)]
+        conn.execute("UPDATE modeloutput SET output = 'new output' WHERE id = 1")
+        assert matches("old") == []
+        assert matches("new") == [("model_output", 1)]
+        conn.execute("DELETE FROM prompt WHERE id = 1")
+        assert matches("kept") == []
+
+def test_output_search_triggers_read_compressed_values(tmp_path):
+    path = tmp_path / "legacy.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+    migrations.migrate(create_engine(f"sqlite:///{path}"))
+
+    with sqlite3.connect(path) as conn:
+        compression.register_sqlite_functions(conn)
+        stored = compression.compress_text("a long and very repetitive answer " * 20, min_bytes=0)
+        conn.execute("INSERT INTO modeloutput (prompt_id, model_name, output, timestamp) VALUES (1, 'M', ?, '2024-01-01')", (stored,))
+        assert conn.execute("SELECT kind FROM history_fts WHERE history_fts MATCH 'repetitive'").fetchall() == [("model_output",)]
+
+def test_search_triggers_read_text_blobs(tmp_path):
+    path = tmp_path / "legacy.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+    migrations.migrate(create_engine(f"sqlite:///{path}"))
+
+    with sqlite3.connect(path) as conn:
+        compression.register_sqlite_functions(conn)
+        conn.execute("INSERT INTO textblob (hash, body) VALUES ('h1', 'shared prompt text')")
+        conn.execute("INSERT INTO prompt (id, base_prompt, base_prompt_hash, timestamp) VALUES (2, '', 'h1', '2024-01-02')")
+        assert conn.execute(
+            "SELECT prompt_id FROM history_fts WHERE history_fts MATCH 'shared'"
+        ).fetchall() == [(2,)]
+
+def test_trigger_writes_need_history_text_on_the_connection(tmp_path):
+    path = tmp_path / "legacy.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+    migrations.migrate(create_engine(f"sqlite:///{path}"))
+
+    insert = "INSERT INTO modeloutput (prompt_id, model_name, output, timestamp) VALUES (1, 'M', 'plain', '2024-01-01')"
+    with sqlite3.connect(path) as conn:
+        with pytest.raises(sqlite3.OperationalError, match="no such function: history_text"):
+            conn.execute(insert)
+        conn.execute("DELETE FROM modeloutput WHERE id = 1")  # deletes don't decompress anything
+        compression.register_sqlite_functions(conn)
+        conn.execute(insert)
+
+def test_prompt_ids_are_not_reused_after_migration(tmp_path):
+    path = tmp_path / "legacy.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+        conn.execute("INSERT INTO prompt VALUES (2, NULL, 'newest', '2024-01-02 00:00:00')")
+    migrations.migrate(create_engine(f"sqlite:///{path}"))
+
+    with sqlite3.connect(path) as conn:
+        compression.register_sqlite_functions(conn)
+        conn.execute("DELETE FROM prompt WHERE id = 2")
+        new_id = conn.execute("INSERT INTO prompt (base_prompt, timestamp) VALUES ('fresh', '2024-01-03')").lastrowid
+        assert new_id == 3
+        assert conn.execute("SELECT base_prompt FROM prompt ORDER BY id").fetchall() == [("kept",), ("fresh",)]
+        assert conn.execute("SELECT prompt_id FROM history_fts WHERE history_fts MATCH 'fresh'").fetchall() == [(3,)]
+    assert {"ix_prompt_user_id", "ix_prompt_timestamp_id", "ix_prompt_base_prompt_hash"} <= _index_names(path)
+
@@ -0,0 +1,271 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import patch, AsyncMock
+
+from backend import model_dispatcher
+from backend.prompt_optimizer import optimize_prompt
+from backend.response_cache import ResponseCache
+
+
+@pytest.fixture(autouse=True)
+def fresh_rate_limiter():
+    # asyncio primitives bind to the loop that first waits on them; each test runs its own loop.
+    # Built from the dispatcher's own rate_limiter module so its RateLimitExceeded is the one it catches.
+    limiter = type(model_dispatcher.rate_limiter)()
+    with patch.object(model_dispatcher, "rate_limiter", limiter):
+        yield limiter
+
+
+@pytest.fixture(autouse=True)
+def memory_only_cache():
+    # Keep dispatcher tests off the real prompts.db and independent of each other.
+    cache = ResponseCache(engine=None)
+    with patch.object(model_dispatcher, "response_cache", cache):
+        yield cache
+
+
+def _handler_for(model_name):
+    return model_dispatcher.MODEL_MAP[model_name][1]
+
+
+def _slow_response(delay, text):
+    async def _respond(prompt, model_name):
+        await asyncio.sleep(delay)
+        return f"{text} ({model_name})"
+    return _respond
+
+
+async def _collect(prompts):
+    return [result async for result in model_dispatcher.dispatch(prompts)]
+
+
+def test_resolve_model_unknown():
+    with pytest.raises(model_dispatcher.UnsupportedModelError) as exc_info:
+        model_dispatcher.resolve_model("NonExistentModel-123")
+    assert "Model 'NonExistentModel-123' is not supported" in str(exc_info.value)
+
+
+def test_call_model_uses_sdk_model_name():
+    with patch.object(_handler_for("GPT-4.1"), "get_llm_response_async", new=AsyncMock(return_value="ok")) as mock_call:
+        result = asyncio.run(model_dispatcher.call_model("GPT-4.1", "Hello"))
+
+    mock_call.assert_awaited_once_with("Hello", "gpt-4o")
+    assert result.output == "ok"
+    assert result.sdk_model == "gpt-4o"
+    assert not result.is_error
+
+
+def test_dispatch_runs_models_concurrently():
+    delay = 0.3
+    with patch.object(_handler_for("GPT-4.1"), "get_llm_response_async", new=_slow_response(delay, "openai")), \
+         patch.object(_handler_for("Claude Opus 4"), "get_llm_response_async", new=_slow_response(delay, "claude")), \
+         patch.object(_handler_for("Grok-3"), "get_llm_response_async", new=_slow_response(delay, "grok")), \
+         patch.object(_handler_for("Gemini 2.5 Pro"), "get_llm_response_async", new=_slow_response(delay, "gemini")):
+        started = time.perf_counter()
+        results = asyncio.run(_collect({
+            "GPT-4.1": "p",
+            "Claude Opus 4": "p",
+            "Grok-3": "p",
+            "Gemini 2.5 Pro": "p",
+        }))
+        elapsed = time.perf_counter() - started
+
+    assert {r.model_name for r in results} == {"GPT-4.1", "Claude Opus 4", "Grok-3", "Gemini 2.5 Pro"}
+    # Four sequential calls would take 4 * delay; concurrent dispatch is bounded by the slowest.
+    assert elapsed < delay * 2
+
+
+def test_dispatch_yields_in_completion_order():
+    with patch.object(_handler_for("GPT-4.1"), "get_llm_response_async", new=_slow_response(0.3, "slow")), \
+         patch.object(_handler_for("Claude Sonnet 4"), "get_llm_response_async", new=_slow_response(0.0, "fast")):
+        results = asyncio.run(_collect({"GPT-4.1": "p", "Claude Sonnet 4": "p"}))
+
+    assert [r.model_name for r in results] == ["Claude Sonnet 4", "GPT-4.1"]
+
+
+def test_dispatch_reports_handler_errors():
+    with patch.object(_handler_for("Claude Opus 4"), "get_llm_response_async", new=AsyncMock(return_value="Error: simulated")):
+        results = asyncio.run(_collect({"Claude Opus 4": "p"}))
+
+    assert results[0].is_error
+    assert results[0].output == "Error: simulated"
+
+
+def test_dispatch_rejects_unknown_model_before_sending():
+    with patch.object(_handler_for("GPT-4.1"), "get_llm_response_async", new=AsyncMock()) as mock_call:
+        with pytest.raises(model_dispatcher.UnsupportedModelError):
+            asyncio.run(_collect({"GPT-4.1": "p", "Unknown": "p"}))
+    mock_call.assert_not_awaited()
+
+
+def _chunked_stream(chunks, delay=0.0):
+    async def _stream(prompt, model_name):
+        for chunk in chunks:
+            await asyncio.sleep(delay)
+            yield chunk
+    return _stream
+
+
+async def _collect_stream(prompts):
+    return [event async for event in model_dispatcher.stream_dispatch(prompts)]
+
+
+def test_stream_dispatch_interleaves_chunks_and_finishes_each_model():
+    with patch.object(_handler_for("GPT-4.1"), "stream_llm_response", new=_chunked_stream(["Hel", "lo "], 0.01)), \
+         patch.object(_handler_for("Claude Opus 4"), "stream_llm_response", new=_chunked_stream(["Error: Claude down"])):
+        events = asyncio.run(_collect_stream({"GPT-4.1": "p", "Claude Opus 4": "p"}))
+
+    gpt_chunks = [e.text for e in events if e.model_name == "GPT-4.1" and e.kind == "chunk"]
+    assert gpt_chunks == ["Hel", "lo "]
+    finals = {e.model_name: e for e in events if e.kind != "chunk"}
+    assert finals["GPT-4.1"].kind == "done"
+    assert finals["GPT-4.1"].text == "Hello"
+    assert finals["Claude Opus 4"].kind == "error"
+    assert finals["Claude Opus 4"].text == "Error: Claude down"
+
+
+def test_stream_dispatch_empty_stream_is_error():
+    with patch.object(_handler_for("Grok-3"), "stream_llm_response", new=_chunked_stream([])):
+        events = asyncio.run(_collect_stream({"Grok-3": "p"}))
+
+    assert [e.kind for e in events] == ["error"]
+
+
+def test_call_model_serves_repeat_from_cache():
+    mock_call = AsyncMock(return_value="fresh")
+    with patch.object(_handler_for("GPT-4.1"), "get_llm_response_async", new=mock_call):
+        first = asyncio.run(model_dispatcher.call_model("GPT-4.1", "Same prompt"))
+        second = asyncio.run(model_dispatcher.call_model("GPT-4.1", "Same prompt"))
+
+    assert mock_call.await_count == 1
+    assert not first.cached
+    assert second.cached
+    assert second.output == "fresh"
+
+
+def test_cache_key_covers_only_what_the_provider_receives():
+    key = model_dispatcher.cache_key_for("GPT-4.1", "Prompt")
+    # MODEL_MAP's max_tokens never reaches the handlers, so it must not split the cache.
+    with patch.dict(model_dispatcher.MODEL_MAP, {"GPT-4.1": ("gpt-4o", _handler_for("GPT-4.1"), 1024)}):
+        assert model_dispatcher.cache_key_for("GPT-4.1", "Prompt") == key
+    assert model_dispatcher.cache_key_for("GPT-4.1 Mini", "Prompt") != key
+    assert model_dispatcher.cache_key_for("GPT-4.1", "Other prompt") != key
+
+
+def test_call_model_bypass_cache_always_calls_provider():
+    mock_call = AsyncMock(return_value="fresh")
+    with patch.object(_handler_for("GPT-4.1"), "get_llm_response_async", new=mock_call):
+        asyncio.run(model_dispatcher.call_model("GPT-4.1", "Same prompt"))
+        result = asyncio.run(model_dispatcher.call_model("GPT-4.1", "Same prompt", use_cache=False))
+
+    assert mock_call.await_count == 2
+    assert not result.cached
+
+
+def test_call_model_does_not_cache_errors():
+    mock_call = AsyncMock(return_value="Error: simulated")
+    with patch.object(_handler_for("Claude Opus 4"), "get_llm_response_async", new=mock_call):
+        asyncio.run(model_dispatcher.call_model("Claude Opus 4", "p"))
+        asyncio.run(model_dispatcher.call_model("Claude Opus 4", "p"))
+
+    assert mock_call.await_count == 2
+
+
+def test_call_model_queue_rejection_becomes_error_string(fresh_rate_limiter):
+    fresh_rate_limiter.max_queue = 0
+    mock_call = AsyncMock(return_value="never")
+    with patch.object(_handler_for("GPT-4.1"), "get_llm_response_async", new=mock_call):
+        result = asyncio.run(model_dispatcher.call_model("GPT-4.1", "p"))
+
+    assert result.is_error
+    assert "request queue is full" in result.output
+    mock_call.assert_not_awaited()
+
+
+def test_provider_name():
+    assert model_dispatcher.provider_name(_handler_for("GPT-4.1")) == "openai"
+    assert model_dispatcher.provider_name(_handler_for("Claude Opus 4")) == "claude"
+
+
+def test_hedged_call_records_fallback_winner():
+    from backend.hedging import Hedger, LatencyTracker
+    hedger = Hedger(LatencyTracker(), min_samples=1, default_delay=0.05, min_delay=0.05)
+    opus = _slow_response(2.0, "opus")
+    sonnet = _slow_response(0.0, "sonnet")
+
+    async def by_model(prompt, model_name):
+        # Opus and Sonnet share the Claude handler; route on the SDK model name.
+        handler = opus if "opus" in model_name else sonnet
+        return await handler(prompt, model_name)
+
+    with patch.object(model_dispatcher, "hedger", hedger), \
+         patch.object(_handler_for("Claude Opus 4"), "get_llm_response_async", new=by_model):
+        result = asyncio.run(model_dispatcher.call_model("Claude Opus 4", "p", hedge=True))
+
+    assert result.hedge_leg == "hedge"
+    assert result.served_by == "Claude Sonnet 4"
+    assert "sonnet" in result.output
+
+
+def test_unhedged_call_has_no_leg():
+    with patch.object(_handler_for("GPT-4.1"), "get_llm_response_async", new=AsyncMock(return_value="ok")):
+        result = asyncio.run(model_dispatcher.call_model("GPT-4.1", "p", hedge=False))
+
+    assert result.hedge_leg is None
+    assert result.served_by == "GPT-4.1"
+
+
+def test_identical_concurrent_calls_share_one_upstream_call():
+    calls = []
+
+    async def slow(prompt, model_name):
+        calls.append(prompt)
+        await asyncio.sleep(0.05)
+        return "shared answer"
+
+    async def burst():
+        return await asyncio.gather(*(model_dispatcher.call_model("GPT-4.1", "Same prompt") for _ in range(5)))
+
+    with patch.object(_handler_for("GPT-4.1"), "get_llm_response_async", new=slow):
+        results = asyncio.run(burst())
+
+    assert len(calls) == 1
+    assert {r.output for r in results} == {"shared answer"}
+    assert sum(r.coalesced for r in results) == 4
+
+
+def test_different_prompts_are_not_coalesced():
+    mock_call = AsyncMock(return_value="ok")
+
+    async def burst():
+        return await asyncio.gather(
+            model_dispatcher.call_model("GPT-4.1", "one"), model_dispatcher.call_model("GPT-4.1", "two")
+        )
+
+    with patch.object(_handler_for("GPT-4.1"), "get_llm_response_async", new=mock_call):
+        results = asyncio.run(burst())
+
+    assert mock_call.await_count == 2
+    assert not any(r.coalesced for r in results)
+
+
+def test_standard_instructions_are_passed_as_system_block():
+    mock_call = AsyncMock(return_value="ok")
+    prompt_text = "Explain recursion\nAct as an expert in the relevant domain."
+    with patch.object(_handler_for("GPT-4.1"), "get_llm_response_async", new=mock_call):
+        asyncio.run(model_dispatcher.call_model("GPT-4.1", prompt_text))
+
+    mock_call.assert_awaited_once_with("Explain recursion", "gpt-4o", system="Act as an expert in the relevant domain.")
+
+
+def test_warmup_uses_the_system_block_of_a_plain_prompt():
+    handler = _handler_for("Gemini 2.5 Pro")
+    warmed = {}
+    mock_call = AsyncMock(return_value="ok")
+    with patch.object(handler, "warm_models", new=lambda names, system=None: warmed.update(dict.fromkeys(names, system)), create=True), \
+            patch.object(handler, "get_llm_response_async", new=mock_call):
+        model_dispatcher.warm_models()
+        asyncio.run(model_dispatcher.call_model("Gemini 2.5 Pro", optimize_prompt("Explain recursion", [], "Gemini 2.5 Pro")))
+
+    assert mock_call.await_args.kwargs["system"] == warmed["gemini-1.5-pro-latest"]
@@ -1,5 +1,5 @@
 import pytest
-from backend.prompt_optimizer import optimize_prompt
+from backend.prompt_optimizer import optimize_prompt, split_instructions, standard_instructions
 from backend.schemas import QuestionnaireResponseRead # Assuming this is the schema used
 
 # Helper to create mock QuestionnaireResponseRead objects for tests
@@ -114,3 +114,28 @@ def test_optimize_prompt_target_model_placeholder():
     optimized_specific = optimize_prompt(base_prompt, answers, "some_specific_model")
     # Expect them to be the same as no specific logic for 'some_specific_model' exists.
     assert optimized_generic == optimized_specific
+
+def test_split_instructions_separates_standard_boilerplate():
+    answers = [create_qr_read("Target audience?", "Developers")]
+    prompt_text = optimize_prompt("Explain Python decorators", answers, "Claude Opus 4")
+    instructions, task = split_instructions(prompt_text)
+
+    assert task == "Explain Python decorators\nThe target audience is: Developers."
+    assert instructions.startswith("Act as an expert in the relevant domain.")
+    assert instructions.endswith("Be thorough and analytical in your response.")
+    assert f"{task}\n{instructions}" == prompt_text
+
+def test_split_instructions_is_identical_across_prompts():
+    first, _ = split_instructions(optimize_prompt("Summarise this article", [], "GPT-4.1"))
+    second, _ = split_instructions(optimize_prompt("Write a haiku about rain", [], "GPT-4.1"))
+    assert first == second
+
+def test_split_instructions_without_boilerplate():
+    assert split_instructions("Just a question") == ("", "Just a question")
+
+
+def test_standard_instructions_match_a_plain_prompt():
+    for model in ("Gemini 2.5 Pro", "GPT-4.1", "Claude Opus 4"):
+        instructions, task = split_instructions(optimize_prompt("Explain recursion", [], model))
+        assert task == "Explain recursion"
+        assert standard_instructions(model) == instructions
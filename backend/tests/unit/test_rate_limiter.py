@@ -0,0 +1,101 @@
+import asyncio
+import time
+import pytest
+
+from backend.rate_limiter import RateLimiter, RateLimitExceeded, TokenBucket, estimate_tokens
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("a" * 400) == 100
+
+
+def test_token_bucket_waits_for_refill():
+    async def scenario():
+        bucket = TokenBucket(rate_per_minute=600)  # 10 tokens/second
+        await bucket.take(600)  # drain it
+        started = time.perf_counter()
+        await bucket.take(2)
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(scenario())
+    assert 0.15 <= elapsed < 0.5
+
+
+def test_max_in_flight_per_provider():
+    limiter = RateLimiter(provider_limits={"openai": {"max_in_flight": 2}}, model_max_in_flight=10)
+    peak = 0
+    current = 0
+
+    async def call(model):
+        nonlocal peak, current
+        async with limiter.limit("openai", model):
+            current += 1
+            peak = max(peak, current)
+            await asyncio.sleep(0.05)
+            current -= 1
+
+    async def scenario():
+        await asyncio.gather(*(call(f"model-{i % 3}") for i in range(6)))
+
+    asyncio.run(scenario())
+    assert peak == 2
+    assert limiter.stats()["openai"]["admitted"] == 6
+    assert limiter.stats()["openai"]["in_flight"] == 0
+
+
+def test_max_in_flight_per_model():
+    limiter = RateLimiter(provider_limits={"claude": {"max_in_flight": 10}}, model_max_in_flight=1)
+    active = {"opus": 0, "sonnet": 0}
+    peaks = {"opus": 0, "sonnet": 0}
+
+    async def call(model):
+        async with limiter.limit("claude", model):
+            active[model] += 1
+            peaks[model] = max(peaks[model], active[model])
+            await asyncio.sleep(0.02)
+            active[model] -= 1
+
+    async def scenario():
+        await asyncio.gather(*(call(m) for m in ["opus", "opus", "sonnet", "sonnet"]))
+
+    asyncio.run(scenario())
+    assert peaks == {"opus": 1, "sonnet": 1}
+
+
+def test_queue_full_is_rejected():
+    limiter = RateLimiter(provider_limits={"grok": {"max_in_flight": 1}}, max_queue=1)
+
+    async def hold():
+        async with limiter.limit("grok", "grok-3"):
+            await asyncio.sleep(0.1)
+
+    async def scenario():
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(hold())  # occupies the only queue slot
+        await asyncio.sleep(0.01)
+        with pytest.raises(RateLimitExceeded):
+            async with limiter.limit("grok", "grok-3"):
+                pass
+        await asyncio.gather(holder, waiter)
+
+    asyncio.run(scenario())
+    assert limiter.stats()["grok"]["rejected"] == 1
+    assert limiter.stats()["grok"]["admitted"] == 2
+
+
+def test_queue_timeout_releases_slots():
+    limiter = RateLimiter(provider_limits={"gemini": {"max_in_flight": 1}}, queue_timeout=0.05)
+
+    async def scenario():
+        async with limiter.limit("gemini", "gemini-1.5-pro-latest"):
+            with pytest.raises(RateLimitExceeded):
+                async with limiter.limit("gemini", "gemini-1.5-pro-latest"):
+                    pass
+        # The timed-out waiter must not have leaked a slot.
+        async with limiter.limit("gemini", "gemini-1.5-pro-latest"):
+            pass
+
+    asyncio.run(scenario())
+    assert limiter.stats()["gemini"]["timed_out"] == 1
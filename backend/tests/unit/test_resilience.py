@@ -0,0 +1,175 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock, patch
+
+from backend.api_handlers import resilience
+
+
+class TransientError(Exception):
+    pass
+
+
+def _is_transient(e):
+    return isinstance(e, TransientError)
+
+
+def _flaky(failures, result="ok"):
+    calls = {"count": 0}
+
+    def _call():
+        calls["count"] += 1
+        if calls["count"] <= failures:
+            raise TransientError("temporarily unavailable")
+        return result
+    return _call, calls
+
+
+def test_call_sync_retries_transient_errors():
+    make_call, calls = _flaky(2)
+    with patch.object(resilience, "RETRY_MAX_ATTEMPTS", 3):
+        assert resilience.call_sync("test", make_call, _is_transient) == "ok"
+    assert calls["count"] == 3
+    assert resilience.get_breaker("test").state == resilience.CLOSED
+
+
+def test_call_sync_gives_up_after_max_attempts():
+    make_call, calls = _flaky(10)
+    with patch.object(resilience, "RETRY_MAX_ATTEMPTS", 3):
+        with pytest.raises(TransientError):
+            resilience.call_sync("test", make_call, _is_transient)
+    assert calls["count"] == 3
+
+
+def test_call_sync_does_not_retry_permanent_errors():
+    calls = {"count": 0}
+
+    def make_call():
+        calls["count"] += 1
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        resilience.call_sync("test", make_call, _is_transient)
+    assert calls["count"] == 1
+    assert resilience.get_breaker("test").consecutive_failures == 0
+
+
+def test_call_async_retries_transient_errors():
+    attempts = {"count": 0}
+
+    async def make_call():
+        attempts["count"] += 1
+        if attempts["count"] == 1:
+            raise TransientError("blip")
+        return "ok"
+
+    with patch.object(resilience, "RETRY_MAX_ATTEMPTS", 3):
+        assert asyncio.run(resilience.call_async("test", make_call, _is_transient)) == "ok"
+    assert attempts["count"] == 2
+
+
+def test_breaker_opens_and_fails_fast():
+    breaker = resilience.CircuitBreaker("test", failure_threshold=2, recovery_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == resilience.OPEN
+    with pytest.raises(resilience.CircuitOpenError):
+        breaker.before_call()
+
+
+def test_breaker_half_open_probe_closes_on_success():
+    breaker = resilience.CircuitBreaker("test", failure_threshold=1, recovery_timeout=0, half_open_max_calls=1)
+    breaker.record_failure()
+    breaker.before_call()  # recovery timeout elapsed: this call is the probe
+    assert breaker.state == resilience.HALF_OPEN
+    with pytest.raises(resilience.CircuitOpenError):
+        breaker.before_call()  # only one probe at a time
+    breaker.record_success()
+    assert breaker.state == resilience.CLOSED
+
+
+def test_breaker_half_open_probe_reopens_on_failure():
+    breaker = resilience.CircuitBreaker("test", failure_threshold=3, recovery_timeout=0)
+    for _ in range(3):
+        breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == resilience.OPEN
+    assert breaker.times_opened == 2
+
+
+def test_cancelled_probe_frees_its_slot():
+    with patch.object(resilience, "CIRCUIT_FAILURE_THRESHOLD", 1), \
+         patch.object(resilience, "CIRCUIT_RECOVERY_TIMEOUT", 0), \
+         patch.object(resilience, "CIRCUIT_HALF_OPEN_MAX_CALLS", 1):
+        breaker = resilience.get_breaker("cancelled-probe")
+    breaker.record_failure()
+
+    async def hang():
+        await asyncio.sleep(60)
+
+    async def ok():
+        return "ok"
+
+    async def scenario():
+        probe = asyncio.create_task(resilience.call_async("cancelled-probe", hang, _is_transient))
+        await asyncio.sleep(0)  # the probe takes the only half-open slot
+        assert breaker.state == resilience.HALF_OPEN
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        return await resilience.call_async("cancelled-probe", ok, _is_transient)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert breaker.state == resilience.CLOSED
+
+
+def test_open_breaker_skips_the_call():
+    calls = {"count": 0}
+
+    def make_call():
+        calls["count"] += 1
+        raise TransientError("down")
+
+    with patch.object(resilience, "RETRY_MAX_ATTEMPTS", 1), \
+         patch.object(resilience, "CIRCUIT_FAILURE_THRESHOLD", 2):
+        for _ in range(2):
+            with pytest.raises(TransientError):
+                resilience.call_sync("flaky-provider", make_call, _is_transient)
+        with pytest.raises(resilience.CircuitOpenError):
+            resilience.call_sync("flaky-provider", make_call, _is_transient)
+    assert calls["count"] == 2
+    assert resilience.breaker_states()["flaky-provider"]["state"] == resilience.OPEN
+
+
+def test_retry_after_seconds_reads_headers():
+    error = MagicMock()
+    error.response.headers = {"retry-after": "7"}
+    assert resilience.retry_after_seconds(error) == 7.0
+    error.response.headers = {"retry-after-ms": "250"}
+    assert resilience.retry_after_seconds(error) == 0.25
+    assert resilience.retry_after_seconds(Exception("no response")) is None
+
+
+def test_backoff_delay_honours_retry_after_and_cap():
+    with patch.object(resilience, "RETRY_BASE_DELAY", 1.0), patch.object(resilience, "RETRY_MAX_DELAY", 10.0):
+        assert 0 <= resilience.backoff_delay(0) <= 1.0
+        assert resilience.backoff_delay(0, retry_after=5) == 5
+        assert 0 <= resilience.backoff_delay(10) <= 10.0
+        assert resilience.backoff_delay(10, retry_after=60) == 60  # never shortened
+
+
+def test_retry_after_over_the_cap_is_not_retried_early():
+    error = RuntimeError("429")
+    error.response = MagicMock(headers={"retry-after": "60"})
+    calls = {"count": 0}
+
+    def make_call():
+        calls["count"] += 1
+        raise error
+
+    with patch.object(resilience, "RETRY_MAX_DELAY", 10.0), patch.object(resilience.time, "sleep") as sleep:
+        with pytest.raises(RuntimeError):
+            resilience.call_sync("slow-down-provider", make_call, is_transient=lambda e: True)
+
+    assert calls["count"] == 1
+    sleep.assert_not_called()
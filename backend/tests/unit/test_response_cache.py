@@ -0,0 +1,74 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlmodel import SQLModel, Session, create_engine
+
+from backend import models
+from backend.response_cache import ResponseCache, make_key
+
+
+@pytest.fixture
+def cache_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def test_make_key_depends_on_prompt_model_and_params():
+    base = make_key("Prompt", "gpt-4o", {"max_tokens": 8192})
+    assert base == make_key("Prompt", "gpt-4o", {"max_tokens": 8192})
+    assert base != make_key("Prompt ", "gpt-4o", {"max_tokens": 8192})
+    assert base != make_key("Prompt", "gpt-4-turbo", {"max_tokens": 8192})
+    assert base != make_key("Prompt", "gpt-4o", {"max_tokens": 4096})
+
+
+def test_memory_tier_hit_and_lru_eviction():
+    cache = ResponseCache(engine=None, max_entries=2)
+    cache.set("a", "gpt-4o", "A")
+    cache.set("b", "gpt-4o", "B")
+    assert cache.get("a") == "A"  # touch "a" so "b" becomes least recently used
+    cache.set("c", "gpt-4o", "C")
+
+    assert cache.get("a") == "A"
+    assert cache.get("b") is None
+    assert cache.get("c") == "C"
+
+
+def test_memory_tier_ttl_expiry():
+    cache = ResponseCache(engine=None, ttl_seconds=0)
+    cache.set("a", "gpt-4o", "A")
+    assert cache.get("a") is None
+
+
+def test_error_strings_are_never_cached(cache_engine):
+    cache = ResponseCache(engine=cache_engine)
+    cache.set("a", "gpt-4o", "Error: OpenAI API rate limit exceeded.")
+
+    assert cache.get("a") is None
+    with Session(cache_engine) as session:
+        assert session.get(models.CachedResponse, "a") is None
+
+
+def test_persistent_tier_survives_restart(cache_engine):
+    ResponseCache(engine=cache_engine).set("a", "gpt-4o", "Persisted")
+
+    # A fresh instance has an empty memory tier, so this read comes from SQLite.
+    assert ResponseCache(engine=cache_engine).get("a") == "Persisted"
+
+
+def test_persistent_tier_expired_rows_are_dropped(cache_engine):
+    with Session(cache_engine) as session:
+        session.add(models.CachedResponse(
+            key="old", sdk_model="gpt-4o", output="Stale",
+            created_at=datetime.utcnow() - timedelta(hours=2),
+        ))
+        session.commit()
+
+    cache = ResponseCache(engine=cache_engine, ttl_seconds=3600)
+    assert cache.purge_expired() == 1
+    assert cache.get("old") is None
+
+
+def test_disabled_cache_is_a_no_op(cache_engine):
+    cache = ResponseCache(engine=cache_engine, enabled=False)
+    cache.set("a", "gpt-4o", "A")
+    assert cache.get("a") is None
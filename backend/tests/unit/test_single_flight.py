@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+
+from backend.single_flight import SingleFlight
+
+
+def test_waiters_share_result_and_counts():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "result"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("k", work) for _ in range(3)))
+
+    results = asyncio.run(run())
+    assert [r for r, _shared in results] == ["result"] * 3
+    assert [shared for _r, shared in results] == [False, True, True]
+    assert calls == [1]
+    assert flight.stats() == {"upstream_calls": 1, "coalesced": 2, "in_flight": 0}
+
+
+def test_errors_propagate_to_every_waiter():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream failed")
+
+    async def run():
+        return await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        first = asyncio.create_task(flight.do("k", work))
+        second = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == ("done", True)
+
+
+def test_key_is_released_after_completion():
+    flight = SingleFlight()
+
+    async def work():
+        return "x"
+
+    async def run():
+        await flight.do("k", work)
+        return await flight.do("k", work)
+
+    assert asyncio.run(run()) == ("x", False)
+    assert flight.stats()["upstream_calls"] == 2
@@ -0,0 +1,50 @@
+from sqlmodel import Session
+
+from backend import crud, schemas
+from backend.write_behind import OutputWriter
+
+
+def _output(i: int) -> schemas.ModelOutputCreate:
+    return schemas.ModelOutputCreate(model_name="M1", output=f"Output {i}")
+
+
+def test_outputs_are_group_committed(db_session: Session):
+    prompt = crud.create_prompt(db=db_session, prompt=schemas.PromptCreate(base_prompt="Busy"))
+    writer = OutputWriter(engine=db_session.get_bind(), max_batch_size=10, max_delay=1.0)
+
+    for i in range(25):
+        writer.submit(prompt.id, _output(i))
+    assert writer.flush(timeout=5)
+
+    # Two full batches, then the flush commits the remaining five without waiting out max_delay.
+    assert writer.stats() == {"submitted": 25, "written": 25, "failed": 0, "commits": 3, "pending": 0}
+    outputs = crud.get_model_outputs_by_prompt(db=db_session, prompt_id=prompt.id)
+    assert sorted(o.output for o in outputs) == sorted(f"Output {i}" for i in range(25))
+    writer.close()
+
+
+def test_close_flushes_pending_outputs(db_session: Session):
+    prompt = crud.create_prompt(db=db_session, prompt=schemas.PromptCreate(base_prompt="Shutting down"))
+    writer = OutputWriter(engine=db_session.get_bind(), max_delay=60.0)
+
+    writer.submit(prompt.id, _output(1))
+    writer.close(timeout=5)
+
+    assert [o.output for o in crud.get_model_outputs_by_prompt(db=db_session, prompt_id=prompt.id)] == ["Output 1"]
+    assert writer.flush() is True  # nothing running, nothing to wait for
+
+
+def test_failed_row_does_not_drop_the_batch(db_session: Session):
+    prompt = crud.create_prompt(db=db_session, prompt=schemas.PromptCreate(base_prompt="One bad row"))
+    writer = OutputWriter(engine=db_session.get_bind(), max_delay=1.0)
+    # Skips validation so the INSERT itself fails (model_name is NOT NULL).
+    bad = schemas.ModelOutputCreate.model_construct(model_name=None, output="Bad", served_by=None, hedge_leg=None)
+
+    writer.submit(prompt.id, _output(1))
+    writer.submit(prompt.id, bad)
+    writer.submit(prompt.id, _output(2))
+    writer.close(timeout=5)
+
+    assert writer.stats()["written"] == 2
+    assert writer.stats()["failed"] == 1
+    assert len(crud.get_model_outputs_by_prompt(db=db_session, prompt_id=prompt.id)) == 2
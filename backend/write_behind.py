@@ -0,0 +1,146 @@
+"""
+Write-behind persistence for model outputs.
+
+SQLite has a single writer, so committing every output on its own request makes
+concurrent requests queue on the file lock and pay one fsync each. Instead, the
+request path hands outputs to `OutputWriter.submit()` and answers the client
+straight away; one writer thread drains the queue and stores whatever has
+accumulated, up to WRITE_BEHIND_MAX_BATCH_SIZE rows or WRITE_BEHIND_MAX_DELAY
+seconds, in one transaction (group commit).
+
+An output therefore appears in history shortly after the response that carried
+it. `flush()` waits for everything submitted so far, and the app calls `close()`
+on shutdown so nothing accepted is lost on a clean stop.
+"""
+import queue
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from sqlmodel import Session
+
+import crud
+import schemas
+from config import WRITE_BEHIND_ENABLED, WRITE_BEHIND_MAX_BATCH_SIZE, WRITE_BEHIND_MAX_DELAY, logging
+from database import engine as default_engine
+
+_STOP = object()
+
+
+class OutputWriter:
+    """Group-commits ModelOutput rows from many requests on one background thread."""
+
+    def __init__(self, engine=None, max_batch_size: int = 500, max_delay: float = 0.05):
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.commits = 0
+
+    def submit(self, prompt_id: int, output: schemas.ModelOutputCreate) -> None:
+        """Queues an output for the next group commit; never blocks on the database."""
+        self._ensure_started()
+        self.submitted += 1
+        self._queue.put((prompt_id, output))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Waits until everything submitted before the call is committed. Returns False on timeout."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Flushes and stops the writer thread. A later submit() starts a new one."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "submitted": self.submitted,
+            "written": self.written,
+            "failed": self.failed,
+            "commits": self.commits,
+            "pending": self._queue.qsize(),
+        }
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="output-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch, waiters, stop = self._next_batch()
+            if batch:
+                self._write(batch)
+            for done in waiters:
+                done.set()
+            if stop:
+                return
+
+    def _next_batch(self) -> Tuple[List[Tuple[int, schemas.ModelOutputCreate]], List[threading.Event], bool]:
+        # Blocks for the first item, then collects more until the batch is full or
+        # max_delay has passed. A flush request or stop ends the batch early.
+        batch, waiters = [], []
+        item = self._queue.get()
+        deadline = time.monotonic() + self.max_delay
+        while True:
+            if item is _STOP:
+                return batch, waiters, True
+            if isinstance(item, threading.Event):
+                waiters.append(item)
+                return batch, waiters, False
+            batch.append(item)
+            remaining = deadline - time.monotonic()
+            if len(batch) >= self.max_batch_size or remaining <= 0:
+                return batch, waiters, False
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return batch, waiters, False
+
+    def _write(self, batch: List[Tuple[int, schemas.ModelOutputCreate]]) -> None:
+        try:
+            with Session(self.engine) as db:
+                crud.create_model_outputs(db, batch)
+            self.written += len(batch)
+            self.commits += 1
+            return
+        except Exception as e:
+            logging.warning(f"Group commit of {len(batch)} model outputs failed, retrying one by one: {e}")
+        # One bad row shouldn't take the rest of the batch with it.
+        for prompt_id, output in batch:
+            try:
+                with Session(self.engine) as db:
+                    crud.create_model_outputs(db, [(prompt_id, output)])
+                self.written += 1
+                self.commits += 1
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"Dropped model output for prompt {prompt_id} ({output.model_name}): {e}")
+
+
+output_writer = OutputWriter(
+    engine=default_engine,
+    max_batch_size=WRITE_BEHIND_MAX_BATCH_SIZE,
+    max_delay=WRITE_BEHIND_MAX_DELAY,
+)
+
+
+def get_output_writer() -> Optional[OutputWriter]:
+    """FastAPI dependency: the shared writer, or None to store outputs inline (WRITE_BEHIND_ENABLED=false)."""
+    return output_writer if WRITE_BEHIND_ENABLED else None
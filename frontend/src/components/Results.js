@@ -19,8 +19,13 @@ const Results = ({ modelResults, optimizedPrompt }) => {
       <div className="space-y-6">
         {Object.entries(modelResults).map(([modelName, result]) => (
           <div key={modelName} className="bg-gray-700 p-5 rounded-lg shadow-md">
-            <h3 className="text-xl font-semibold mb-3 text-indigo-400">{modelName}</h3>
-            {result.loading && (
+            <h3 className="text-xl font-semibold mb-3 text-indigo-400">
+              {modelName}
+              {result.cached && (
+                <span className="ml-2 align-middle text-xs font-medium px-2 py-0.5 rounded bg-gray-600 text-gray-200">Cached</span>
+              )}
+            </h3>
+            {result.loading && !result.output && (
               <div className="flex items-center justify-center h-24">
                 <div className="animate-spin rounded-full h-8 w-8 border-t-2 border-b-2 border-indigo-500"></div>
                 <p className="ml-3 text-gray-300">Loading response...</p>
@@ -37,6 +42,12 @@ const Results = ({ modelResults, optimizedPrompt }) => {
               <div className="prose prose-sm prose-invert max-w-none text-gray-200 whitespace-pre-wrap">
                 {result.output}
               </div>
+            )}
+            {result.output && result.loading && !result.error && (
+              <div className="prose prose-sm prose-invert max-w-none text-gray-200 whitespace-pre-wrap" aria-live="polite" aria-busy="true">
+                {result.output}
+                <span className="inline-block w-2 h-4 ml-1 align-middle bg-indigo-400 animate-pulse" data-testid="streaming-cursor"></span>
+              </div>
             )}
              {!result.loading && !result.error && !result.output && (
               <p className="text-gray-500 italic">No output received or output was empty.</p>
@@ -49,6 +49,17 @@ describe('Results Component', () => {
     expect(screen.getByText('Claude response.')).toBeInTheDocument();
   });
 
+  test('renders partial output while a model is still streaming', () => {
+    const modelResults = {
+      "GPT-4.1": { output: "Partial streamed", error: null, loading: true },
+    };
+    render(<Results modelResults={modelResults} optimizedPrompt={mockOptimizedPrompt} />);
+
+    expect(screen.getByText('Partial streamed')).toBeInTheDocument();
+    expect(screen.getByTestId('streaming-cursor')).toBeInTheDocument();
+    expect(screen.queryByText(/Loading response.../i)).not.toBeInTheDocument();
+  });
+
   test('shows loading state for a model', () => {
     const modelResults = {
       "GPT-4.1": { output: null, error: null, loading: true },
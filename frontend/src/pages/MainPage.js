@@ -76,6 +76,36 @@ const MainPage = () => {
     }
   };
 
+  // Renders tokens as they arrive; a model stays `loading` until its 'done' or 'error' event.
+  // Models that got either are added to `finished`; the rest go through the per-model fallback.
+  const streamModelResults = async (selectedModelFriendlyNames, finished) => {
+    let optimizedPromptShown = false;
+    await api.streamModelResponses(currentPromptId, selectedModelFriendlyNames, ({ event, data }) => {
+      if (event === 'chunk') {
+        setModelResults(prev => ({
+          ...prev,
+          [data.model_name]: { ...prev[data.model_name], output: (prev[data.model_name]?.output || '') + data.text },
+        }));
+      } else if (event === 'done') {
+        finished.add(data.model_name);
+        if (data.optimized_prompt_used && !optimizedPromptShown) {
+          optimizedPromptShown = true;
+          setOptimizedPromptForResults(data.optimized_prompt_used);
+        }
+        setModelResults(prev => ({
+          ...prev,
+          [data.model_name]: { output: data.output, error: null, loading: false, cached: data.cached },
+        }));
+      } else if (event === 'error') {
+        finished.add(data.model_name);
+        setModelResults(prev => ({
+          ...prev,
+          [data.model_name]: { output: null, error: data.error, loading: false },
+        }));
+      }
+    });
+  };
+
   const handleModelSelectionSubmit = async (selectedModelFriendlyNames) => {
     if (!currentPromptId) {
       setError("Cannot get model responses without a submitted prompt ID.");
@@ -92,9 +122,33 @@ const MainPage = () => {
     });
     setModelResults(initialResults);
 
+    let remainingModels = selectedModelFriendlyNames;
+    if (api.supportsStreaming()) {
+      const finished = new Set();
+      try {
+        await streamModelResults(selectedModelFriendlyNames, finished);
+      } catch (err) {
+        // Fall back to one request per model if streaming isn't available (e.g. proxy buffering or older backend).
+        console.error('Streaming model responses failed, falling back to per-model requests:', err);
+      }
+      // A stream can also end cleanly before every model reported (proxy timeout, lost 'end' event).
+      // Models that already finished on it keep their result instead of being asked again.
+      remainingModels = selectedModelFriendlyNames.filter(name => !finished.has(name));
+      if (remainingModels.length === 0) {
+        setIsFetchingModelResponses(false);
+        return;
+      }
+      setModelResults(prev => {
+        const reset = { ...prev };
+        remainingModels.forEach(name => { reset[name] = initialResults[name]; });
+        return reset;
+      });
+    }
+
     let firstSuccessfulOptimizedPrompt = '';
 
-    for (const modelFriendlyName of selectedModelFriendlyNames) {
+    // Fire every model request at once so total wait is the slowest model, not the sum.
+    await Promise.all(remainingModels.map(async (modelFriendlyName) => {
       try {
         const response = await api.getModelResponse(currentPromptId, modelFriendlyName);
         if (response.optimized_prompt_used && !firstSuccessfulOptimizedPrompt) {
@@ -103,7 +157,7 @@ const MainPage = () => {
         }
         setModelResults(prev => ({
           ...prev,
-          [modelFriendlyName]: { output: response.output, error: null, loading: false },
+          [modelFriendlyName]: { output: response.output, error: null, loading: false, cached: response.cached },
         }));
       } catch (err) {
         const errorMsg = err.response?.data?.detail || err.message || 'An unknown error occurred';
@@ -112,7 +166,7 @@ const MainPage = () => {
           [modelFriendlyName]: { output: null, error: errorMsg, loading: false },
         }));
       }
-    }
+    }));
     setIsFetchingModelResponses(false);
   };
 
@@ -5,6 +5,7 @@ import MainPage from '../MainPage';
 import { server } from '../../mocks/server'; // MSW server
 import { handlers } from '../../mocks/handlers'; // MSW handlers
 import { http, HttpResponse } from 'msw'; // For overriding handlers
+import * as api from '../../services/api';
 
 // MSW server setup is in setupTests.js
 
@@ -140,4 +141,62 @@ describe('MainPage Integration Tests', () => {
     });
   });
 
+  test('falls back only for models the broken stream did not finish', async () => {
+    jest.spyOn(api, 'supportsStreaming').mockReturnValue(true);
+    jest.spyOn(api, 'streamModelResponses').mockImplementation(async (promptId, modelNames, onEvent) => {
+      onEvent({ event: 'done', data: { model_name: 'gpt-4.1', output: 'Streamed answer', cached: false } });
+      throw new Error('connection reset');
+    });
+    const getModelResponse = jest.spyOn(api, 'getModelResponse');
+    jest.spyOn(console, 'error').mockImplementation(() => {});
+
+    try {
+      render(<MainPage />);
+      fireEvent.change(screen.getByPlaceholderText('e.g., Explain quantum computing in simple terms...'), { target: { value: 'Prompt for broken stream' } });
+      fireEvent.click(screen.getByRole('button', { name: /Generate Questionnaire/i }));
+      await screen.findByText('Mock question 1 based on: Prompt for broken stream');
+      fireEvent.click(screen.getByRole('button', { name: /Submit Answers & Get Recommendations/i }));
+      await screen.findByText('Model Recommendations');
+
+      fireEvent.click(screen.getByLabelText(/GPT-4.1 \(OpenAI\)/i));
+      fireEvent.click(screen.getByLabelText(/GPT-4.1 Mini \(OpenAI\)/i));
+      fireEvent.click(screen.getByRole('button', { name: /Get Model Responses/i }));
+
+      await screen.findByText('Mocked response from gpt-4.1-mini for prompt ID 123');
+      expect(screen.getByText('Streamed answer')).toBeInTheDocument();
+      expect(getModelResponse).toHaveBeenCalledTimes(1);
+      expect(getModelResponse).toHaveBeenCalledWith(123, 'gpt-4.1-mini');
+    } finally {
+      jest.restoreAllMocks();
+    }
+  });
+
+  test('falls back for models a cleanly closed stream did not finish', async () => {
+    jest.spyOn(api, 'supportsStreaming').mockReturnValue(true);
+    jest.spyOn(api, 'streamModelResponses').mockImplementation(async (promptId, modelNames, onEvent) => {
+      onEvent({ event: 'done', data: { model_name: 'gpt-4.1', output: 'Streamed answer', cached: false } });
+    });
+    const getModelResponse = jest.spyOn(api, 'getModelResponse');
+
+    try {
+      render(<MainPage />);
+      fireEvent.change(screen.getByPlaceholderText('e.g., Explain quantum computing in simple terms...'), { target: { value: 'Prompt for short stream' } });
+      fireEvent.click(screen.getByRole('button', { name: /Generate Questionnaire/i }));
+      await screen.findByText('Mock question 1 based on: Prompt for short stream');
+      fireEvent.click(screen.getByRole('button', { name: /Submit Answers & Get Recommendations/i }));
+      await screen.findByText('Model Recommendations');
+
+      fireEvent.click(screen.getByLabelText(/GPT-4.1 \(OpenAI\)/i));
+      fireEvent.click(screen.getByLabelText(/GPT-4.1 Mini \(OpenAI\)/i));
+      fireEvent.click(screen.getByRole('button', { name: /Get Model Responses/i }));
+
+      await screen.findByText('Mocked response from gpt-4.1-mini for prompt ID 123');
+      expect(screen.getByText('Streamed answer')).toBeInTheDocument();
+      expect(getModelResponse).toHaveBeenCalledTimes(1);
+      expect(getModelResponse).toHaveBeenCalledWith(123, 'gpt-4.1-mini');
+    } finally {
+      jest.restoreAllMocks();
+    }
+  });
+
 });
@@ -113,4 +113,32 @@ describe('API Service', () => {
     expect(authHeader).toBe('Basic YWRtaW46cGFzc3dvcmQxMjM=');
   });
 
+  it('streamModelResponses parses events with CRLF line endings', async () => {
+    const { TextEncoder, TextDecoder } = require('util');
+    const originalFetch = global.fetch;
+    const originalDecoder = global.TextDecoder;
+    global.TextDecoder = originalDecoder || TextDecoder;
+    // The \r\n between the two reads is split across them.
+    const reads = [
+      'event: done\r\ndata: {"model_name": "gpt-4.1", "output": "Hi"}\r',
+      '\n\r\nevent: end\r\ndata: {}\r\n\r\n',
+    ].map(text => new TextEncoder().encode(text));
+    global.fetch = jest.fn().mockResolvedValue({
+      ok: true,
+      body: { getReader: () => ({ read: async () => (reads.length ? { value: reads.shift(), done: false } : { done: true }) }) },
+    });
+
+    try {
+      const events = [];
+      await api.streamModelResponses(123, ['gpt-4.1'], event => events.push(event));
+      expect(events).toEqual([
+        { event: 'done', data: { model_name: 'gpt-4.1', output: 'Hi' } },
+        { event: 'end', data: {} },
+      ]);
+    } finally {
+      global.fetch = originalFetch;
+      global.TextDecoder = originalDecoder;
+    }
+  });
+
 });
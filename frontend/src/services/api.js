@@ -60,6 +60,67 @@ export const getModelResponse = async (promptId, modelName) => {
   return response.data; // Expects { prompt_id, model_name, output, optimized_prompt_used }
 };
 
+export const getModelResponses = async (promptId, modelNames) => {
+  const response = await apiClient.post('/get_model_responses', {
+    prompt_id: promptId,
+    model_names: modelNames,
+  });
+  return response.data; // Expects { prompt_id, responses: [{ model_name, output, error, optimized_prompt_used }] }
+};
+
+// Streaming uses fetch rather than axios/EventSource: axios can't expose a readable body in the
+// browser, and EventSource can't send a POST body or Basic Auth header.
+export const supportsStreaming = () =>
+  typeof fetch === 'function' && typeof ReadableStream === 'function' && typeof TextDecoder === 'function';
+
+const parseSseEvent = (rawEvent) => {
+  let event = 'message';
+  const dataLines = [];
+  rawEvent.split('\n').forEach(line => {
+    if (line.startsWith('event:')) {
+      event = line.slice(6).trim();
+    } else if (line.startsWith('data:')) {
+      dataLines.push(line.slice(5).trim());
+    }
+  });
+  return { event, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : null };
+};
+
+// Calls onEvent({ event, data }) for each Server-Sent Event: 'chunk', 'done', 'error', then 'end'.
+export const streamModelResponses = async (promptId, modelNames, onEvent) => {
+  const response = await fetch(`${API_BASE_URL}/stream_model_responses`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      Accept: 'text/event-stream',
+      Authorization: 'Basic ' + btoa(`${AUTH_USERNAME}:${AUTH_PASSWORD}`),
+    },
+    body: JSON.stringify({ prompt_id: promptId, model_names: modelNames }),
+  });
+  if (!response.ok) {
+    const body = await response.json().catch(() => ({}));
+    const error = new Error(body.detail || `Streaming request failed with status ${response.status}`);
+    error.response = { status: response.status, data: body };
+    throw error;
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    // Servers may end lines with \r\n; normalised over the whole buffer since a \r\n pair can straddle two reads.
+    buffer = (buffer + decoder.decode(value, { stream: true })).replace(/\r\n/g, '\n');
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      if (rawEvent.trim()) onEvent(parseSseEvent(rawEvent));
+    }
+  }
+};
+
 export const getHistoryPrompts = async (skip = 0, limit = 100) => {
   const response = await apiClient.get('/history/prompts', { params: { skip, limit } });
   return response.data; // Expects List[PromptRead]